@@ -0,0 +1,426 @@
+"""
+Module phát âm thanh cảnh báo
+Âm thanh được giải mã một lần vào bộ nhớ; việc phát chạy trên luồng riêng và
+được điều khiển bởi các lần chuyển trạng thái cảnh báo (không chặn luồng giao
+diện/phân tích). Mỗi lần cảnh báo ghi lại độ trễ từ lúc nhận trạng thái DANGER
+đến lúc backend bắt đầu phát.
+
+Backend:
+    simpleaudio / sounddevice - phát buffer PCM trong bộ nhớ (thư viện tùy chọn)
+    kivy                      - SoundLoader (khi chạy giao diện)
+    silent                    - không phát (máy không có âm thanh)
+    stub                      - ghi lại các lần gọi (kiểm thử)
+"""
+
+import os
+import sys
+import threading
+import time
+import wave
+from collections import deque
+
+
+class AudioClip:
+    """
+    Âm thanh PCM đã giải mã trong bộ nhớ
+    """
+
+    def __init__(self, data, channels, sample_width, sample_rate):
+        """
+        Args:
+            data: Dữ liệu PCM (bytes, interleaved)
+            channels: Số kênh
+            sample_width: Số byte mỗi mẫu
+            sample_rate: Tần số lấy mẫu (Hz)
+        """
+        self.data = data
+        self.channels = channels
+        self.sample_width = sample_width
+        self.sample_rate = sample_rate
+
+    @property
+    def duration(self):
+        """Độ dài (giây)"""
+        return len(self.data) / float(self.channels * self.sample_width * self.sample_rate)
+
+    @classmethod
+    def from_wav(cls, path):
+        """
+        Đọc và giải mã file WAV (PCM)
+
+        Args:
+            path: Đường dẫn file .wav
+
+        Returns:
+            AudioClip: Âm thanh đã giải mã
+        """
+        with wave.open(path, 'rb') as wav:
+            return cls(wav.readframes(wav.getnframes()), wav.getnchannels(),
+                       wav.getsampwidth(), wav.getframerate())
+
+
+# ----------------------------------------------------------------------
+# Backend
+# ----------------------------------------------------------------------
+
+class SilentBackend:
+    """
+    Backend không phát âm thanh (vẫn theo dõi trạng thái phát)
+    """
+
+    name = 'silent'
+    supports_loop = True  # Không cần luồng điều khiển phát lại
+
+    def __init__(self):
+        self._playing = False
+
+    def load(self, path):
+        """Không tải gì; luôn thành công"""
+        return True
+
+    def play(self):
+        self._playing = True
+
+    def stop(self):
+        self._playing = False
+
+    def is_playing(self):
+        return self._playing
+
+
+class StubBackend(SilentBackend):
+    """
+    Backend giả lập cho kiểm thử: ghi lại mọi lần gọi kèm thời điểm
+    """
+
+    name = 'stub'
+
+    def __init__(self, play_delay=0.0):
+        """
+        Args:
+            play_delay: Thời gian giả lập để backend bắt đầu phát (giây)
+        """
+        super().__init__()
+        self.play_delay = play_delay
+        self.calls = []  # [(tên lệnh, time.monotonic())]
+
+    def load(self, path):
+        self.calls.append(('load', time.monotonic()))
+        return True
+
+    def play(self):
+        if self.play_delay:
+            time.sleep(self.play_delay)
+        super().play()
+        self.calls.append(('play', time.monotonic()))
+
+    def stop(self):
+        super().stop()
+        self.calls.append(('stop', time.monotonic()))
+
+
+class SimpleAudioBackend:
+    """
+    Backend simpleaudio: phát buffer PCM đã giải mã sẵn
+    """
+
+    name = 'simpleaudio'
+    supports_loop = False  # Luồng điều khiển phát lại khi hết
+
+    def __init__(self):
+        import simpleaudio
+        self._simpleaudio = simpleaudio
+        self.clip = None
+        self._play_object = None
+
+    def load(self, path):
+        if not path.lower().endswith('.wav'):
+            return False
+        self.clip = AudioClip.from_wav(path)
+        return True
+
+    def play(self):
+        clip = self.clip
+        self._play_object = self._simpleaudio.play_buffer(
+            clip.data, clip.channels, clip.sample_width, clip.sample_rate)
+
+    def stop(self):
+        if self._play_object is not None:
+            self._play_object.stop()
+            self._play_object = None
+
+    def is_playing(self):
+        return self._play_object is not None and self._play_object.is_playing()
+
+
+class SoundDeviceBackend:
+    """
+    Backend sounddevice: phát mảng NumPy đã giải mã sẵn, lặp bằng chính thư viện
+    """
+
+    name = 'sounddevice'
+    supports_loop = True
+
+    DTYPES = {1: 'int8', 2: 'int16', 4: 'int32'}
+
+    def __init__(self):
+        import sounddevice
+        self._sounddevice = sounddevice
+        self.samples = None
+        self.sample_rate = None
+        self._playing = False
+
+    def load(self, path):
+        if not path.lower().endswith('.wav'):
+            return False
+        import numpy as np
+
+        clip = AudioClip.from_wav(path)
+        dtype = self.DTYPES.get(clip.sample_width)
+        if dtype is None:
+            return False
+        self.samples = np.frombuffer(clip.data, dtype=dtype).reshape(-1, clip.channels)
+        self.sample_rate = clip.sample_rate
+        return True
+
+    def play(self):
+        self._sounddevice.play(self.samples, self.sample_rate, loop=True)
+        self._playing = True
+
+    def stop(self):
+        self._sounddevice.stop()
+        self._playing = False
+
+    def is_playing(self):
+        return self._playing
+
+
+class KivyBackend:
+    """
+    Backend Kivy SoundLoader (âm thanh được tải một lần khi load)
+
+    Đối tượng âm thanh của Kivy chỉ được dùng trên luồng chính: play()/stop() gọi từ
+    luồng chuông được chuyển sang luồng chính qua Clock (độ trễ đo được không gồm
+    thời gian chờ frame Kivy kế tiếp). load() phải được gọi trên luồng chính.
+    """
+
+    name = 'kivy'
+    supports_loop = True
+
+    def __init__(self):
+        from kivy.clock import Clock
+        from kivy.core.audio import SoundLoader
+        self._clock = Clock
+        self._loader = SoundLoader
+        self.sound = None
+
+    def load(self, path):
+        self.sound = self._loader.load(path)
+        if self.sound is None:
+            return False
+        self.sound.loop = True
+        return True
+
+    def play(self):
+        self._clock.schedule_once(self._play_main)
+
+    def stop(self):
+        self._clock.schedule_once(self._stop_main)
+
+    def _play_main(self, dt):
+        self.sound.play()
+
+    def _stop_main(self, dt):
+        if self.sound.state == 'play':
+            self.sound.stop()
+
+    def is_playing(self):
+        return self.sound.state == 'play'
+
+
+BACKENDS = {
+    'simpleaudio': SimpleAudioBackend,
+    'sounddevice': SoundDeviceBackend,
+    'kivy': KivyBackend,
+    'silent': SilentBackend,
+    'stub': StubBackend,
+}
+
+
+def create_backend(name='auto', sound_paths=('alarm.wav', 'alarm.mp3')):
+    """
+    Tạo backend âm thanh và tải âm thanh cảnh báo
+
+    'auto' thử lần lượt simpleaudio, sounddevice, kivy (chỉ khi Kivy đã được
+    import, tránh kéo Kivy vào chế độ headless), cuối cùng là silent.
+
+    Args:
+        name: Tên backend hoặc 'auto'
+        sound_paths: Các file âm thanh thử lần lượt
+
+    Returns:
+        Backend đã tải âm thanh (silent nếu không phát được)
+    """
+    if name == 'auto':
+        candidates = ['simpleaudio', 'sounddevice']
+        if 'kivy' in sys.modules:
+            candidates.append('kivy')
+    else:
+        candidates = [name]
+
+    for candidate in candidates:
+        try:
+            backend = BACKENDS[candidate]()
+        except ImportError:
+            continue
+        for path in sound_paths:
+            try:
+                if (candidate in ('silent', 'stub') or os.path.exists(path)) and backend.load(path):
+                    return backend
+            except Exception as e:
+                print(f"Lỗi khi tải âm thanh {path} ({candidate}): {e}")
+
+    if name not in ('silent', 'stub'):
+        print("Không tìm thấy file âm thanh cảnh báo - dùng backend silent")
+    return SilentBackend()
+
+
+# ----------------------------------------------------------------------
+# Điều khiển cảnh báo
+# ----------------------------------------------------------------------
+
+class AlarmController:
+    """
+    Class điều khiển chuông cảnh báo trên luồng riêng
+
+    notify() được gọi ở mỗi frame nhưng chỉ đánh thức luồng chuông khi trạng thái
+    cảnh báo thay đổi. Chuông bắt đầu khi alert_active chuyển sang True và kêu
+    đến khi acknowledge() (người dùng xác nhận) hoặc, với auto_stop, đến khi hết cảnh báo.
+    """
+
+    # Số mẫu độ trễ giữ lại
+    LATENCY_SAMPLES = 100
+
+    def __init__(self, backend=None, auto_stop=False):
+        """
+        Khởi tạo Alarm Controller
+
+        Args:
+            backend: Backend âm thanh (None = create_backend('auto'))
+            auto_stop: True để tắt chuông khi trạng thái hết cảnh báo
+        """
+        self.backend = backend if backend is not None else create_backend()
+        self.auto_stop = auto_stop
+
+        self.latencies = deque(maxlen=self.LATENCY_SAMPLES)  # Độ trễ từng lần cảnh báo (giây)
+        self.alarm_count = 0
+
+        self._condition = threading.Condition()
+        self._alert_active = False
+        self._ringing = False       # Trạng thái mong muốn
+        self._alert_time = None     # Thời điểm nhận trạng thái cảnh báo chưa được phát
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='DrowsyGuard-alarm', daemon=True)
+        self._thread.start()
+
+    @property
+    def is_ringing(self):
+        """True nếu chuông đang được yêu cầu kêu"""
+        return self._ringing
+
+    def notify(self, status, alert_time=None):
+        """
+        Cập nhật theo trạng thái mới nhất (gọi mỗi frame, chi phí thấp)
+
+        Args:
+            status: Trạng thái từ DrowsinessDetector
+            alert_time: Thời điểm nhận trạng thái (time.monotonic()), None = bây giờ
+        """
+        active = bool(status['alert_active'])
+        if active == self._alert_active:
+            return
+        self._alert_active = active
+        with self._condition:
+            if active and not self._ringing:
+                self._ringing = True
+                self._alert_time = time.monotonic() if alert_time is None else alert_time
+                self._condition.notify()
+            elif not active and self.auto_stop and self._ringing:
+                self._ringing = False
+                self._condition.notify()
+
+    def acknowledge(self):
+        """Tắt chuông (người dùng đã xác nhận); cảnh báo mới sẽ làm chuông kêu lại"""
+        with self._condition:
+            self._alert_active = False
+            if self._ringing:
+                self._ringing = False
+                self._condition.notify()
+
+    def close(self):
+        """Tắt chuông và dừng luồng"""
+        with self._condition:
+            self._stopped = True
+            self._ringing = False
+            self._condition.notify()
+        self._thread.join(timeout=2.0)
+
+    def _run(self):
+        """Luồng chuông: bật/tắt backend theo trạng thái mong muốn"""
+        backend = self.backend
+        playing = False
+        with self._condition:
+            while not self._stopped:
+                if self._ringing and not playing:
+                    alert_time = self._alert_time
+                    self._alert_time = None
+                    self._condition.release()
+                    try:
+                        backend.play()
+                        playing = True
+                    except Exception as e:
+                        print(f"Lỗi khi phát âm thanh cảnh báo: {e}")
+                    finally:
+                        self._condition.acquire()
+                    if not playing:
+                        # Không phát được: bỏ lần cảnh báo này thay vì thử lại liên tục
+                        self._ringing = False
+                    if playing and alert_time is not None:
+                        self.latencies.append(time.monotonic() - alert_time)
+                        self.alarm_count += 1
+                elif not self._ringing and playing:
+                    self._condition.release()
+                    try:
+                        backend.stop()
+                    finally:
+                        self._condition.acquire()
+                    playing = False
+                elif playing and not backend.supports_loop and not backend.is_playing():
+                    # Backend không tự lặp: phát lại khi hết đoạn âm thanh
+                    self._condition.release()
+                    try:
+                        backend.play()
+                    finally:
+                        self._condition.acquire()
+
+                # Chỉ cần thức định kỳ khi phải tự lặp âm thanh
+                self._condition.wait(0.05 if playing and not backend.supports_loop else None)
+
+        if playing:
+            backend.stop()
+
+    def get_stats(self):
+        """
+        Thống kê độ trễ cảnh báo -> âm thanh
+
+        Returns:
+            dict: {'backend', 'alarms', 'last_ms', 'mean_ms', 'max_ms'}
+        """
+        latencies = list(self.latencies)
+        return {
+            'backend': self.backend.name,
+            'alarms': self.alarm_count,
+            'last_ms': latencies[-1] * 1000 if latencies else None,
+            'mean_ms': sum(latencies) / len(latencies) * 1000 if latencies else None,
+            'max_ms': max(latencies) * 1000 if latencies else None,
+        }
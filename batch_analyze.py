@@ -0,0 +1,265 @@
+"""
+Phân tích offline video đã ghi (dashcam / camera cabin) không cần giao diện
+Chạy FaceDetector -> EAR/MAR -> DrowsinessDetector trên từng file video,
+phân phối các file cho nhiều tiến trình (mỗi tiến trình một Face Mesh)
+
+Cách chạy:
+    python batch_analyze.py videos/ clip1.mp4 --output results --workers 4
+
+Kết quả cho mỗi video:
+    <tên>.frames.csv   - Chỉ số theo từng frame
+    <tên>.events.jsonl - Các lần chuyển mức cảnh báo
+    summary.json       - Tổng hợp tốc độ xử lý theo file, theo tiến trình và toàn bộ
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from face_detector import FaceDetector
+from ear_calculator import EARCalculator
+from mar_calculator import MARCalculator
+from drowsiness_detector import TimedDrowsinessDetector
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v', '.webm')
+
+FRAME_FIELDS = ['frame', 'timestamp', 'face', 'ear', 'mar', 'alert_level',
+                'drowsiness_score', 'eye_closed_frames', 'total_yawns']
+
+# Face Mesh của tiến trình con (khởi tạo một lần cho mỗi worker)
+_face_detector = None
+
+
+def _init_worker():
+    """Khởi tạo Face Mesh riêng cho tiến trình worker"""
+    global _face_detector
+    _face_detector = FaceDetector()
+
+
+def collect_videos(inputs):
+    """
+    Lấy danh sách file video từ các đường dẫn file hoặc thư mục
+
+    Args:
+        inputs: List đường dẫn file/thư mục
+
+    Returns:
+        list: Danh sách đường dẫn video (đã sắp xếp, không trùng)
+    """
+    videos = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in files:
+                    if name.lower().endswith(VIDEO_EXTENSIONS):
+                        videos.append(os.path.join(root, name))
+        elif os.path.isfile(path):
+            videos.append(path)
+        else:
+            print(f"Bỏ qua đường dẫn không tồn tại: {path}")
+    return sorted(set(videos))
+
+
+def _output_names(videos):
+    """
+    Tạo tên file kết quả không trùng nhau cho từng video
+
+    Args:
+        videos: Danh sách đường dẫn video
+
+    Returns:
+        list: Tên gốc (không phần mở rộng) cho file kết quả
+    """
+    names = []
+    used = {}
+    for path in videos:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        count = used.get(stem, 0)
+        used[stem] = count + 1
+        names.append(stem if count == 0 else f"{stem}_{count}")
+    return names
+
+
+def analyze_video(video_path, output_prefix):
+    """
+    Phân tích một file video (chạy trong tiến trình worker)
+
+    Args:
+        video_path: Đường dẫn file video
+        output_prefix: Đường dẫn gốc cho file kết quả (không phần mở rộng)
+
+    Returns:
+        dict: Thống kê xử lý của file
+    """
+    face_detector = _face_detector if _face_detector is not None else FaceDetector()
+    # Worker dùng lại Face Mesh giữa các file: không mang ROI/tracking của file trước sang
+    face_detector.reset_tracking()
+    # Ngưỡng theo thời gian của video, không phụ thuộc tốc độ xử lý
+    drowsiness_detector = TimedDrowsinessDetector()
+
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        return {'video': video_path, 'worker': os.getpid(), 'error': 'Không mở được video'}
+
+    video_fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    frames = 0
+    faces = 0
+    alerts = 0
+    last_level = None
+    start = time.perf_counter()
+
+    with open(output_prefix + '.frames.csv', 'w', newline='', encoding='utf-8') as frames_file, \
+            open(output_prefix + '.events.jsonl', 'w', encoding='utf-8') as events_file:
+        writer = csv.writer(frames_file)
+        writer.writerow(FRAME_FIELDS)
+
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+
+            # Một số backend không trả về POS_MSEC - suy ra từ số frame
+            timestamp = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if timestamp <= 0 and frames > 0:
+                timestamp = frames / video_fps
+
+            face_detected, key_points = face_detector.detect_face_array(
+                frame, FaceDetector.KEY_INDICES)
+
+            if face_detected:
+                faces += 1
+                landmarks = FaceDetector.split_key_landmarks(key_points)
+                ear_value = EARCalculator.calculate_avg_ear(landmarks['left_eye'],
+                                                            landmarks['right_eye'])
+                mar_value = MARCalculator.calculate_mar(landmarks['mouth'])
+                status = drowsiness_detector.update(ear_value, mar_value, timestamp)
+                level = status['alert_level']
+                writer.writerow([frames, f"{timestamp:.3f}", 1, f"{ear_value:.4f}",
+                                 f"{mar_value:.4f}", level,
+                                 f"{status['drowsiness_score']:.2f}",
+                                 status['eye_closed_frames'], status['total_yawns']])
+            else:
+                status = None
+                level = 'NO_FACE'
+                writer.writerow([frames, f"{timestamp:.3f}", 0, '', '', level, '', '', ''])
+
+            # Ghi sự kiện khi mức cảnh báo thay đổi
+            if level != last_level:
+                event = {'frame': frames, 'timestamp': round(timestamp, 3),
+                         'from': last_level, 'to': level}
+                if status is not None:
+                    event['reason'] = status['reason']
+                if level == 'DANGER':
+                    alerts += 1
+                events_file.write(json.dumps(event, ensure_ascii=False) + '\n')
+                last_level = level
+
+            frames += 1
+
+    capture.release()
+    seconds = time.perf_counter() - start
+    return {
+        'video': video_path,
+        'worker': os.getpid(),
+        'frames': frames,
+        'face_frames': faces,
+        'danger_alerts': alerts,
+        'seconds': seconds,
+        'fps': frames / seconds if seconds > 0 else 0.0,
+    }
+
+
+def summarize(results, wall_seconds):
+    """
+    Tổng hợp tốc độ xử lý theo tiến trình và toàn bộ
+
+    Args:
+        results: List thống kê từ analyze_video
+        wall_seconds: Tổng thời gian thực chạy
+
+    Returns:
+        dict: {'files', 'workers', 'aggregate'}
+    """
+    workers = {}
+    for result in results:
+        if 'error' in result:
+            continue
+        stats = workers.setdefault(result['worker'], {'files': 0, 'frames': 0, 'seconds': 0.0})
+        stats['files'] += 1
+        stats['frames'] += result['frames']
+        stats['seconds'] += result['seconds']
+    for stats in workers.values():
+        stats['fps'] = stats['frames'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+
+    total_frames = sum(stats['frames'] for stats in workers.values())
+    return {
+        'files': results,
+        'workers': {str(pid): stats for pid, stats in workers.items()},
+        'aggregate': {
+            'files': len(results),
+            'frames': total_frames,
+            'wall_seconds': wall_seconds,
+            'fps': total_frames / wall_seconds if wall_seconds > 0 else 0.0,
+        },
+    }
+
+
+def main():
+    """Hàm chính của công cụ phân tích offline"""
+    parser = argparse.ArgumentParser(description='DrowsyGuard - phân tích video đã ghi')
+    parser.add_argument('inputs', nargs='+', help='File video hoặc thư mục chứa video')
+    parser.add_argument('--output', default='batch_results', help='Thư mục lưu kết quả')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Số tiến trình xử lý song song')
+    args = parser.parse_args()
+
+    videos = collect_videos(args.inputs)
+    if not videos:
+        print("Không tìm thấy file video nào")
+        return
+
+    os.makedirs(args.output, exist_ok=True)
+    prefixes = [os.path.join(args.output, name) for name in _output_names(videos)]
+    workers = max(1, min(args.workers, len(videos)))
+    print(f"Phân tích {len(videos)} video với {workers} tiến trình...")
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = {executor.submit(analyze_video, video, prefix): video
+                   for video, prefix in zip(videos, prefixes)}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # Một file lỗi (hoặc worker bị dừng) không làm mất kết quả các file khác
+                result = {'video': futures[future], 'error': str(e) or type(e).__name__}
+            results.append(result)
+            if 'error' in result:
+                print(f"  [LỖI] {result['video']}: {result['error']}")
+            else:
+                print(f"  [{result['worker']}] {result['video']}: {result['frames']} frame, "
+                      f"{result['fps']:.1f} FPS, {result['danger_alerts']} cảnh báo")
+    wall_seconds = time.perf_counter() - start
+
+    summary = summarize(results, wall_seconds)
+    with open(os.path.join(args.output, 'summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    print("\nTốc độ theo tiến trình:")
+    for pid, stats in summary['workers'].items():
+        print(f"  Worker {pid}: {stats['files']} file, {stats['frames']} frame, "
+              f"{stats['fps']:.1f} FPS")
+    aggregate = summary['aggregate']
+    print(f"Tổng: {aggregate['frames']} frame trong {aggregate['wall_seconds']:.1f}s "
+          f"= {aggregate['fps']:.1f} FPS")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+"""
+Bộ benchmark theo từng giai đoạn xử lý (không cần camera)
+Dùng frame tổng hợp và chuỗi landmark mô phỏng (sinh cố định theo seed) hoặc
+chuỗi landmark ghi từ phiên thật để đo riêng từng giai đoạn:
+    face_detect        - FaceDetector.detect_face (chuyển màu + Face Mesh)
+    landmark_extract   - Chuyển landmarks Mediapipe sang mảng NumPy
+    ear_mar            - EARCalculator / MARCalculator theo từng frame
+    ear_mar_batch      - EAR/MAR vector hóa cho cả chuỗi (tính trung bình mỗi frame)
+    detector_update    - DrowsinessDetector.update (và TimedDrowsinessDetector)
+    perclos            - PerclosMonitor.update với cửa sổ 60 giây và 1 giờ (chi phí như nhau)
+    draw_info          - CameraProcessor._draw_info_on_frame
+    status_text        - Text bảng trạng thái GUI theo thay đổi (đường cũ: tạo lại mỗi frame),
+                         kèm tỉ lệ frame phải gán lại Label.text
+    display_convert    - Chuẩn bị buffer cho texture (đường cũ: flip + tobytes)
+
+Cách chạy:
+    python benchmark.py --output results.json
+    python benchmark.py --compare results_old.json
+    python benchmark.py --video clip.mp4 --trace session.npz
+"""
+
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from face_detector import FaceDetector
+from ear_calculator import EARCalculator
+from mar_calculator import MARCalculator
+from drowsiness_detector import DrowsinessDetector, TimedDrowsinessDetector
+from camera_processor import CameraProcessor
+from benchmark_landmarks import make_fake_face_landmarks
+from status_readout import StatusReadout
+from perclos import PerclosMonitor
+
+
+FPS = 30.0
+FRAME_SIZE = (640, 480)
+
+# Hình dạng mắt (6 điểm) và miệng (8 điểm) theo thứ tự FaceDetector, đơn vị pixel
+EYE_TEMPLATE = np.array([[-15, 0], [-5, -1], [5, -1], [15, 0], [5, 1], [-5, 1]], dtype=np.float32)
+MOUTH_TEMPLATE = np.array([[-25, 0], [25, 0], [0, -1], [0, 1],
+                           [-10, -0.8], [-10, 0.8], [10, -0.8], [10, 0.8]], dtype=np.float32)
+
+
+# ----------------------------------------------------------------------
+# Dữ liệu mẫu
+# ----------------------------------------------------------------------
+
+def synthetic_frames(count, size=FRAME_SIZE, seed=0):
+    """
+    Sinh các frame BGR tổng hợp có hình khuôn mặt đơn giản
+
+    Args:
+        count: Số frame
+        size: (width, height)
+        seed: Seed cho nhiễu
+
+    Returns:
+        list: Danh sách frame uint8 shape (h, w, 3)
+    """
+    w, h = size
+    rng = np.random.default_rng(seed)
+    base = np.zeros((h, w, 3), dtype=np.uint8)
+    base[:] = np.linspace(40, 120, w, dtype=np.uint8)[np.newaxis, :, np.newaxis]
+    cv2.ellipse(base, (w // 2, h // 2), (w // 8, h // 5), 0, 0, 360, (150, 180, 220), -1)
+    for dx in (-w // 20, w // 20):
+        cv2.ellipse(base, (w // 2 + dx, h // 2 - h // 20), (12, 5), 0, 0, 360, (40, 40, 40), -1)
+    cv2.ellipse(base, (w // 2, h // 2 + h // 10), (25, 8), 0, 0, 360, (60, 60, 160), -1)
+
+    frames = []
+    for _ in range(count):
+        noise = rng.integers(0, 8, size=base.shape, dtype=np.uint8)
+        frames.append(cv2.add(base, noise))
+    return frames
+
+
+def synthetic_trace(count, fps=FPS, seed=0):
+    """
+    Sinh chuỗi landmark mắt/miệng mô phỏng một phiên lái xe
+
+    Gồm chớp mắt định kỳ, một lần nhắm mắt lâu, một lần ngáp và chuyển động đầu nhẹ.
+
+    Args:
+        count: Số frame
+        fps: Tốc độ frame giả định
+        seed: Seed cho nhiễu
+
+    Returns:
+        tuple: (timestamps, key_points)
+            timestamps: Mảng shape (count,) thời điểm (giây)
+            key_points: Mảng float32 shape (count, 20, 2) theo FaceDetector.KEY_INDICES
+    """
+    rng = random.Random(seed)
+    timestamps = np.arange(count, dtype=np.float64) / fps
+    key_points = np.empty((count, 20, 2), dtype=np.float32)
+
+    for i, t in enumerate(timestamps):
+        # Độ mở mắt: EAR ~ 0.3 khi mở, ~ 0.1 khi nhắm
+        eye_open = 4.5
+        if t % 4.0 < 0.15:
+            eye_open = 1.5  # Chớp mắt
+        if 20.0 <= t % 60.0 < 24.0:
+            eye_open = 1.5  # Nhắm mắt lâu
+        # Độ mở miệng: MAR ~ 0.3 bình thường, ~ 0.8 khi ngáp
+        mouth_open = 23.0 if 40.0 <= t % 60.0 < 43.0 else 8.7
+
+        cx = FRAME_SIZE[0] / 2 + 10 * math.sin(t * 0.5) + rng.gauss(0, 0.3)
+        cy = FRAME_SIZE[1] / 2 + 5 * math.sin(t * 0.3) + rng.gauss(0, 0.3)
+        eye_shape = EYE_TEMPLATE * (1.0, eye_open)
+        key_points[i, FaceDetector.KEY_LEFT_EYE] = eye_shape + (cx + 40, cy - 30)
+        key_points[i, FaceDetector.KEY_RIGHT_EYE] = eye_shape + (cx - 40, cy - 30)
+        key_points[i, FaceDetector.KEY_MOUTH] = MOUTH_TEMPLATE * (1.0, mouth_open) + (cx, cy + 50)
+
+    return timestamps, key_points
+
+
+def load_trace(path):
+    """
+    Đọc chuỗi landmark đã ghi (file .npz có 'timestamps' và 'key_points',
+    hoặc file .dglm của landmark_recording - chỉ lấy các frame có khuôn mặt)
+
+    Args:
+        path: Đường dẫn file
+
+    Returns:
+        tuple: (timestamps, key_points)
+    """
+    if path.endswith('.dglm'):
+        from landmark_recording import LandmarkReplay
+        replay = LandmarkReplay(path)
+        faces = replay.face_present
+        return (np.asarray(replay.timestamps[faces], dtype=np.float64),
+                np.asarray(replay.key_points[faces], dtype=np.float32))
+    data = np.load(path)
+    return data['timestamps'], data['key_points'].astype(np.float32)
+
+
+def load_video_frames(path, count):
+    """Đọc tối đa count frame đầu của một video"""
+    capture = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+
+# ----------------------------------------------------------------------
+# Đo thời gian
+# ----------------------------------------------------------------------
+
+def time_stage(func, items, warmup=3):
+    """
+    Đo độ trễ của func trên từng phần tử
+
+    Args:
+        func: Hàm nhận một phần tử
+        items: Danh sách phần tử (mỗi phần tử ~ một frame)
+        warmup: Số lần chạy làm nóng
+
+    Returns:
+        dict: {'frames', 'fps', 'mean_ms', 'p50_ms', 'p99_ms'}
+    """
+    for item in items[:warmup]:
+        func(item)
+
+    latencies = np.empty(len(items), dtype=np.int64)
+    perf_counter_ns = time.perf_counter_ns
+    for i, item in enumerate(items):
+        start = perf_counter_ns()
+        func(item)
+        latencies[i] = perf_counter_ns() - start
+
+    return summarize_latencies(latencies)
+
+
+def _legacy_status_text(status, thresholds):
+    """Tạo text bảng trạng thái ở mỗi frame như giao diện trước đây"""
+    header = f"Trạng thái: {DrowsinessDetector.get_status_text(status)}"
+    text = (
+        f"EAR: {status['ear']:.3f}  |  "
+        f"MAR: {status['mar']:.3f}  |  "
+        f"Ngáp: {status['total_yawns']} lần  |  "
+        f"Điểm: {round(status['drowsiness_score'], 2)}\n"
+    )
+    text += f"Ngưỡng cài đặt: EAR={thresholds[0]:.2f} | MAR={thresholds[1]:.2f}"
+    return header, text
+
+
+def summarize_latencies(latencies_ns, frames=None):
+    """
+    Tổng hợp độ trễ (nano giây) thành FPS và các phân vị
+
+    Args:
+        latencies_ns: Mảng độ trễ từng frame
+        frames: Số frame (mặc định = số phần tử)
+
+    Returns:
+        dict: {'frames', 'fps', 'mean_ms', 'p50_ms', 'p99_ms'}
+    """
+    latencies_ms = np.asarray(latencies_ns, dtype=np.float64) / 1e6
+    mean_ms = float(latencies_ms.mean())
+    return {
+        'frames': int(frames if frames is not None else len(latencies_ms)),
+        'fps': 1000.0 / mean_ms if mean_ms > 0 else float('inf'),
+        'mean_ms': mean_ms,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def run_suite(frames, timestamps, key_points, stages=None):
+    """
+    Chạy toàn bộ các giai đoạn benchmark
+
+    Args:
+        frames: Danh sách frame BGR
+        timestamps: Mảng thời điểm của chuỗi landmark
+        key_points: Mảng (frames, 20, 2) chuỗi landmark
+        stages: Tập tên giai đoạn cần chạy (None = tất cả)
+
+    Returns:
+        dict: {tên giai đoạn: kết quả time_stage}
+    """
+    results = {}
+    enabled = (lambda name: stages is None or name in stages)
+    left = key_points[:, FaceDetector.KEY_LEFT_EYE]
+    right = key_points[:, FaceDetector.KEY_RIGHT_EYE]
+    mouth = key_points[:, FaceDetector.KEY_MOUTH]
+    ears = EARCalculator.calculate_avg_ear_batch(left, right)
+    mars = MARCalculator.calculate_mar_batch(mouth)
+    indices = range(len(key_points))
+
+    if enabled('face_detect'):
+        face_detector = FaceDetector()
+        results['face_detect'] = time_stage(face_detector.detect_face, frames)
+        face_detector.release()
+
+    if enabled('landmark_extract'):
+        fake_faces = [make_fake_face_landmarks(seed) for seed in range(8)]
+        w, h = FRAME_SIZE
+        results['landmark_extract'] = time_stage(
+            lambda i: FaceDetector._landmarks_to_array(fake_faces[i % 8], w, h,
+                                                       FaceDetector.KEY_INDICES),
+            list(indices))
+
+    if enabled('ear_mar'):
+        results['ear_mar'] = time_stage(
+            lambda i: (EARCalculator.calculate_avg_ear(left[i], right[i]),
+                       MARCalculator.calculate_mar(mouth[i])),
+            list(indices))
+
+    if enabled('ear_mar_batch'):
+        start = time.perf_counter_ns()
+        EARCalculator.calculate_avg_ear_batch(left, right)
+        MARCalculator.calculate_mar_batch(mouth)
+        per_frame = (time.perf_counter_ns() - start) / len(key_points)
+        results['ear_mar_batch'] = summarize_latencies([per_frame], frames=len(key_points))
+
+    if enabled('detector_update'):
+        detector = DrowsinessDetector()
+        results['detector_update'] = time_stage(
+            lambda i: detector.update(ears[i], mars[i]), list(indices))
+
+    if enabled('detector_update_timed'):
+        timed_detector = TimedDrowsinessDetector()
+        results['detector_update_timed'] = time_stage(
+            lambda i: timed_detector.update(ears[i], mars[i], timestamps[i]), list(indices))
+
+    if enabled('perclos'):
+        closed = ears < 0.25
+        dts = np.diff(timestamps, prepend=timestamps[0])
+        for name, window in (('perclos', 60.0), ('perclos_1h', 3600.0)):
+            monitor = PerclosMonitor((window,))
+            results[name] = time_stage(
+                lambda i: monitor.update(closed[i], dts[i], timestamps[i]), list(indices))
+
+    if enabled('draw_info'):
+        processor = CameraProcessor()
+        status = DrowsinessDetector().update(0.3, 0.3)
+        status['total_yawns'] = 2
+        canvases = [frame.copy() for frame in frames]
+        results['draw_info'] = time_stage(
+            lambda frame: processor._draw_info_on_frame(frame, status), canvases)
+
+    if enabled('status_text'):
+        status_detector = TimedDrowsinessDetector()
+        statuses = [status_detector.update(ears[i], mars[i], timestamps[i]).copy() for i in indices]
+        thresholds = (0.25, 0.6)
+        results['status_text_legacy'] = time_stage(
+            lambda status: _legacy_status_text(status, thresholds), statuses)
+        results['status_text_legacy']['label_updates'] = 1.0
+
+        readout = StatusReadout()
+        updates = [0]
+
+        def readout_frame(i):
+            header = readout.status_text(statuses[i])
+            detail = readout.detail_text(statuses[i], thresholds, timestamps[i])
+            updates[0] += (header is not None) + (detail is not None)
+
+        results['status_text'] = time_stage(readout_frame, list(indices), warmup=0)
+        # Tỉ lệ số lần gán Label.text so với đường cũ (gán 2 label mỗi frame = 1.0)
+        results['status_text']['label_updates'] = updates[0] / (2.0 * len(statuses))
+
+    if enabled('display_convert'):
+        results['display_convert_legacy'] = time_stage(
+            lambda frame: cv2.flip(frame, 0).tobytes(), frames)
+        results['display_convert'] = time_stage(
+            lambda frame: np.ascontiguousarray(frame).reshape(-1), frames)
+
+    return results
+
+
+def environment_info():
+    """Thông tin phiên bản để so sánh giữa các lần chạy"""
+    info = {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+    }
+    try:
+        import mediapipe
+        info['mediapipe'] = mediapipe.__version__
+    except ImportError:
+        info['mediapipe'] = None
+    return info
+
+
+def print_results(results, baseline=None):
+    """
+    In bảng kết quả (kèm so sánh với lần chạy trước nếu có)
+
+    Args:
+        results: {tên giai đoạn: kết quả}
+        baseline: Kết quả lần chạy trước cùng định dạng (hoặc None)
+    """
+    print(f"{'Giai đoạn':<24}{'FPS':>12}{'p50 (ms)':>12}{'p99 (ms)':>12}"
+          + (f"{'so với cũ':>12}" if baseline else ""))
+    for name, stats in results.items():
+        line = (f"{name:<24}{stats['fps']:>12.1f}{stats['p50_ms']:>12.3f}"
+                f"{stats['p99_ms']:>12.3f}")
+        if baseline and name in baseline:
+            old = baseline[name]['mean_ms']
+            line += f"{stats['mean_ms'] / old:>11.2f}x" if old > 0 else f"{'-':>12}"
+        print(line)
+
+
+def main():
+    """Chạy bộ benchmark"""
+    parser = argparse.ArgumentParser(description='DrowsyGuard - benchmark theo giai đoạn')
+    parser.add_argument('--frames', type=int, default=300, help='Số frame cho mỗi giai đoạn')
+    parser.add_argument('--video', help='Dùng frame từ video thay cho frame tổng hợp')
+    parser.add_argument('--trace', help='Chuỗi landmark đã ghi (.npz: timestamps, key_points hoặc .dglm)')
+    parser.add_argument('--stages', nargs='*', help='Chỉ chạy các giai đoạn này')
+    parser.add_argument('--output', help='Ghi kết quả ra file JSON')
+    parser.add_argument('--compare', help='So sánh với file JSON của lần chạy trước')
+    args = parser.parse_args()
+
+    frames = load_video_frames(args.video, args.frames) if args.video else []
+    if not frames:
+        frames = synthetic_frames(args.frames)
+    if args.trace:
+        timestamps, key_points = load_trace(args.trace)
+    else:
+        timestamps, key_points = synthetic_trace(max(args.frames, int(60 * FPS)))
+
+    results = run_suite(frames, timestamps, key_points,
+                        set(args.stages) if args.stages else None)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['stages']
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment_info(), 'stages': results}, f, indent=2)
+        print(f"\nĐã ghi kết quả: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Microbenchmark trích xuất landmark
+So sánh đường xử lý cũ (dictionary các tuple) với chế độ mảng NumPy của FaceDetector
+
+Không cần camera: dùng landmarks giả lập có cùng cấu trúc với kết quả Mediapipe.
+
+Cách chạy:
+    python benchmark_landmarks.py --frames 2000
+"""
+
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+from face_detector import FaceDetector
+
+
+NUM_LANDMARKS = 478  # Số landmark khi bật refine_landmarks
+
+
+def make_fake_face_landmarks(seed=0):
+    """
+    Tạo landmarks giả lập có thuộc tính .landmark[i].x/.y như Mediapipe
+
+    Args:
+        seed: Seed cho bộ sinh số ngẫu nhiên
+
+    Returns:
+        SimpleNamespace: Đối tượng có thuộc tính landmark (list 478 điểm chuẩn hóa)
+    """
+    rng = random.Random(seed)
+    points = [SimpleNamespace(x=rng.uniform(0.3, 0.7), y=rng.uniform(0.2, 0.8))
+              for _ in range(NUM_LANDMARKS)]
+    return SimpleNamespace(landmark=points)
+
+
+def time_per_frame(func, frames):
+    """
+    Đo thời gian trung bình mỗi lần gọi
+
+    Args:
+        func: Hàm không tham số cần đo
+        frames: Số lần gọi
+
+    Returns:
+        float: Thời gian trung bình (micro giây)
+    """
+    func()  # Làm nóng
+    start = time.perf_counter()
+    for _ in range(frames):
+        func()
+    return (time.perf_counter() - start) / frames * 1e6
+
+
+def main():
+    """Chạy benchmark và in kết quả"""
+    parser = argparse.ArgumentParser(description='Benchmark trích xuất landmark')
+    parser.add_argument('--frames', type=int, default=2000, help='Số frame mô phỏng')
+    parser.add_argument('--width', type=int, default=640, help='Chiều rộng frame')
+    parser.add_argument('--height', type=int, default=480, help='Chiều cao frame')
+    args = parser.parse_args()
+
+    face = make_fake_face_landmarks()
+    w, h = args.width, args.height
+
+    cases = [
+        ('dict các tuple (cũ)',
+         lambda: FaceDetector._landmarks_to_dict(face, w, h)),
+        ('mảng NumPy - toàn bộ 478 điểm',
+         lambda: FaceDetector._landmarks_to_array(face, w, h)),
+        ('mảng NumPy - chỉ mắt + miệng',
+         lambda: FaceDetector.split_key_landmarks(
+             FaceDetector._landmarks_to_array(face, w, h, FaceDetector.KEY_INDICES))),
+    ]
+
+    print(f"Trích xuất landmark: {args.frames} frame, {w}x{h}")
+    baseline = None
+    for name, func in cases:
+        us = time_per_frame(func, args.frames)
+        if baseline is None:
+            baseline = us
+        print(f"  {name:<32} {us:9.1f} us/frame  (x{baseline / us:.1f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark chế độ lập lịch Face Mesh + optical flow trên video đã ghi
+So sánh với chạy Face Mesh đầy đủ ở mọi frame:
+    - Thời gian CPU mỗi frame
+    - Tỉ lệ frame phải chạy Face Mesh
+    - Sai số EAR so với Face Mesh đầy đủ
+
+Cách chạy:
+    python benchmark_tracking.py clip1.mp4 clip2.mp4 --max-frames 900
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from face_detector import FaceDetector
+from ear_calculator import EARCalculator
+from landmark_tracker import AdaptiveLandmarkDetector
+
+
+def run_clip(video_path, use_tracking, max_frames=None):
+    """
+    Chạy phân tích EAR trên một video
+
+    Args:
+        video_path: Đường dẫn video
+        use_tracking: True = Face Mesh theo lịch + optical flow, False = Face Mesh mọi frame
+        max_frames: Số frame tối đa (None = toàn bộ video)
+
+    Returns:
+        tuple: (ears, cpu_seconds, stats)
+            ears: Mảng EAR theo frame (NaN khi không có khuôn mặt)
+            cpu_seconds: Tổng thời gian CPU xử lý
+            stats: Thống kê của AdaptiveLandmarkDetector (None nếu không theo dõi)
+    """
+    face_detector = FaceDetector()
+    source = AdaptiveLandmarkDetector(face_detector) if use_tracking else None
+    capture = cv2.VideoCapture(video_path)
+
+    ears = []
+    cpu_seconds = 0.0
+    while max_frames is None or len(ears) < max_frames:
+        ret, frame = capture.read()
+        if not ret:
+            break
+
+        start = time.process_time()
+        if source is not None:
+            face_detected, key_points = source.detect_key_points(frame)
+        else:
+            face_detected, key_points = face_detector.detect_face_array(
+                frame, FaceDetector.KEY_INDICES)
+        if face_detected:
+            landmarks = FaceDetector.split_key_landmarks(key_points)
+            ear = EARCalculator.calculate_avg_ear(landmarks['left_eye'], landmarks['right_eye'])
+        else:
+            ear = float('nan')
+        cpu_seconds += time.process_time() - start
+        ears.append(ear)
+
+    capture.release()
+    face_detector.release()
+    return np.array(ears), cpu_seconds, source.get_stats() if source is not None else None
+
+
+def main():
+    """Chạy benchmark trên các video và in kết quả"""
+    parser = argparse.ArgumentParser(description='Benchmark Face Mesh + optical flow')
+    parser.add_argument('videos', nargs='+', help='Video đã ghi dùng để đánh giá')
+    parser.add_argument('--max-frames', type=int, default=None, help='Số frame tối đa mỗi video')
+    args = parser.parse_args()
+
+    for video_path in args.videos:
+        ref_ears, ref_cpu, _ = run_clip(video_path, use_tracking=False, max_frames=args.max_frames)
+        ears, cpu, stats = run_clip(video_path, use_tracking=True, max_frames=args.max_frames)
+
+        frames = min(len(ref_ears), len(ears))
+        if frames == 0:
+            print(f"{video_path}: không đọc được frame nào")
+            continue
+
+        both = ~np.isnan(ref_ears[:frames]) & ~np.isnan(ears[:frames])
+        errors = np.abs(ref_ears[:frames][both] - ears[:frames][both])
+        inference_ratio = stats['inference_frames'] / max(1, len(ears))
+
+        print(f"{video_path} ({frames} frame)")
+        print(f"  Face Mesh mọi frame : {ref_cpu / len(ref_ears) * 1000:7.2f} ms CPU/frame")
+        print(f"  Lập lịch + tracking : {cpu / len(ears) * 1000:7.2f} ms CPU/frame "
+              f"(Face Mesh {inference_ratio:.0%} số frame, "
+              f"optical flow {stats['tracked_frames']} frame)")
+        if errors.size:
+            print(f"  Sai số EAR          : trung bình {errors.mean():.4f}, "
+                  f"p95 {np.percentile(errors, 95):.4f}, lớn nhất {errors.max():.4f}")
+        mismatch = np.count_nonzero(np.isnan(ref_ears[:frames]) != np.isnan(ears[:frames]))
+        print(f"  Khác biệt phát hiện khuôn mặt: {mismatch} frame")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+"""
+Module hiệu chỉnh ngưỡng EAR/MAR theo từng tài xế
+Thống kê dạng dòng (bộ nhớ O(1)): trung bình/phương sai Welford và phân vị
+P² (Jain & Chlamtac) thay vì lưu toàn bộ mẫu. Mẫu chớp mắt (EAR tụt so với
+trung vị) và ngáp (MAR vượt xa trung vị) bị loại trước khi cập nhật thống kê;
+ngưỡng được suy ra từ các phân vị thay vì trung bình nên không bị lệch bởi
+vài lần chớp mắt.
+
+Hai cách dùng:
+    CalibrationEngine       - hiệu chỉnh một lần (ví dụ 5 giây trước khi giám sát)
+    BackgroundCalibrator    - hiệu chỉnh nền trong lúc giám sát, định kỳ đưa ngưỡng
+                              của detector dần về giá trị phù hợp với tài xế
+"""
+
+import math
+
+
+class RunningStats:
+    """
+    Trung bình, phương sai, min/max dạng dòng (thuật toán Welford)
+    """
+
+    __slots__ = ('count', 'mean', '_m2', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def push(self, value):
+        """Thêm một mẫu"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def variance(self):
+        """Phương sai mẫu (0 nếu ít hơn 2 mẫu)"""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        """Độ lệch chuẩn mẫu"""
+        return math.sqrt(self.variance)
+
+    def as_dict(self):
+        """Xuất thống kê dạng dictionary"""
+        return {'count': self.count, 'mean': self.mean, 'std': self.std,
+                'min': self.min if self.count else None,
+                'max': self.max if self.count else None}
+
+
+class P2Quantile:
+    """
+    Ước lượng phân vị dạng dòng bằng thuật toán P² (5 marker, bộ nhớ O(1))
+    """
+
+    __slots__ = ('p', '_heights', '_positions', '_desired', '_increments', '_initial')
+
+    def __init__(self, p):
+        """
+        Args:
+            p: Phân vị cần ước lượng (0 < p < 1), ví dụ 0.5 = trung vị
+        """
+        self.p = p
+        self._initial = []
+        self._heights = None
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    @property
+    def count(self):
+        """Số mẫu đã thêm"""
+        return len(self._initial) if self._heights is None else self._positions[4]
+
+    def push(self, value):
+        """Thêm một mẫu"""
+        if self._heights is None:
+            self._initial.append(value)
+            if len(self._initial) == 5:
+                self._heights = sorted(self._initial)
+            return
+
+        q = self._heights
+        n = self._positions
+
+        # Tìm ô chứa mẫu mới và cập nhật marker biên
+        if value < q[0]:
+            q[0] = value
+            k = 0
+        elif value >= q[4]:
+            q[4] = value
+            k = 3
+        else:
+            k = 0
+            while value >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Điều chỉnh 3 marker giữa (nội suy parabol, dự phòng tuyến tính)
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                candidate = q[i] + step / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if q[i - 1] < candidate < q[i + 1]:
+                    q[i] = candidate
+                else:
+                    q[i] += step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+                n[i] += step
+
+    @property
+    def value(self):
+        """Giá trị phân vị ước lượng (None nếu chưa có mẫu)"""
+        if self._heights is not None:
+            return self._heights[2]
+        if not self._initial:
+            return None
+        ordered = sorted(self._initial)
+        return ordered[min(len(ordered) - 1, int(round(self.p * (len(ordered) - 1))))]
+
+
+class CalibrationEngine:
+    """
+    Class hiệu chỉnh ngưỡng EAR/MAR từ luồng mẫu với bộ nhớ cố định
+    """
+
+    # Chớp mắt: EAR thấp hơn BLINK_RATIO * trung vị; bỏ thêm BLINK_HOLD giây sau đó
+    BLINK_RATIO = 0.8
+    BLINK_HOLD = 0.3
+
+    # Ngáp/nói: MAR cao hơn trung vị + YAWN_MARGIN; bỏ thêm YAWN_HOLD giây sau đó
+    YAWN_MARGIN = 0.2
+    YAWN_HOLD = 1.0
+
+    # Số mẫu đầu tiên chỉ dùng để ước lượng trung vị (chưa loại mẫu)
+    WARMUP_SAMPLES = 10
+
+    # Ngưỡng mắt nhắm: tỉ lệ so với trung vị EAR khi mở mắt, không vượt quá phân vị 5%
+    EAR_RATIO = 0.8
+    EAR_LIMITS = (0.15, 0.30)
+
+    # Ngưỡng ngáp: phân vị 95% MAR khi ngậm miệng + khoảng đệm
+    MAR_MARGIN = 0.25
+    MAR_LIMITS = (0.50, 0.75)
+
+    def __init__(self, min_samples=50):
+        """
+        Khởi tạo Calibration Engine
+
+        Args:
+            min_samples: Số mẫu hợp lệ tối thiểu để tính ngưỡng
+        """
+        self.min_samples = min_samples
+        self.reset()
+
+    def reset(self):
+        """Xóa toàn bộ thống kê"""
+        self.samples_seen = 0
+        self.blinks_rejected = 0
+        self.yawns_rejected = 0
+        self.ear_stats = RunningStats()
+        self.mar_stats = RunningStats()
+        self.ear_p05 = P2Quantile(0.05)
+        self.ear_p50 = P2Quantile(0.50)
+        self.mar_p50 = P2Quantile(0.50)
+        self.mar_p95 = P2Quantile(0.95)
+        # Trung vị của mọi mẫu (kể cả mẫu bị loại) dùng làm mốc phát hiện chớp mắt/ngáp
+        self._ear_reference = P2Quantile(0.50)
+        self._mar_reference = P2Quantile(0.50)
+        self._blink_until = -math.inf
+        self._yawn_until = -math.inf
+
+    @property
+    def accepted(self):
+        """Số mẫu EAR hợp lệ (không chớp mắt)"""
+        return self.ear_stats.count
+
+    def push(self, ear_value, mar_value, timestamp):
+        """
+        Thêm một mẫu EAR/MAR
+
+        Args:
+            ear_value: EAR của frame
+            mar_value: MAR của frame
+            timestamp: Thời điểm frame (giây)
+
+        Returns:
+            bool: True nếu mẫu EAR được dùng cho thống kê
+        """
+        self.samples_seen += 1
+        self._ear_reference.push(ear_value)
+        self._mar_reference.push(mar_value)
+        if self.samples_seen <= self.WARMUP_SAMPLES:
+            return False
+
+        # Loại ngáp (cả sau khi ngáp xong một chút, miệng còn đang khép lại)
+        if mar_value > self._mar_reference.value + self.YAWN_MARGIN:
+            self._yawn_until = timestamp + self.YAWN_HOLD
+        if timestamp <= self._yawn_until:
+            self.yawns_rejected += 1
+        else:
+            self.mar_stats.push(mar_value)
+            self.mar_p50.push(mar_value)
+            self.mar_p95.push(mar_value)
+
+        # Loại chớp mắt (mắt nhắm và mở lại mất vài frame)
+        if ear_value < self._ear_reference.value * self.BLINK_RATIO:
+            self._blink_until = timestamp + self.BLINK_HOLD
+        if timestamp <= self._blink_until:
+            self.blinks_rejected += 1
+            return False
+        self.ear_stats.push(ear_value)
+        self.ear_p05.push(ear_value)
+        self.ear_p50.push(ear_value)
+        return True
+
+    @property
+    def ready(self):
+        """True nếu đủ mẫu hợp lệ để tính ngưỡng"""
+        return self.ear_stats.count >= self.min_samples and self.mar_stats.count >= self.min_samples
+
+    def converged(self, tolerance=0.005):
+        """
+        Kiểm tra thống kê đã ổn định
+
+        Args:
+            tolerance: Sai số chuẩn tối đa của trung bình EAR
+
+        Returns:
+            bool: True nếu đủ mẫu và sai số chuẩn của EAR nhỏ hơn tolerance
+        """
+        stats = self.ear_stats
+        return self.ready and stats.std / math.sqrt(stats.count) < tolerance
+
+    def thresholds(self):
+        """
+        Tính ngưỡng từ thống kê hiện tại
+
+        Returns:
+            tuple: (ear_threshold, mar_threshold) hoặc None nếu chưa đủ mẫu
+        """
+        if not self.ready:
+            return None
+        ear_threshold = min(self.EAR_RATIO * self.ear_p50.value, self.ear_p05.value)
+        ear_threshold = max(self.EAR_LIMITS[0], min(self.EAR_LIMITS[1], ear_threshold))
+        mar_threshold = self.mar_p95.value + self.MAR_MARGIN
+        mar_threshold = max(self.MAR_LIMITS[0], min(self.MAR_LIMITS[1], mar_threshold))
+        return ear_threshold, mar_threshold
+
+    def summary(self):
+        """
+        Thống kê hiệu chỉnh (để hiển thị/lưu)
+
+        Returns:
+            dict: Số mẫu, số mẫu bị loại, thống kê và phân vị EAR/MAR
+        """
+        return {
+            'samples': self.samples_seen,
+            'blinks_rejected': self.blinks_rejected,
+            'yawns_rejected': self.yawns_rejected,
+            'ear': dict(self.ear_stats.as_dict(), p05=self.ear_p05.value, p50=self.ear_p50.value),
+            'mar': dict(self.mar_stats.as_dict(), p50=self.mar_p50.value, p95=self.mar_p95.value),
+        }
+
+
+class BackgroundCalibrator:
+    """
+    Hiệu chỉnh nền trong lúc giám sát
+
+    Chỉ học từ các frame ở mức SAFE. Mỗi chu kỳ (epoch_seconds) khi thống kê đã
+    ổn định, ngưỡng của detector được dịch một phần (blend) về ngưỡng mới rồi
+    bắt đầu chu kỳ mới, nên ngưỡng hội tụ dần và theo kịp thay đổi (ánh sáng,
+    tư thế) mà bộ nhớ vẫn cố định.
+    """
+
+    def __init__(self, detector, epoch_seconds=60.0, blend=0.3, engine=None):
+        """
+        Khởi tạo Background Calibrator
+
+        Args:
+            detector: DrowsinessDetector cần điều chỉnh ngưỡng (EAR_THRESHOLD/MAR_THRESHOLD)
+            epoch_seconds: Độ dài mỗi chu kỳ thu mẫu (giây)
+            blend: Tỉ lệ dịch về ngưỡng mới mỗi chu kỳ (1 = áp dụng ngay)
+            engine: CalibrationEngine (None = tạo mới)
+        """
+        self.detector = detector
+        self.epoch_seconds = epoch_seconds
+        self.blend = blend
+        self.engine = engine or CalibrationEngine(min_samples=200)
+        self.epochs = 0
+        self._epoch_start = None
+
+    def update(self, status, timestamp):
+        """
+        Đưa trạng thái của một frame vào hiệu chỉnh
+
+        Args:
+            status: Trạng thái từ DrowsinessDetector
+            timestamp: Thời điểm frame (giây)
+
+        Returns:
+            tuple: (ear_threshold, mar_threshold) nếu vừa áp dụng ngưỡng mới, ngược lại None
+        """
+        if status['alert_level'] != 'SAFE':
+            return None
+        if self._epoch_start is None:
+            self._epoch_start = timestamp
+        self.engine.push(status['ear'], status['mar'], timestamp)
+
+        if timestamp - self._epoch_start < self.epoch_seconds:
+            return None
+        applied = None
+        if self.engine.converged():
+            ear_target, mar_target = self.engine.thresholds()
+            detector = self.detector
+            detector.EAR_THRESHOLD += self.blend * (ear_target - detector.EAR_THRESHOLD)
+            detector.MAR_THRESHOLD += self.blend * (mar_target - detector.MAR_THRESHOLD)
+            self.epochs += 1
+            applied = (detector.EAR_THRESHOLD, detector.MAR_THRESHOLD)
+        self.engine.reset()
+        self._epoch_start = timestamp
+        return applied
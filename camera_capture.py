@@ -0,0 +1,359 @@
+"""
+Module đọc camera độ trễ thấp
+Cấu hình rõ độ phân giải, FPS, định dạng nén (FOURCC, mặc định MJPG) và kích
+thước buffer của driver; một luồng riêng đọc liên tục và chỉ giữ frame mới nhất,
+nên khi phân tích chậm hơn camera thì frame cũ bị bỏ thay vì nằm chờ trong buffer
+driver (có thể cũ hàng trăm mili giây). Mỗi frame kèm thời điểm chụp, số thứ tự
+và số frame bị bỏ trước nó.
+
+FileCapture đọc file video qua cùng giao diện (phát theo FPS gốc như camera hoặc
+lần lượt từng frame) để chạy thử/kiểm thử không cần camera.
+"""
+
+import threading
+import time
+
+import cv2
+
+
+class CapturedFrame:
+    """
+    Một frame đã đọc kèm thông tin thời gian
+    """
+
+    __slots__ = ('image', 'timestamp', 'index', 'dropped')
+
+    def __init__(self, image, timestamp, index, dropped):
+        """
+        Args:
+            image: Ảnh BGR
+            timestamp: Thời điểm đọc xong frame từ driver (time.monotonic())
+            index: Số thứ tự frame từ lúc mở (bắt đầu từ 0)
+            dropped: Số frame bị bỏ (đọc nhưng không được lấy) ngay trước frame này
+        """
+        self.image = image
+        self.timestamp = timestamp
+        self.index = index
+        self.dropped = dropped
+
+
+def configure_capture(capture, size=None, fps=None, fourcc=None, buffer_size=None):
+    """
+    Áp dụng cấu hình cho cv2.VideoCapture đã mở
+
+    FOURCC phải được đặt trước độ phân giải (nhiều driver chỉ cho độ phân giải
+    cao ở MJPG). Thuộc tính không được hỗ trợ bị bỏ qua.
+
+    Args:
+        capture: cv2.VideoCapture
+        size: (width, height) hoặc None
+        fps: FPS yêu cầu hoặc None
+        fourcc: Mã định dạng 4 ký tự (ví dụ 'MJPG') hoặc None
+        buffer_size: Số frame driver được giữ (1 = chỉ frame mới nhất) hoặc None
+
+    Returns:
+        dict: Cấu hình thực tế sau khi đặt ('width', 'height', 'fps', 'fourcc', 'buffer_size')
+    """
+    if fourcc:
+        capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    if size is not None:
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+    if fps:
+        capture.set(cv2.CAP_PROP_FPS, fps)
+    if buffer_size is not None:
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+
+    code = int(capture.get(cv2.CAP_PROP_FOURCC))
+    return {
+        'width': int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'fps': capture.get(cv2.CAP_PROP_FPS),
+        'fourcc': ''.join(chr((code >> (8 * i)) & 0xFF) for i in range(4)) if code > 0 else None,
+        'buffer_size': int(capture.get(cv2.CAP_PROP_BUFFERSIZE)),
+    }
+
+
+class CameraCapture:
+    """
+    Class đọc camera trên luồng riêng, luôn trả về frame mới nhất
+
+    Có read()/get()/isOpened()/release() như cv2.VideoCapture để dùng thay thế trực tiếp.
+    """
+
+    def __init__(self, source=0, size=None, fps=None, fourcc='MJPG', buffer_size=1,
+                 threaded=True):
+        """
+        Khởi tạo Camera Capture
+
+        Args:
+            source: Index camera (hoặc đường dẫn/URL mà cv2.VideoCapture nhận)
+            size: (width, height) yêu cầu (None = mặc định của camera)
+            fps: FPS yêu cầu (None = mặc định của camera)
+            fourcc: Định dạng nén yêu cầu (None = mặc định của driver)
+            buffer_size: Kích thước buffer driver (None = mặc định)
+            threaded: True để đọc liên tục trên luồng riêng; False để đọc khi được gọi
+        """
+        self.source = source
+        self.size = size
+        self.fps = fps
+        self.fourcc = fourcc
+        self.buffer_size = buffer_size
+        self.threaded = threaded
+        self.settings = {}
+
+        self._capture = None
+        self._condition = threading.Condition()
+        self._latest = None           # CapturedFrame mới nhất đã đọc
+        self._last_delivered = -1     # index của frame trả về gần nhất
+        self._next_index = 0
+        self._ended = False
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.stats = {'frames_read': 0, 'frames_delivered': 0, 'frames_dropped': 0,
+                      'read_failures': 0}
+
+    def _create_capture(self):
+        """Mở và cấu hình cv2.VideoCapture"""
+        capture = cv2.VideoCapture(self.source)
+        if capture.isOpened():
+            self.settings = configure_capture(capture, self.size, self.fps, self.fourcc,
+                                              self.buffer_size)
+        return capture
+
+    def open(self):
+        """
+        Mở nguồn và khởi động luồng đọc
+
+        Returns:
+            bool: True nếu mở thành công
+        """
+        capture = self._create_capture()
+        if not capture.isOpened():
+            capture.release()
+            return False
+        self._capture = capture
+        self._stop_event.clear()
+        self._ended = False
+        if self.threaded:
+            self._thread = threading.Thread(target=self._grab_loop, name='DrowsyGuard-capture',
+                                            daemon=True)
+            self._thread.start()
+        return True
+
+    def isOpened(self):
+        return self._capture is not None and not self._ended
+
+    def get(self, prop):
+        """Đọc thuộc tính của cv2.VideoCapture (0 nếu chưa mở)"""
+        capture = self._capture
+        return capture.get(prop) if capture is not None else 0.0
+
+    def _read_frame(self):
+        """
+        Đọc một frame từ driver
+
+        Returns:
+            ảnh BGR hoặc None nếu không đọc được
+        """
+        ret, image = self._capture.read()
+        return image if ret else None
+
+    def _grab_loop(self):
+        """Luồng đọc: đọc liên tục, chỉ giữ frame mới nhất"""
+        failures = 0
+        while not self._stop_event.is_set():
+            image = self._read_frame()
+            if image is None:
+                if self._stop_event.is_set() or self._source_ended():
+                    break
+                self.stats['read_failures'] += 1
+                failures += 1
+                # Camera lỗi tạm thời: chờ ngắn, tăng dần để không chiếm CPU
+                self._stop_event.wait(min(0.5, 0.01 * failures))
+                continue
+            failures = 0
+            self._publish(image, time.monotonic())
+
+        with self._condition:
+            self._ended = True
+            self._condition.notify_all()
+
+    def _source_ended(self):
+        """True nếu nguồn đã hết frame (camera không bao giờ hết)"""
+        return False
+
+    def _publish(self, image, timestamp):
+        """Ghi đè frame mới nhất và đánh thức luồng đang chờ"""
+        with self._condition:
+            self._latest = CapturedFrame(image, timestamp, self._next_index, 0)
+            self._next_index += 1
+            self.stats['frames_read'] += 1
+            self._condition.notify_all()
+
+    def read_latest(self, timeout=1.0):
+        """
+        Lấy frame mới nhất chưa được trả về
+
+        Chờ tối đa timeout giây nếu chưa có frame mới; các frame được đọc từ lần
+        gọi trước nhưng không phải mới nhất bị bỏ và được đếm.
+
+        Args:
+            timeout: Thời gian chờ tối đa (giây)
+
+        Returns:
+            CapturedFrame: Frame mới nhất hoặc None nếu hết thời gian chờ/đã hết nguồn
+        """
+        if not self.threaded:
+            return self._read_direct()
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._latest is None or self._latest.index <= self._last_delivered:
+                remaining = deadline - time.monotonic()
+                if self._ended or remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            latest = self._latest
+            dropped = latest.index - self._last_delivered - 1
+            self._last_delivered = latest.index
+            self.stats['frames_delivered'] += 1
+            self.stats['frames_dropped'] += dropped
+        return CapturedFrame(latest.image, latest.timestamp, latest.index, dropped)
+
+    def _read_direct(self):
+        """Chế độ không luồng: đọc frame kế tiếp từ driver"""
+        if self._capture is None:
+            return None
+        image = self._read_frame()
+        if image is None:
+            if self._source_ended():
+                self._ended = True
+            else:
+                self.stats['read_failures'] += 1
+            return None
+        index = self._next_index
+        self._next_index += 1
+        self._last_delivered = index
+        self.stats['frames_read'] += 1
+        self.stats['frames_delivered'] += 1
+        return CapturedFrame(image, time.monotonic(), index, 0)
+
+    def read(self):
+        """
+        Đọc frame mới nhất (giống cv2.VideoCapture.read)
+
+        Returns:
+            tuple: (ret, image)
+        """
+        captured = self.read_latest()
+        if captured is None:
+            return False, None
+        return True, captured.image
+
+    def get_stats(self):
+        """
+        Thống kê đọc camera
+
+        Returns:
+            dict: Số frame đã đọc, đã trả về, bị bỏ, lỗi đọc và cấu hình thực tế
+        """
+        stats = dict(self.stats)
+        stats.update(self.settings)
+        return stats
+
+    def release(self):
+        """Dừng luồng đọc và giải phóng camera"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+        with self._condition:
+            self._latest = None
+            self._condition.notify_all()
+
+
+class FileCapture(CameraCapture):
+    """
+    Class đọc file video qua cùng giao diện với CameraCapture
+
+    realtime=True phát frame theo FPS của file trên luồng riêng (bỏ frame khi
+    phân tích không kịp, giống camera); realtime=False trả về lần lượt từng frame
+    khi được gọi, kết quả lặp lại được giữa các lần chạy.
+    """
+
+    def __init__(self, path, realtime=True, loop=False, fps=None):
+        """
+        Khởi tạo File Capture
+
+        Args:
+            path: Đường dẫn file video
+            realtime: True để phát theo thời gian thực
+            loop: True để phát lại từ đầu khi hết file
+            fps: FPS phát (None = FPS ghi trong file, mặc định 30)
+        """
+        super().__init__(path, fourcc=None, buffer_size=None, threaded=realtime)
+        self.loop = loop
+        self.playback_fps = fps
+        self._interval = 0.0
+        self._next_due = None
+
+    def _create_capture(self):
+        capture = cv2.VideoCapture(self.source)
+        if capture.isOpened():
+            fps = self.playback_fps or capture.get(cv2.CAP_PROP_FPS) or 30.0
+            self._interval = 1.0 / fps
+            self.settings = {
+                'width': int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                'height': int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                'fps': fps,
+                'fourcc': None,
+                'buffer_size': None,
+            }
+        self._next_due = None
+        return capture
+
+    def _read_frame(self):
+        # Giữ nhịp FPS của file (chỉ ở chế độ thời gian thực)
+        if self.threaded:
+            now = time.monotonic()
+            if self._next_due is None:
+                self._next_due = now
+            elif self._next_due > now:
+                if self._stop_event.wait(self._next_due - now):
+                    return None
+            self._next_due = max(self._next_due + self._interval, time.monotonic() - self._interval)
+
+        ret, image = self._capture.read()
+        if not ret and self.loop:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, image = self._capture.read()
+        return image if ret else None
+
+    def _source_ended(self):
+        # Với file, đọc thất bại nghĩa là đã hết file
+        return True
+
+
+def open_capture(source, size=None, fps=None, fourcc='MJPG', buffer_size=1, realtime=True):
+    """
+    Mở camera (index) hoặc file video (đường dẫn)
+
+    Args:
+        source: Index camera (int) hoặc đường dẫn file video (str)
+        size, fps, fourcc, buffer_size: Cấu hình camera (xem CameraCapture)
+        realtime: Với file video - phát theo FPS gốc (xem FileCapture)
+
+    Returns:
+        CameraCapture: Nguồn đã mở hoặc None nếu thất bại
+    """
+    if isinstance(source, str):
+        capture = FileCapture(source, realtime=realtime)
+    else:
+        capture = CameraCapture(source, size=size, fps=fps, fourcc=fourcc,
+                                buffer_size=buffer_size)
+    if not capture.open():
+        return None
+    return capture
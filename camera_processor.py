@@ -3,12 +3,23 @@ Module xử lý video từ camera
 Kết hợp tất cả các module để phân tích trạng thái buồn ngủ
 """
 
+import queue
+import threading
+import time
+
 import cv2
 import numpy as np
+from camera_capture import open_capture
 from face_detector import FaceDetector
 from ear_calculator import EARCalculator
 from mar_calculator import MARCalculator
-from drowsiness_detector import DrowsinessDetector
+from drowsiness_detector import DrowsinessDetector, TimedDrowsinessDetector, NO_FACE_STATUS
+from landmark_tracker import AdaptiveLandmarkDetector
+from landmark_recording import LandmarkRecorder
+from face_tracker import FaceTracker
+from calibration import BackgroundCalibrator
+from overlay import build_overlay, rasterize_overlay
+from stage_timer import StageTimer, NULL_STAGE_TIMER
 
 
 class CameraProcessor:
@@ -16,23 +27,218 @@ class CameraProcessor:
     Class xử lý video từ camera và phân tích trạng thái buồn ngủ
     """
     
-    def __init__(self, camera_index=0):
+    # Tên mốc trong StartupReport
+    STARTUP_LABELS = {
+        'warm_up': 'Mô hình Face Mesh đã chạy thử',
+        'camera_open': 'Camera đã mở',
+        'first_frame': 'Frame đầu tiên từ camera',
+        'first_analysis': 'Frame đầu tiên được phân tích',
+    }
+    
+    def __init__(self, camera_index=0, use_pipeline=False, frame_queue_size=2,
+                 use_wall_clock=False, use_tracking=False, use_roi=False,
+                 capture_size=None, inference_size=None, max_faces=1, primary_policy='largest',
+                 capture_fps=None, capture_fourcc='MJPG', capture_buffer_size=1):
         """
         Khởi tạo Camera Processor
         
         Args:
-            camera_index: Index của camera (thường 0 cho camera trước)
+            camera_index: Index của camera (thường 0 cho camera trước), hoặc đường dẫn
+                          file video (phát theo FPS gốc như camera, xem FileCapture)
+            use_pipeline: True để đọc camera và phân tích trên các luồng riêng,
+                          GUI chỉ lấy kết quả mới nhất qua process_frame()
+            frame_queue_size: Số frame tối đa chờ phân tích trong pipeline
+            use_wall_clock: True để dùng TimedDrowsinessDetector (ngưỡng theo giây,
+                            dựa trên thời điểm chụp frame) thay vì đếm frame
+            use_tracking: True để chỉ chạy Face Mesh mỗi N frame, các frame ở giữa
+                          dịch chuyển landmark bằng optical flow
+            use_roi: True để Face Mesh chỉ chạy trên vùng cắt quanh khuôn mặt
+            capture_size: (width, height) yêu cầu camera (None = mặc định của camera)
+            inference_size: Cạnh dài tối đa của ảnh đưa vào Face Mesh, độc lập với độ
+                            phân giải hiển thị (None = dùng nguyên frame)
+            max_faces: Số khuôn mặt tối đa. Lớn hơn 1 để theo dõi từng khuôn mặt với
+                       trạng thái buồn ngủ riêng (ví dụ có phụ xe); chỉ tài xế chính
+                       quyết định cảnh báo
+            primary_policy: Cách chọn tài xế chính khi có nhiều khuôn mặt
+                            (xem FaceTracker.POLICIES)
+            capture_fps: FPS yêu cầu camera (None = mặc định của camera)
+            capture_fourcc: Định dạng nén yêu cầu camera (None = mặc định của driver)
+            capture_buffer_size: Số frame driver được giữ (None = mặc định)
         """
+        if max_faces > 1 and use_tracking:
+            raise ValueError("Chế độ nhiều khuôn mặt không hỗ trợ tracking bằng optical flow")
         self.camera_index = camera_index
+        self.capture_size = capture_size
+        self.capture_fps = capture_fps
+        self.capture_fourcc = capture_fourcc
+        self.capture_buffer_size = capture_buffer_size
         self.capture = None
+        
+        # True: lật gương frame trên CPU trước khi phân tích và vẽ.
+        # False: giữ frame theo hướng camera, phần hiển thị tự lật (ví dụ bằng texture UV)
+        self.mirror_frame = True
+        
+        # True: vẽ overlay lên frame bằng cv2 (xuất video / hiển thị đơn giản).
+        # False: chỉ tạo mô tả overlay, giao diện tự vẽ (get_current_overlay)
+        self.draw_overlays = True
         self.is_running = False
         
         # Khởi tạo các module
-        self.face_detector = FaceDetector()
-        self.drowsiness_detector = DrowsinessDetector()
+        self.face_detector = FaceDetector(max_num_faces=max_faces, use_roi=use_roi and max_faces == 1,
+                                          inference_size=inference_size)
+        if use_wall_clock:
+            self.drowsiness_detector = TimedDrowsinessDetector()
+        else:
+            self.drowsiness_detector = DrowsinessDetector()
+        
+        # Nguồn landmark thích ứng (Face Mesh + optical flow), None = Face Mesh mỗi frame
+        self.landmark_source = AdaptiveLandmarkDetector(self.face_detector) if use_tracking else None
+        
+        # Theo dõi nhiều khuôn mặt, mỗi khuôn mặt một detector (None = chỉ một khuôn mặt)
+        self.face_tracker = None
+        if max_faces > 1:
+            self.face_tracker = FaceTracker(self._new_face_detector, primary_policy)
+        
+        # Đo độ trễ từng giai đoạn (tắt mặc định, xem enable_instrumentation)
+        self.stage_timer = NULL_STAGE_TIMER
+        
+        # Ghi landmark ra file .dglm (None = không ghi, xem start_recording)
+        self.recorder = None
+        self._recorder_lock = threading.Lock()
+        
+        # Nhật ký phiên (SessionLogger, None = không ghi); ghi không chặn
+        self.session_logger = None
+        
+        # Yêu cầu reset/đổi ngưỡng detector từ luồng khác (GUI), áp dụng trên luồng
+        # phân tích trước frame kế tiếp để không sửa detector khi update() đang chạy
+        self._detector_lock = threading.Lock()
+        self._pending_reset = False
+        self._pending_thresholds = None
+        # Thế hệ reset: kết quả phân tích trước lần reset gần nhất bị bỏ, không giao cho GUI
+        self._reset_generation = 0
+        self._analysis_generation = 0
+        
+        # Hiệu chỉnh ngưỡng nền trong lúc giám sát (None = tắt, xem enable_background_calibration)
+        self.background_calibrator = None
         
         # Trạng thái hiện tại
         self.current_status = None
+        self.current_overlay = None
+        self.display_overlay = None
+        
+        # Pipeline: luồng đọc camera -> hàng đợi frame -> luồng phân tích -> kết quả mới nhất
+        self.use_pipeline = use_pipeline
+        self.frame_queue_size = frame_queue_size
+        self._frame_queue = None
+        self._threads = []
+        self._stop_event = threading.Event()
+        self._result_lock = threading.Lock()
+        self._latest_result = None
+        self._pipeline_ended = False  # Luồng phân tích đã xử lý hết frame của nguồn
+        self._status_snapshot = None  # Bản sao trạng thái mới nhất cho luồng khác đọc
+        self._pipeline_stats = self._new_pipeline_stats()
+        
+        # Chuẩn bị nền (xem prepare_async): chạy thử mô hình + mở camera song song
+        self._prepare_threads = []
+        self._prepared_capture = None
+        self.startup_report = None
+        self.startup_times = {}  # {'warm_up', 'camera_open', 'first_frame', 'first_analysis'} (giây)
+        self._start_time = None
+        self._awaiting_first_frame = False
+        self._awaiting_first_analysis = False
+    
+    def prepare_async(self, report=None):
+        """
+        Chuẩn bị trước khi start() trên các luồng nền
+        
+        Tạo mô hình Face Mesh và chạy thử (FaceDetector.warm_up) song song với
+        việc mở camera và đọc frame đầu tiên, để khi bấm bắt đầu frame đầu tiên
+        không phải chờ khởi tạo graph Mediapipe hay driver camera. start() tự
+        chờ phần chuẩn bị còn dang dở.
+        
+        Args:
+            report: StartupReport để ghi các mốc thời gian (None = không ghi)
+        """
+        if self._prepare_threads or self.is_running:
+            return
+        self.startup_report = report
+        self._prepare_threads = [
+            threading.Thread(target=self._prepare_model, name='DrowsyGuard-warmup', daemon=True),
+            threading.Thread(target=self._prepare_camera, name='DrowsyGuard-camera-open',
+                             daemon=True),
+        ]
+        for thread in self._prepare_threads:
+            thread.start()
+    
+    def _prepare_model(self):
+        """Luồng chuẩn bị: tạo và chạy thử Face Mesh"""
+        try:
+            elapsed = self.face_detector.warm_up(self.capture_size or (640, 480))
+        except Exception as e:
+            print(f"Lỗi khi chạy thử mô hình: {e}")
+            return
+        self._mark_startup('warm_up', elapsed)
+    
+    def _prepare_camera(self):
+        """Luồng chuẩn bị: mở camera và đọc frame đầu tiên"""
+        start = time.perf_counter()
+        try:
+            capture = self._open_capture()
+        except Exception as e:
+            print(f"Lỗi khi mở camera: {e}")
+            return
+        if capture is None:
+            return
+        # Frame đầu tiên thường chậm (driver khởi động cảm biến, cân bằng sáng)
+        capture.read_latest(timeout=3.0)
+        self._prepared_capture = capture
+        self._mark_startup('camera_open', time.perf_counter() - start)
+    
+    def wait_prepared(self, timeout=None):
+        """Chờ các luồng chuẩn bị của prepare_async() kết thúc"""
+        for thread in self._prepare_threads:
+            thread.join(timeout)
+        self._prepare_threads = [thread for thread in self._prepare_threads if thread.is_alive()]
+    
+    def _open_capture(self):
+        """
+        Mở camera với độ phân giải, FPS, định dạng và buffer yêu cầu; luồng đọc
+        riêng luôn giữ frame mới nhất (xem camera_capture)
+        
+        Returns:
+            CameraCapture: Camera đã mở hoặc None nếu thất bại
+        """
+        return open_capture(self.camera_index, size=self.capture_size, fps=self.capture_fps,
+                            fourcc=self.capture_fourcc, buffer_size=self.capture_buffer_size)
+    
+    def _mark_startup(self, name, elapsed):
+        """Ghi thời gian một bước khởi động (và mốc tương ứng vào StartupReport)"""
+        self.startup_times[name] = elapsed
+        if self.startup_report is not None:
+            self.startup_report.mark(self.STARTUP_LABELS[name])
+    
+    def get_startup_stats(self):
+        """
+        Thời gian khởi động
+        
+        Returns:
+            dict: {'warm_up_ms', 'camera_open_ms'} (đo trên luồng chuẩn bị) và
+                  {'first_frame_ms', 'first_analysis_ms'} (tính từ lúc gọi start()),
+                  None với bước chưa xảy ra
+        """
+        return {f"{name}_ms": (self.startup_times[name] * 1000 if name in self.startup_times else None)
+                for name in self.STARTUP_LABELS}
+    
+    def format_startup(self):
+        """Tạo dòng tóm tắt thời gian khởi động"""
+        stats = self.get_startup_stats()
+        parts = []
+        for name, label in (('warm_up', 'chạy thử mô hình'), ('camera_open', 'mở camera'),
+                            ('first_frame', 'frame đầu'), ('first_analysis', 'phân tích đầu')):
+            value = stats[f"{name}_ms"]
+            if value is not None:
+                parts.append(f"{label} {value:.0f} ms")
+        return "Khởi động: " + ", ".join(parts) if parts else "Khởi động: chưa có số liệu"
     
     def start(self):
         """
@@ -42,12 +248,29 @@ class CameraProcessor:
             bool: True nếu khởi động thành công, False nếu thất bại
         """
         try:
-            self.capture = cv2.VideoCapture(self.camera_index)
-            if not self.capture.isOpened():
+            self._start_time = time.perf_counter()
+            for name in ('first_frame', 'first_analysis'):
+                self.startup_times.pop(name, None)
+            
+            # Dùng camera đã mở sẵn bởi prepare_async() (nếu có); Face Mesh không
+            # được chạy song song với luồng chạy thử nên luôn chờ chuẩn bị xong
+            self.wait_prepared()
+            capture, self._prepared_capture = self._prepared_capture, None
+            self.capture = capture if capture is not None else self._open_capture()
+            if self.capture is None:
                 return False
             
+            self._awaiting_first_frame = True
+            self._awaiting_first_analysis = True
             self.is_running = True
             self.drowsiness_detector.reset()
+            self.face_detector.roi = None
+            if self.landmark_source is not None:
+                self.landmark_source.reset()
+            if self.face_tracker is not None:
+                self.face_tracker.reset()
+            if self.use_pipeline:
+                self._start_pipeline()
             return True
         except Exception as e:
             print(f"Lỗi khi khởi động camera: {e}")
@@ -56,6 +279,9 @@ class CameraProcessor:
     def stop(self):
         """Dừng xử lý camera"""
         self.is_running = False
+        # Dừng các luồng trước khi giải phóng camera để tránh đọc từ capture đã đóng
+        self._stop_pipeline()
+        self._apply_detector_requests()
         if self.capture:
             self.capture.release()
             self.capture = None
@@ -65,64 +291,276 @@ class CameraProcessor:
         """
         Xử lý một frame từ camera
         
+        Ở chế độ pipeline, hàm không đọc camera mà chỉ lấy kết quả mới nhất
+        do luồng phân tích tạo ra (không chặn luồng giao diện).
+        
         Returns:
             tuple: (success, frame, status)
                 success: True nếu xử lý thành công
+                         (False nếu chưa có kết quả mới ở chế độ pipeline, hoặc
+                         nguồn đã hết - kiểm tra source_ended)
                 frame: Frame đã được xử lý và vẽ thông tin
-                status: Dictionary chứa thông tin trạng thái (từ DrowsinessDetector)
+                status: Trạng thái từ DrowsinessDetector (DrowsinessStatus, đọc như dictionary)
         """
         if not self.is_running or self.capture is None:
             return False, None, None
         
+        if self.use_pipeline:
+            return self._poll_latest_result()
+        
         # Đọc frame từ camera
-        ret, frame = self.capture.read()
-        if not ret:
+        timer = self.stage_timer
+        timer.start_frame()
+        captured = self.capture.read_latest()
+        if captured is None:
             return False, None, None
+        timer.mark('capture')
+        if self._awaiting_first_frame:
+            self._first_frame_read()
+        
+        result = self._analyze_frame(captured.image, captured.timestamp)
+        self.display_overlay = self.current_overlay
+        return result
+    
+    def request_detector_reset(self):
+        """
+        Yêu cầu reset detector (an toàn khi gọi từ luồng giao diện)
+        
+        Kết quả đang chờ và kết quả của các frame phân tích trước khi reset được áp
+        dụng đều bị bỏ, nên cảnh báo đã xác nhận không hiện lại.
+        """
+        with self._detector_lock:
+            self._pending_reset = True
+            self._reset_generation += 1
+        with self._result_lock:
+            self._latest_result = None
+            self._status_snapshot = None
+        if not self._threads:
+            self._apply_detector_requests()
+    
+    def set_thresholds(self, ear_threshold, mar_threshold):
+        """
+        Đặt ngưỡng EAR/MAR cho detector (an toàn khi gọi từ luồng giao diện)
+        
+        Ở chế độ pipeline đang chạy, ngưỡng được áp dụng trước frame phân tích kế tiếp.
+        
+        Args:
+            ear_threshold: Ngưỡng EAR mắt nhắm
+            mar_threshold: Ngưỡng MAR ngáp
+        """
+        with self._detector_lock:
+            self._pending_thresholds = (ear_threshold, mar_threshold)
+        if not self._threads:
+            self._apply_detector_requests()
+    
+    def _apply_detector_requests(self):
+        """Áp dụng các yêu cầu reset/đổi ngưỡng đang chờ (trên luồng phân tích)"""
+        if not self._pending_reset and self._pending_thresholds is None:
+            return
+        with self._detector_lock:
+            reset, self._pending_reset = self._pending_reset, False
+            thresholds, self._pending_thresholds = self._pending_thresholds, None
+            generation = self._reset_generation
+        
+        detectors = [self.drowsiness_detector]
+        if self.face_tracker is not None:
+            detectors.extend(track.detector for track in self.face_tracker.tracks)
+        for detector in detectors:
+            if thresholds is not None:
+                detector.EAR_THRESHOLD, detector.MAR_THRESHOLD = thresholds
+            if reset:
+                detector.reset()
+        if reset:
+            self._analysis_generation = generation
+    
+    @property
+    def source_ended(self):
+        """
+        True nếu nguồn đã hết frame (file video) và mọi kết quả đã được lấy ra;
+        camera không bao giờ hết
+        """
+        capture = self.capture
+        if capture is None or capture.isOpened():
+            return False
+        if not self.use_pipeline:
+            return True
+        with self._result_lock:
+            return self._pipeline_ended and self._latest_result is None
+    
+    def _analyze_frame(self, frame, timestamp=None):
+        """
+        Phân tích một frame: phát hiện khuôn mặt, tính EAR/MAR, cập nhật trạng thái
+        
+        Args:
+            frame: Frame ảnh BGR đọc từ camera
+            timestamp: Thời điểm chụp frame (giây, time.monotonic())
+        
+        Returns:
+            tuple: (success, frame, status) giống process_frame()
+        """
+        # Ở chế độ pipeline, việc đọc camera được đo riêng trên luồng đọc
+        timer = self.stage_timer
+        if self.use_pipeline:
+            timer.start_frame()
+        self._apply_detector_requests()
         
         # Lật ảnh để hiển thị như gương
-        frame = cv2.flip(frame, 1)
+        if self.mirror_frame:
+            frame = cv2.flip(frame, 1)
+        timer.mark('preprocess')
         
-        # Phát hiện khuôn mặt
-        face_detected, landmarks = self.face_detector.detect_face(frame)
+        # Phát hiện khuôn mặt, tính EAR/MAR và cập nhật trạng thái buồn ngủ
+        if self.face_tracker is not None:
+            landmarks, status = self._analyze_faces(frame, timestamp)
+        else:
+            landmarks, status = self._analyze_face(frame, timestamp)
         
-        if face_detected and landmarks:
-            # Tính EAR (Eye Aspect Ratio)
-            ear_value = EARCalculator.calculate_avg_ear(
-                landmarks['left_eye'],
-                landmarks['right_eye']
-            )
-            
-            # Tính MAR (Mouth Aspect Ratio)
-            mar_value = MARCalculator.calculate_mar(landmarks['mouth'])
-            
-            # Cập nhật trạng thái buồn ngủ
-            status = self.drowsiness_detector.update(ear_value, mar_value)
-            self.current_status = status
-            
-            # Vẽ landmarks lên frame
-            self.face_detector.draw_landmarks(frame, landmarks, 
-                                            draw_eyes=True, draw_mouth=True)
-            
-            # Vẽ thông tin lên frame
-            self._draw_info_on_frame(frame, status)
-            
-            return True, frame, status
+        if status is None:
+            # Không phát hiện khuôn mặt (trạng thái dùng chung, không tạo mới mỗi frame)
+            status = NO_FACE_STATUS
+        self.current_status = status
+        if self.session_logger is not None:
+            self.session_logger.log_status(status, timestamp)
+        if self.background_calibrator is not None and status is not NO_FACE_STATUS:
+            self._update_background_calibration(status, timestamp)
+        
+        # Mô tả overlay (chữ, thanh điểm, viền landmark); chỉ vẽ lên frame khi cần
+        h, w = frame.shape[:2]
+        overlay = build_overlay(status, landmarks, (w, h), mirror=not self.mirror_frame)
+        self.current_overlay = overlay
+        if self.draw_overlays:
+            rasterize_overlay(frame, overlay)
+        timer.mark('overlay')
+        timer.end_frame()
+        if self._awaiting_first_analysis:
+            self._awaiting_first_analysis = False
+            self._mark_startup('first_analysis', time.perf_counter() - self._start_time)
+        
+        return True, frame, status
+    
+    def _first_frame_read(self):
+        """Ghi thời gian từ start() đến frame camera đầu tiên"""
+        self._awaiting_first_frame = False
+        self._mark_startup('first_frame', time.perf_counter() - self._start_time)
+    
+    def _analyze_face(self, frame, timestamp):
+        """
+        Phân tích khuôn mặt đầu tiên trong frame (chế độ một khuôn mặt)
+        
+        Returns:
+            tuple: (landmarks, status) - (None, None) nếu không phát hiện khuôn mặt
+        """
+        timer = self.stage_timer
+        
+        # Phát hiện khuôn mặt (chỉ trích xuất các landmark mắt và miệng)
+        if self.landmark_source is not None:
+            alert_level = self.current_status['alert_level'] if self.current_status else 'SAFE'
+            face_detected, key_points = self.landmark_source.detect_key_points(frame, alert_level)
+            timer.mark('tracking')
+            mesh_points = key_points
+        elif self.recorder is not None and self.recorder.full_mesh:
+            # Ghi toàn bộ lưới: trích xuất mọi điểm rồi lấy các điểm mắt/miệng từ đó
+            face_detected, mesh_points = self.face_detector.detect_face_array(frame)
+            key_points = mesh_points[FaceDetector.KEY_INDICES] if face_detected else None
         else:
-            # Không phát hiện khuôn mặt
-            self._draw_no_face_warning(frame)
-            status = {
-                'drowsy': False,
-                'alert_level': 'NO_FACE',
-                'reason': 'Không phát hiện khuôn mặt',
-                'ear': 0,
-                'mar': 0,
-                'eye_closed_frames': 0,
-                'yawn_frames': 0,
-                'total_yawns': 0,
-                'drowsiness_score': 0,
-                'alert_active': False
-            }
-            return True, frame, status
+            face_detected, key_points = self.face_detector.detect_face_array(
+                frame, FaceDetector.KEY_INDICES)
+            mesh_points = key_points
+        
+        if self.recorder is not None:
+            self._record_landmarks(timestamp, mesh_points if face_detected else None)
+        
+        if not face_detected:
+            return None, None
+        
+        landmarks = FaceDetector.split_key_landmarks(key_points)
+        
+        # Tính EAR (Eye Aspect Ratio)
+        ear_value = EARCalculator.calculate_avg_ear(
+            landmarks['left_eye'],
+            landmarks['right_eye']
+        )
+        
+        # Tính MAR (Mouth Aspect Ratio)
+        mar_value = MARCalculator.calculate_mar(landmarks['mouth'])
+        timer.mark('ear_mar')
+        
+        # Cập nhật trạng thái buồn ngủ
+        status = self.drowsiness_detector.update(ear_value, mar_value, timestamp)
+        timer.mark('detector_update')
+        return landmarks, status
+    
+    def _analyze_faces(self, frame, timestamp):
+        """
+        Phân tích mọi khuôn mặt trong frame (chế độ nhiều khuôn mặt)
+        
+        Mỗi khuôn mặt được theo dõi cập nhật detector riêng; EAR/MAR của tất cả
+        khuôn mặt tính trong một lần gọi vector hóa. Trạng thái trả về là của
+        tài xế chính.
+        
+        Returns:
+            tuple: (landmarks, status) của tài xế chính - (None, None) nếu không thấy
+        """
+        timer = self.stage_timer
+        boxes, key_points = self.face_detector.detect_faces_array(frame, FaceDetector.KEY_INDICES)
+        tracks = self.face_tracker.update(boxes, key_points, frame.shape[1],
+                                          mirrored=self.mirror_frame)
+        timer.mark('face_tracking')
+        
+        primary = self.face_tracker.primary
+        primary_visible = primary is not None and primary.visible
+        if self.recorder is not None:
+            self._record_landmarks(timestamp, primary.key_points if primary_visible else None)
+        if not tracks:
+            return None, None
+        
+        ears = EARCalculator.calculate_avg_ear_batch(key_points[:, FaceDetector.KEY_LEFT_EYE],
+                                                     key_points[:, FaceDetector.KEY_RIGHT_EYE])
+        mars = MARCalculator.calculate_mar_batch(key_points[:, FaceDetector.KEY_MOUTH])
+        timer.mark('ear_mar')
+        
+        for track in tracks:
+            track.status = track.detector.update(float(ears[track.detection]),
+                                                 float(mars[track.detection]), timestamp)
+        timer.mark('detector_update')
+        
+        # Tài xế chính bị che/khuất tạm thời: coi như không thấy khuôn mặt
+        if not primary_visible:
+            return None, None
+        return FaceDetector.split_key_landmarks(primary.key_points), primary.status
+    
+    def _new_face_detector(self):
+        """
+        Tạo detector cho một khuôn mặt mới (cùng loại và ngưỡng với drowsiness_detector)
+        
+        Returns:
+            DrowsinessDetector: Detector mới
+        """
+        template = self.drowsiness_detector
+        detector = type(template)()
+        # Ngưỡng đã hiệu chỉnh được gán trên đối tượng mẫu
+        for name in ('EAR_THRESHOLD', 'MAR_THRESHOLD'):
+            if name in vars(template):
+                setattr(detector, name, getattr(template, name))
+        return detector
+    
+    def get_faces(self):
+        """
+        Lấy thông tin các khuôn mặt đang theo dõi (chế độ nhiều khuôn mặt)
+        
+        Returns:
+            list: [{'track_id', 'box', 'visible', 'primary', 'status'}] (rỗng ở chế độ một khuôn mặt)
+        """
+        if self.face_tracker is None:
+            return []
+        primary = self.face_tracker.primary
+        return [{
+            'track_id': track.track_id,
+            'box': tuple(float(v) for v in track.box),
+            'visible': track.visible,
+            'primary': track is primary,
+            'status': track.status,
+        } for track in self.face_tracker.tracks]
     
     def _draw_info_on_frame(self, frame, status):
         """
@@ -132,58 +570,8 @@ class CameraProcessor:
             frame: Frame ảnh
             status: Dictionary trạng thái từ DrowsinessDetector
         """
-        h, w, _ = frame.shape
-        
-        # Màu sắc theo mức độ cảnh báo
-        if status['alert_level'] == 'DANGER':
-            color = (0, 0, 255)  # Đỏ
-            text = f"CANH BAO: {status['reason']}"
-        elif status['alert_level'] == 'WARNING':
-            color = (0, 165, 255)  # Cam
-            text = f"CHU Y: {status['reason']}"
-        else:
-            color = (0, 255, 0)  # Xanh lá
-            text = status['reason']
-        
-        # Vẽ text trạng thái
-        cv2.putText(frame, text, (10, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-        
-        # Vẽ thông tin EAR
-        cv2.putText(frame, f"EAR: {status['ear']:.2f}", (w - 150, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-        
-        # Vẽ thông tin MAR
-        cv2.putText(frame, f"MAR: {status['mar']:.2f}", (w - 150, 60),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-        
-        # Vẽ số lần ngáp
-        if status['total_yawns'] > 0:
-            cv2.putText(frame, f"Ngap: {status['total_yawns']}", (w - 150, 90),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
-        
-        # Vẽ thanh điểm buồn ngủ
-        score_percentage = min(100, (status['drowsiness_score'] / 
-                                    DrowsinessDetector.DROWSINESS_SCORE_THRESHOLD) * 100)
-        bar_width = int((w - 40) * score_percentage / 100)
-        
-        # Màu thanh theo mức độ
-        if score_percentage >= 100:
-            bar_color = (0, 0, 255)
-        elif score_percentage >= 50:
-            bar_color = (0, 165, 255)
-        else:
-            bar_color = (0, 255, 0)
-        
-        cv2.rectangle(frame, (20, h - 40), (20 + bar_width, h - 20), bar_color, -1)
-        cv2.rectangle(frame, (20, h - 40), (w - 20, h - 20), (255, 255, 255), 2)
-        cv2.putText(frame, f"Buon ngu: {int(score_percentage)}%", (25, h - 45),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        
-        # Vẽ cảnh báo lớn nếu ở mức DANGER
-        if status['alert_level'] == 'DANGER':
-            cv2.putText(frame, ">>> BUON NGU! <<<", (10, 70),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
+        h, w = frame.shape[:2]
+        rasterize_overlay(frame, build_overlay(status, None, (w, h)))
     
     def _draw_no_face_warning(self, frame):
         """
@@ -192,19 +580,294 @@ class CameraProcessor:
         Args:
             frame: Frame ảnh
         """
-        cv2.putText(frame, "Khong phat hien khuon mat", (10, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+        h, w = frame.shape[:2]
+        rasterize_overlay(frame, build_overlay(None, None, (w, h)))
+    
+    def start_recording(self, path, full_mesh=False):
+        """
+        Bắt đầu ghi landmark từng frame ra file .dglm (xem landmark_recording)
+        
+        Args:
+            path: Đường dẫn file ghi
+            full_mesh: True = ghi toàn bộ 478 điểm, False = chỉ 20 điểm mắt/miệng
+        
+        Returns:
+            LandmarkRecorder: Đối tượng ghi
+        """
+        if full_mesh and (self.landmark_source is not None or self.face_tracker is not None):
+            raise ValueError("Chỉ ghi được toàn bộ lưới ở chế độ một khuôn mặt, không tracking")
+        
+        frame_size = (0, 0)
+        if self.capture is not None:
+            frame_size = (int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                          int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        recorder = LandmarkRecorder(path, full_mesh=full_mesh, frame_size=frame_size)
+        self.stop_recording()
+        with self._recorder_lock:
+            self.recorder = recorder
+        return recorder
+    
+    def stop_recording(self):
+        """
+        Dừng ghi landmark
+        
+        Returns:
+            int: Số frame đã ghi (0 nếu không ghi)
+        """
+        with self._recorder_lock:
+            recorder, self.recorder = self.recorder, None
+        if recorder is None:
+            return 0
+        recorder.close()
+        return recorder.frames
+    
+    def _record_landmarks(self, timestamp, points):
+        """Ghi landmark của frame hiện tại (an toàn khi stop_recording từ luồng khác)"""
+        with self._recorder_lock:
+            if self.recorder is not None:
+                self.recorder.write(time.monotonic() if timestamp is None else timestamp, points)
+    
+    def enable_background_calibration(self, enabled=True, epoch_seconds=60.0, blend=0.3):
+        """
+        Bật/tắt hiệu chỉnh ngưỡng EAR/MAR nền trong lúc giám sát (xem calibration)
+        
+        Args:
+            enabled: True để bật
+            epoch_seconds: Độ dài mỗi chu kỳ thu mẫu trước khi cập nhật ngưỡng (giây)
+            blend: Tỉ lệ dịch ngưỡng về giá trị mới mỗi chu kỳ
+        
+        Returns:
+            BackgroundCalibrator: Đối tượng hiệu chỉnh (None nếu tắt)
+        """
+        if enabled and self.face_tracker is not None:
+            raise ValueError("Hiệu chỉnh nền chỉ hỗ trợ chế độ một khuôn mặt")
+        self.background_calibrator = None
+        if enabled:
+            self.background_calibrator = BackgroundCalibrator(self.drowsiness_detector,
+                                                              epoch_seconds, blend)
+        return self.background_calibrator
+    
+    def _update_background_calibration(self, status, timestamp):
+        """Đưa trạng thái frame vào hiệu chỉnh nền, ghi nhật ký khi ngưỡng được cập nhật"""
+        calibrator = self.background_calibrator
+        if calibrator is None:
+            return
+        if timestamp is None:
+            timestamp = time.monotonic()
+        applied = calibrator.update(status, timestamp)
+        if applied is not None and self.session_logger is not None:
+            self.session_logger.log_event('calibration', timestamp, source='background',
+                                          epoch=calibrator.epochs,
+                                          ear=round(applied[0], 3), mar=round(applied[1], 3))
+    
+    def enable_instrumentation(self, enabled=True, window_seconds=10.0):
+        """
+        Bật/tắt đo độ trễ từng giai đoạn xử lý frame
+        
+        Args:
+            enabled: True để bật
+            window_seconds: Độ dài cửa sổ histogram cuộn (giây)
+        """
+        self.stage_timer = StageTimer(window_seconds) if enabled else NULL_STAGE_TIMER
+        self.face_detector.stage_timer = self.stage_timer
+    
+    def get_stage_stats(self):
+        """
+        Lấy thống kê độ trễ từng giai đoạn
+        
+        Returns:
+            dict: {giai đoạn: {'count', 'mean_ms', 'p50_ms', 'p99_ms'}} (rỗng nếu tắt)
+        """
+        return self.stage_timer.summary()
+    
+    def get_current_overlay(self):
+        """
+        Lấy mô tả overlay ứng với frame trả về gần nhất từ process_frame()
+        
+        Returns:
+            dict: Mô tả overlay (xem overlay.build_overlay) hoặc None
+        """
+        return self.display_overlay
+    
+    # ------------------------------------------------------------------
+    # Pipeline đa luồng
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def _new_pipeline_stats():
+        """Tạo bộ đếm thống kê pipeline"""
+        return {
+            'frames_captured': 0,
+            'frames_analyzed': 0,
+            'frames_delivered': 0,
+            'camera_dropped': 0,   # Frame camera bị thay bằng frame mới hơn trước khi được lấy
+            'capture_dropped': 0,  # Frame bị bỏ do hàng đợi phân tích đầy
+            'result_dropped': 0,   # Kết quả bị ghi đè trước khi GUI lấy
+            'result_stale': 0,     # Kết quả bị bỏ vì phân tích trước lần reset detector
+        }
+    
+    def _start_pipeline(self):
+        """Khởi động luồng đọc camera và luồng phân tích"""
+        self._stop_event.clear()
+        self._frame_queue = queue.Queue(maxsize=self.frame_queue_size)
+        self._latest_result = None
+        self._pipeline_ended = False
+        self._status_snapshot = None
+        self._pipeline_stats = self._new_pipeline_stats()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name='DrowsyGuard-capture', daemon=True),
+            threading.Thread(target=self._inference_loop, name='DrowsyGuard-inference', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+    
+    def _stop_pipeline(self):
+        """Dừng các luồng pipeline (nếu đang chạy)"""
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        self._threads = []
+        self._frame_queue = None
+        with self._result_lock:
+            self._latest_result = None
+    
+    def _capture_loop(self):
+        """Luồng đọc camera: luôn giữ các frame mới nhất trong hàng đợi có giới hạn"""
+        stats = self._pipeline_stats
+        frame_queue = self._frame_queue
+        while not self._stop_event.is_set():
+            read_start = time.perf_counter_ns()
+            captured = self.capture.read_latest(timeout=0.1)
+            if captured is None:
+                if self.capture.isOpened():
+                    continue  # Hết thời gian chờ (camera chậm): thử lại
+                # Hết file video: báo cho luồng phân tích (sau các frame còn trong hàng đợi)
+                while not self._stop_event.is_set():
+                    try:
+                        frame_queue.put(None, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                return
+            self.stage_timer.record('capture', time.perf_counter_ns() - read_start)
+            if self._awaiting_first_frame:
+                self._first_frame_read()
+            # Thời điểm chụp lấy từ luồng đọc camera, không phải lúc lấy ra
+            item = (captured.image, captured.timestamp)
+            stats['frames_captured'] += 1
+            stats['camera_dropped'] += captured.dropped
+            
+            # Hàng đợi đầy: bỏ frame cũ nhất để phân tích luôn dùng frame mới
+            if frame_queue.full():
+                try:
+                    frame_queue.get_nowait()
+                    stats['capture_dropped'] += 1
+                except queue.Empty:
+                    pass
+            try:
+                frame_queue.put_nowait(item)
+            except queue.Full:
+                stats['capture_dropped'] += 1
+    
+    def _inference_loop(self):
+        """Luồng phân tích: xử lý frame và ghi đè kết quả mới nhất"""
+        stats = self._pipeline_stats
+        frame_queue = self._frame_queue
+        while not self._stop_event.is_set():
+            try:
+                item = frame_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is None:
+                # Nguồn đã hết frame
+                with self._result_lock:
+                    self._pipeline_ended = True
+                return
+            frame, timestamp = item
+            
+            try:
+                result = self._analyze_frame(frame, timestamp)
+            except Exception as e:
+                print(f"Lỗi khi phân tích frame: {e}")
+                continue
+            stats['frames_analyzed'] += 1
+            
+            # Detector ghi đè đối tượng trạng thái ở frame sau: giao bản sao cho luồng GUI
+            success, frame, status = result
+            result = (success, frame, status.copy())
+            
+            with self._result_lock:
+                if self._analysis_generation != self._reset_generation:
+                    # Frame được phân tích trước lần reset gần nhất
+                    stats['result_stale'] += 1
+                    continue
+                if self._latest_result is not None:
+                    stats['result_dropped'] += 1
+                self._latest_result = (result, self.current_overlay)
+                self._status_snapshot = result[2]
+    
+    def _poll_latest_result(self):
+        """
+        Lấy kết quả phân tích mới nhất (mỗi kết quả chỉ trả về một lần)
+        
+        Returns:
+            tuple: (success, frame, status) hoặc (False, None, None) nếu chưa có kết quả mới
+        """
+        with self._result_lock:
+            latest = self._latest_result
+            self._latest_result = None
+        if latest is None:
+            return False, None, None
+        self._pipeline_stats['frames_delivered'] += 1
+        result, self.display_overlay = latest
+        return result
+    
+    def get_pipeline_stats(self):
+        """
+        Lấy thống kê pipeline: độ sâu hàng đợi và số frame bị bỏ ở từng giai đoạn
+        
+        Returns:
+            dict: Bộ đếm của pipeline kèm độ sâu hàng đợi hiện tại và thống kê
+                  camera ('camera', xem CameraCapture.get_stats)
+        """
+        stats = dict(self._pipeline_stats)
+        frame_queue = self._frame_queue
+        stats['capture_queue_depth'] = frame_queue.qsize() if frame_queue is not None else 0
+        stats['capture_queue_size'] = self.frame_queue_size
+        with self._result_lock:
+            stats['result_queue_depth'] = 0 if self._latest_result is None else 1
+        stats['result_queue_size'] = 1
+        capture = self.capture
+        if capture is not None:
+            # Số frame đọc/bỏ ở luồng camera và cấu hình thực tế (độ phân giải, FPS, FOURCC)
+            stats['camera'] = capture.get_stats()
+            stats['capture_failures'] = stats['camera']['read_failures']
+        else:
+            stats['capture_failures'] = 0
+        return stats
     
     def get_current_status(self):
         """
         Lấy trạng thái hiện tại
         
+        Ở chế độ pipeline trả về bản sao do luồng phân tích tạo (an toàn khi gọi từ
+        luồng khác); đối tượng trạng thái của detector bị ghi đè ở frame sau.
+        
         Returns:
-            dict: Dictionary trạng thái hiện tại hoặc None
+            DrowsinessStatus: Bản sao trạng thái hiện tại hoặc None
         """
-        return self.current_status
+        if self._threads:
+            with self._result_lock:
+                return self._status_snapshot
+        status = self.current_status
+        return status.copy() if status is not None else None
     
     def release(self):
         """Giải phóng tài nguyên"""
         self.stop()
+        self.wait_prepared()
+        if self._prepared_capture is not None:
+            self._prepared_capture.release()
+            self._prepared_capture = None
+        self.stop_recording()
         self.face_detector.release()
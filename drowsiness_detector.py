@@ -3,8 +3,94 @@ Module thuật toán xác định trạng thái buồn ngủ
 Kết hợp các chỉ số EAR và MAR để đưa ra cảnh báo buồn ngủ
 """
 
+import math
+import time
+
 from ear_calculator import EARCalculator
 from mar_calculator import MARCalculator
+from perclos import PerclosMonitor
+
+
+class DrowsinessStatus:
+    """
+    Trạng thái trả về từ DrowsinessDetector.update()
+    
+    Mỗi detector giữ một đối tượng và ghi đè nó ở mỗi frame thay vì tạo
+    dictionary mới. Đọc được như dictionary (status['ear'], status.get(...))
+    để tương thích mã cũ; dùng copy() nếu cần giữ lại qua nhiều frame và
+    to_dict() khi cần dictionary thực sự (JSON, log).
+    """
+    
+    KEYS = ('drowsy', 'alert_level', 'reason', 'ear', 'mar', 'eye_closed_frames',
+            'yawn_frames', 'total_yawns', 'drowsiness_score', 'alert_active',
+            'perclos', 'perclos_long')
+    __slots__ = KEYS
+    
+    def __init__(self, **values):
+        self.drowsy = False
+        self.alert_level = 'SAFE'
+        self.reason = ''
+        self.ear = 0
+        self.mar = 0
+        self.eye_closed_frames = 0
+        self.yawn_frames = 0
+        self.total_yawns = 0
+        self.drowsiness_score = 0
+        self.alert_active = False
+        self.perclos = 0.0
+        self.perclos_long = 0.0
+        for key, value in values.items():
+            setattr(self, key, value)
+    
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+    
+    def __setitem__(self, key, value):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        setattr(self, key, value)
+    
+    def __contains__(self, key):
+        return key in self.KEYS
+    
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.KEYS else default
+    
+    def keys(self):
+        return self.KEYS
+    
+    def to_dict(self):
+        """Chuyển sang dictionary (giao diện cũ của update())"""
+        return {key: getattr(self, key) for key in self.KEYS}
+    
+    def copy(self):
+        """Tạo bản sao độc lập (đối tượng gốc sẽ bị ghi đè ở frame sau)"""
+        status = object.__new__(type(self))
+        for key in self.KEYS:
+            setattr(status, key, getattr(self, key))
+        return status
+    
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class TimedDrowsinessStatus(DrowsinessStatus):
+    """Trạng thái của TimedDrowsinessDetector, thêm thời gian mắt nhắm/ngáp (giây)"""
+    
+    KEYS = DrowsinessStatus.KEYS + ('eye_closed_time', 'yawn_time')
+    __slots__ = ('eye_closed_time', 'yawn_time')
+    
+    def __init__(self, **values):
+        self.eye_closed_time = 0.0
+        self.yawn_time = 0.0
+        super().__init__(**values)
+
+
+# Trạng thái dùng chung khi không phát hiện khuôn mặt (chỉ đọc, không sửa)
+NO_FACE_STATUS = DrowsinessStatus(alert_level='NO_FACE', reason='Không phát hiện khuôn mặt')
 
 
 class DrowsinessDetector:
@@ -12,6 +98,10 @@ class DrowsinessDetector:
     Class phát hiện trạng thái buồn ngủ dựa trên EAR và MAR
     """
     
+    # Ngưỡng EAR/MAR (gán lại trên từng detector khi hiệu chỉnh theo tài xế)
+    EAR_THRESHOLD = EARCalculator.EYE_CLOSED_THRESHOLD
+    MAR_THRESHOLD = MARCalculator.YAWN_THRESHOLD
+    
     # Ngưỡng số frame mắt nhắm liên tục để cảnh báo buồn ngủ
     EYE_CLOSED_FRAMES_THRESHOLD = 90  # ~3 giây ở 30 FPS - mắt nhắm thực sự lâu
     
@@ -27,8 +117,26 @@ class DrowsinessDetector:
     # Điểm buồn ngủ tích lũy
     DROWSINESS_SCORE_THRESHOLD = 200  # Tăng ngưỡng để ít nhạy hơn
     
+    # PERCLOS: cửa sổ ngắn/dài (giây) và ngưỡng tỉ lệ mắt nhắm để cảnh báo
+    # (chỉ xét cửa sổ đã có dữ liệu ít nhất một nửa thời gian)
+    PERCLOS_WINDOWS = (60.0, 300.0)
+    PERCLOS_WARNING = 0.12
+    PERCLOS_DANGER = 0.20
+    
+    # Thời gian mỗi frame khi không có timestamp (giả định 30 FPS)
+    FRAME_SECONDS = 1.0 / 30
+    
+    # Tiền tố text và màu (R, G, B, A) hiển thị theo mức cảnh báo
+    STATUS_TEXT_PREFIX = {'DANGER': " CẢNH BÁO: ", 'WARNING': " CHÚ Ý: "}
+    STATUS_COLORS = {'DANGER': (1, 0, 0, 1), 'WARNING': (1, 0.65, 0, 1)}  # Đỏ, cam
+    SAFE_COLOR = (0, 1, 0, 1)  # Xanh lá
+    
+    # Kiểu trạng thái trả về từ update()
+    STATUS_CLASS = DrowsinessStatus
+    
     def __init__(self):
         """Khởi tạo Drowsiness Detector"""
+        self.status = self.STATUS_CLASS()
         self.eye_closed_frames = 0
         self.yawn_frames = 0
         self.drowsiness_score = 0
@@ -36,6 +144,8 @@ class DrowsinessDetector:
         self.alert_active = False
         self.pause_scoring_frames = -90  # Số frame còn lại cần tạm dừng tính điểm
         self.frames_since_last_yawn = 0  # Đếm frame từ lần ngáp cuối cùng
+        self.perclos = PerclosMonitor(self.PERCLOS_WINDOWS)
+        self.frame_clock = 0.0  # Đồng hồ theo số frame (giây @ 30 FPS) cho PERCLOS
     
     def reset(self):
         """Reset tất cả các biến đếm"""
@@ -47,17 +157,23 @@ class DrowsinessDetector:
         # đặt thời gian tạm dừng, cứ 30 frame là 1 giây
         self.pause_scoring_frames = 90
         self.frames_since_last_yawn = 0
+        self.perclos.reset()
     
-    def update(self, ear_value, mar_value):
+    def update(self, ear_value, mar_value, timestamp=None):
         """
         Cập nhật trạng thái buồn ngủ dựa trên EAR và MAR
         
+        Các ngưỡng tính theo số frame (giả định 30 FPS); dùng
+        TimedDrowsinessDetector nếu tốc độ frame không ổn định.
+        
         Args:
             ear_value: Giá trị Eye Aspect Ratio
             mar_value: Giá trị Mouth Aspect Ratio
+            timestamp: Không dùng (giữ cùng giao diện với TimedDrowsinessDetector);
+                       PERCLOS tính theo đồng hồ số frame @ 30 FPS
         
         Returns:
-            dict: Dictionary chứa thông tin trạng thái
+            DrowsinessStatus: Trạng thái (đọc như dictionary, bị ghi đè ở lần gọi sau)
                 {
                     'drowsy': bool - Có đang buồn ngủ không,
                     'alert_level': str - Mức độ cảnh báo ('SAFE', 'WARNING', 'DANGER'),
@@ -65,29 +181,24 @@ class DrowsinessDetector:
                     'ear': float - Giá trị EAR,
                     'mar': float - Giá trị MAR,
                     'eye_closed_frames': int - Số frame mắt nhắm,
-                    'total_yawns': int - Tổng số lần ngáp
+                    'total_yawns': int - Tổng số lần ngáp,
+                    'perclos': float - Tỉ lệ mắt nhắm trong cửa sổ ngắn (0..1),
+                    'perclos_long': float - Tỉ lệ mắt nhắm trong cửa sổ dài (0..1)
                 }
         """
+        # PERCLOS được đo cả trong thời gian tạm dừng tính điểm
+        eyes_closed = ear_value < self.EAR_THRESHOLD
+        self.frame_clock += self.FRAME_SECONDS
+        self.perclos.update(eyes_closed, self.FRAME_SECONDS, self.frame_clock)
+        
         # Kiểm tra nếu đang trong thời gian tạm dừng tính điểm
         if self.pause_scoring_frames > 0:
             self.pause_scoring_frames -= 1
             # Vẫn cập nhật giá trị nhưng không tính điểm
-            return {
-                'drowsy': False,
-                'alert_level': 'SAFE',
-                'reason': f'Tinh tao ({self.pause_scoring_frames // 30 + 1}s)',
-                'ear': ear_value,
-                'mar': mar_value,
-                'eye_closed_frames': 0,
-                'yawn_frames': 0,
-                'total_yawns': self.total_yawns,
-                'drowsiness_score': 0,
-                'alert_active': False
-            }
+            return self._build_pause_status(f'Tinh tao ({self.pause_scoring_frames // 30 + 1}s)',
+                                            ear_value, mar_value)
         
         # Kiểm tra mắt nhắm
-        eyes_closed = EARCalculator.is_eyes_closed(ear_value)
-        
         if eyes_closed:
             self.eye_closed_frames += 1
             self.drowsiness_score += 0.5  # Mỗi frame mắt nhắm +0.5 điểm (chậm hơn)
@@ -97,7 +208,7 @@ class DrowsinessDetector:
             self.drowsiness_score = max(0, self.drowsiness_score - 0.3)
         
         # Kiểm tra ngáp
-        is_yawning = MARCalculator.is_yawning(mar_value)
+        is_yawning = mar_value > self.MAR_THRESHOLD
         
         if is_yawning:
             self.yawn_frames += 1
@@ -119,12 +230,28 @@ class DrowsinessDetector:
                 self.total_yawns = 0
                 self.frames_since_last_yawn = 0
         
+        alert_level, reason, drowsy = self._evaluate_alert(
+            self.eye_closed_frames >= self.EYE_CLOSED_FRAMES_THRESHOLD)
+        
+        return self._build_status(drowsy, alert_level, reason, ear_value, mar_value)
+    
+    def _evaluate_alert(self, eyes_closed_too_long):
+        """
+        Xác định mức độ cảnh báo từ trạng thái hiện tại
+        
+        Args:
+            eyes_closed_too_long: True nếu mắt đã nhắm liên tục quá ngưỡng
+        
+        Returns:
+            tuple: (alert_level, reason, drowsy)
+        """
         # Xác định mức độ cảnh báo
         alert_level = 'SAFE'
         reason = 'Tinh tao'
         drowsy = False
+        perclos = self.perclos.max_ready_value()
         
-        if self.eye_closed_frames >= self.EYE_CLOSED_FRAMES_THRESHOLD:
+        if eyes_closed_too_long:
             # Cảnh báo mắt nhắm quá lâu
             alert_level = 'DANGER'
             reason = 'Mắt nhắm quá lâu!'
@@ -142,53 +269,209 @@ class DrowsinessDetector:
             reason = 'Co dau hieu buon ngu manh!'
             drowsy = True
             self.alert_active = True
+        elif perclos >= self.PERCLOS_DANGER:
+            # Tỉ lệ mắt nhắm kéo dài trong cửa sổ thời gian
+            alert_level = 'DANGER'
+            reason = f'PERCLOS {perclos:.0%} - Mắt nhắm quá thường xuyên!'
+            drowsy = True
+            self.alert_active = True
         elif self.drowsiness_score >= self.DROWSINESS_SCORE_THRESHOLD * 0.5:
             # Cảnh báo nhẹ
             alert_level = 'WARNING'
             reason = 'Co dau hieu met moi'
             drowsy = False
+        elif perclos >= self.PERCLOS_WARNING:
+            alert_level = 'WARNING'
+            reason = f'PERCLOS {perclos:.0%} - Co dau hieu met moi'
+            drowsy = False
         else:
             self.alert_active = False
         
-        return {
-            'drowsy': drowsy,
-            'alert_level': alert_level,
-            'reason': reason,
-            'ear': ear_value,
-            'mar': mar_value,
-            'eye_closed_frames': self.eye_closed_frames,
-            'yawn_frames': self.yawn_frames,
-            'total_yawns': self.total_yawns,
-            'drowsiness_score': self.drowsiness_score,
-            'alert_active': self.alert_active
-        }
-    
-    def get_status_text(self, status):
+        return alert_level, reason, drowsy
+    
+    def _build_status(self, drowsy, alert_level, reason, ear_value, mar_value):
+        """Ghi trạng thái hiện tại vào đối tượng trạng thái dùng lại của detector"""
+        status = self.status
+        status.drowsy = drowsy
+        status.alert_level = alert_level
+        status.reason = reason
+        status.ear = ear_value
+        status.mar = mar_value
+        status.eye_closed_frames = self.eye_closed_frames
+        status.yawn_frames = self.yawn_frames
+        status.total_yawns = self.total_yawns
+        status.drowsiness_score = self.drowsiness_score
+        status.alert_active = self.alert_active
+        windows = self.perclos.windows
+        status.perclos = windows[0].value
+        status.perclos_long = windows[-1].value
+        return status
+    
+    def _build_pause_status(self, reason, ear_value, mar_value):
+        """Trạng thái trong thời gian tạm dừng tính điểm (các bộ đếm hiển thị bằng 0)"""
+        status = self._build_status(False, 'SAFE', reason, ear_value, mar_value)
+        status.eye_closed_frames = 0
+        status.yawn_frames = 0
+        status.drowsiness_score = 0
+        status.alert_active = False
+        return status
+    
+    @staticmethod
+    def get_status_text(status):
         """
         Tạo text hiển thị trạng thái chi tiết
         
-            status: Dictionary trạng thái từ hàm update()
+            status: Trạng thái từ hàm update()
         
             str: Text hiển thị trạng thái
         """
-        if status['alert_level'] == 'DANGER':
-            return f" CẢNH BÁO: {status['reason']}"
-        elif status['alert_level'] == 'WARNING':
-            return f" CHÚ Ý: {status['reason']}"
-        else:
-            return f" {status['reason']}"
+        prefix = DrowsinessDetector.STATUS_TEXT_PREFIX.get(status['alert_level'], " ")
+        return prefix + status['reason']
     
-    def get_status_color(self, status):
+    @staticmethod
+    def get_status_color(status):
         """
         Lấy màu sắc cho trạng thái
         
-            status: Dictionary trạng thái từ hàm update()
+            status: Trạng thái từ hàm update()
         
             tuple: (R, G, B, A) màu sắc
         """
-        if status['alert_level'] == 'DANGER':
-            return (1, 0, 0, 1)  # Đỏ
-        elif status['alert_level'] == 'WARNING':
-            return (1, 0.65, 0, 1)  # Cam
+        return DrowsinessDetector.STATUS_COLORS.get(status['alert_level'],
+                                                    DrowsinessDetector.SAFE_COLOR)
+
+
+class TimedDrowsinessDetector(DrowsinessDetector):
+    """
+    Phát hiện buồn ngủ theo thời gian thực (giây) thay vì số frame
+    
+    Mọi ngưỡng thời gian và tốc độ tăng/giảm điểm tính theo giây dựa trên
+    timestamp của frame, nên độ trễ cảnh báo không phụ thuộc FPS
+    (chạy phân tích ở FPS thấp, bỏ frame hoặc camera FPS thay đổi).
+    """
+    
+    # Thời gian mắt nhắm liên tục để cảnh báo (tương đương 90 frame @ 30 FPS)
+    EYE_CLOSED_SECONDS = 3.0
+    
+    # Thời gian ngáp liên tục để tính một lần ngáp (60 frame @ 30 FPS)
+    YAWN_SECONDS = 2.0
+    
+    # Sau khoảng thời gian này không ngáp mới thì reset số lần ngáp (600 frame @ 30 FPS)
+    YAWN_RESET_SECONDS = 20.0
+    
+    # Thời gian tạm dừng tính điểm sau khi reset (90 frame @ 30 FPS)
+    PAUSE_SECONDS = 3.0
+    
+    # Tốc độ thay đổi điểm buồn ngủ (điểm/giây), tương đương 0.5 và 0.3 điểm/frame @ 30 FPS
+    EYE_CLOSED_SCORE_RATE = 15.0
+    SCORE_DECAY_RATE = 9.0
+    
+    # Khoảng cách tối đa giữa hai frame được tính (tránh nhảy điểm sau khi bị treo)
+    MAX_FRAME_GAP = 0.5
+    
+    STATUS_CLASS = TimedDrowsinessStatus
+    
+    def __init__(self):
+        """Khởi tạo Timed Drowsiness Detector"""
+        super().__init__()
+        self.last_timestamp = None
+        self.eye_closed_time = 0.0
+        self.yawn_time = 0.0
+        self.yawn_counted = False
+        self.time_since_last_yawn = 0.0
+        self.pause_remaining = 0.0
+    
+    def reset(self):
+        """Reset tất cả các biến đếm"""
+        super().reset()
+        self.last_timestamp = None
+        self.eye_closed_time = 0.0
+        self.yawn_time = 0.0
+        self.yawn_counted = False
+        self.time_since_last_yawn = 0.0
+        self.pause_remaining = self.PAUSE_SECONDS
+    
+    def update(self, ear_value, mar_value, timestamp=None):
+        """
+        Cập nhật trạng thái buồn ngủ dựa trên EAR, MAR và thời điểm của frame
+        
+        Args:
+            ear_value: Giá trị Eye Aspect Ratio
+            mar_value: Giá trị Mouth Aspect Ratio
+            timestamp: Thời điểm chụp frame (giây, đơn điệu tăng).
+                       None = dùng time.monotonic()
+        
+        Returns:
+            TimedDrowsinessStatus: Trạng thái như DrowsinessDetector.update(),
+                  thêm 'eye_closed_time' và 'yawn_time' (giây)
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        
+        # Thời gian trôi qua kể từ frame trước
+        if self.last_timestamp is None:
+            dt = 0.0
         else:
-            return (0, 1, 0, 1)  # Xanh lá
+            dt = min(max(timestamp - self.last_timestamp, 0.0), self.MAX_FRAME_GAP)
+        self.last_timestamp = timestamp
+        
+        # PERCLOS theo thời gian thực (đo cả trong thời gian tạm dừng tính điểm)
+        eyes_closed = ear_value < self.EAR_THRESHOLD
+        self.perclos.update(eyes_closed, dt, timestamp)
+        
+        # Kiểm tra nếu đang trong thời gian tạm dừng tính điểm
+        if self.pause_remaining > 0:
+            self.pause_remaining = max(0.0, self.pause_remaining - dt)
+            return self._build_pause_status(f'Tinh tao ({max(1, math.ceil(self.pause_remaining))}s)',
+                                            ear_value, mar_value)
+        
+        # Kiểm tra mắt nhắm
+        if eyes_closed:
+            self.eye_closed_frames += 1
+            self.eye_closed_time += dt
+            self.drowsiness_score += self.EYE_CLOSED_SCORE_RATE * dt
+        else:
+            self.eye_closed_frames = 0
+            self.eye_closed_time = 0.0
+            self.drowsiness_score = max(0, self.drowsiness_score - self.SCORE_DECAY_RATE * dt)
+        
+        # Kiểm tra ngáp
+        if mar_value > self.MAR_THRESHOLD:
+            self.yawn_frames += 1
+            self.yawn_time += dt
+            # Đếm một lần ngáp khi ngáp đủ lâu (chỉ một lần cho mỗi cái ngáp)
+            if self.yawn_time >= self.YAWN_SECONDS and not self.yawn_counted:
+                self.yawn_counted = True
+                self.total_yawns += 1
+                self.drowsiness_score += 50  # Mỗi lần ngáp +50 điểm
+                self.time_since_last_yawn = 0.0
+        else:
+            self.yawn_frames = 0
+            self.yawn_time = 0.0
+            self.yawn_counted = False
+        
+        # Thời gian từ lần ngáp cuối cùng
+        if self.total_yawns > 0:
+            self.time_since_last_yawn += dt
+            if self.time_since_last_yawn >= self.YAWN_RESET_SECONDS:
+                self.total_yawns = 0
+                self.time_since_last_yawn = 0.0
+        
+        alert_level, reason, drowsy = self._evaluate_alert(
+            self.eye_closed_time >= self.EYE_CLOSED_SECONDS)
+        
+        return self._build_status(drowsy, alert_level, reason, ear_value, mar_value)
+    
+    def _build_status(self, drowsy, alert_level, reason, ear_value, mar_value):
+        """Ghi trạng thái, kèm thời gian mắt nhắm/ngáp (giây)"""
+        status = super()._build_status(drowsy, alert_level, reason, ear_value, mar_value)
+        status.eye_closed_time = self.eye_closed_time
+        status.yawn_time = self.yawn_time
+        return status
+    
+    def _build_pause_status(self, reason, ear_value, mar_value):
+        """Trạng thái trong thời gian tạm dừng tính điểm"""
+        status = super()._build_pause_status(reason, ear_value, mar_value)
+        status.eye_closed_time = 0.0
+        status.yawn_time = 0.0
+        return status
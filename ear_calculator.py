@@ -2,7 +2,7 @@
 Module tính toán Eye Aspect Ratio (EAR) để phát hiện mắt nhắm
 """
 
-from scipy.spatial import distance
+import numpy as np
 
 
 class EARCalculator:
@@ -35,16 +35,29 @@ class EARCalculator:
         Returns:
             float: Giá trị EAR (thường trong khoảng 0.15 - 0.35)
         """
-        # Tính khoảng cách dọc (vertical)
-        A = distance.euclidean(eye_landmarks[1], eye_landmarks[5])  # trên1 - dưới2
-        B = distance.euclidean(eye_landmarks[2], eye_landmarks[4])  # trên2 - dưới1
+        eye = np.asarray(eye_landmarks, dtype=np.float64)
+        return float(EARCalculator.calculate_ear_batch(eye[np.newaxis])[0])
+    
+    @staticmethod
+    def calculate_ear_batch(eye_landmarks):
+        """
+        Tính EAR cho nhiều frame cùng lúc (vector hóa bằng NumPy)
+        
+        Args:
+            eye_landmarks: Mảng shape (frames, 6, 2) tọa độ 6 điểm mắt mỗi frame
+                            (cùng thứ tự điểm như calculate_ear)
+        
+        Returns:
+            np.ndarray: Mảng shape (frames,) giá trị EAR
+        """
+        eye = np.asarray(eye_landmarks, dtype=np.float64)
         
-        # Tính khoảng cách ngang (horizontal)
-        C = distance.euclidean(eye_landmarks[0], eye_landmarks[3])  # góc_ngoài - góc_trong
+        # Khoảng cách theo cặp điểm: [trên1-dưới2, trên2-dưới1, góc_ngoài-góc_trong]
+        diffs = eye[:, [1, 2, 0]] - eye[:, [5, 4, 3]]
+        dists = np.sqrt(np.einsum('fpk,fpk->fp', diffs, diffs))
         
         # Công thức EAR
-        ear = (A + B) / (2.0 * C)
-        return ear
+        return (dists[:, 0] + dists[:, 1]) / (2.0 * dists[:, 2])
     
     @staticmethod
     def calculate_avg_ear(left_eye_landmarks, right_eye_landmarks):
@@ -61,6 +74,20 @@ class EARCalculator:
         avg_ear = (left_ear + right_ear) / 2.0
         return avg_ear
     
+    @staticmethod
+    def calculate_avg_ear_batch(left_eye_landmarks, right_eye_landmarks):
+        """
+        Tính EAR trung bình hai mắt cho nhiều frame cùng lúc
+        
+            left_eye_landmarks: Mảng shape (frames, 6, 2) landmark mắt trái
+            right_eye_landmarks: Mảng shape (frames, 6, 2) landmark mắt phải
+        
+            np.ndarray: Mảng shape (frames,) EAR trung bình
+        """
+        left_ear = EARCalculator.calculate_ear_batch(left_eye_landmarks)
+        right_ear = EARCalculator.calculate_ear_batch(right_eye_landmarks)
+        return (left_ear + right_ear) / 2.0
+    
     @staticmethod
     def is_eyes_closed(ear_value):
         """
@@ -1,9 +1,16 @@
 """
 Module nhận diện khuôn mặt sử dụng Mediapipe Face Mesh
+
+Mediapipe chỉ được import và mô hình Face Mesh chỉ được tạo khi cần
+(lần phát hiện đầu tiên, load_model() hoặc warm_up()) để khởi động nhanh.
 """
 
-import mediapipe as mp
+import time
+
 import cv2
+import numpy as np
+
+from stage_timer import NULL_STAGE_TIMER
 
 
 class FaceDetector:
@@ -22,7 +29,24 @@ class FaceDetector:
     # [6] trên phải phụ (311), [7] dưới phải phụ (402)
     MOUTH_INDICES = [78, 308, 13, 14, 81, 178, 311, 402]
     
-    def __init__(self, max_num_faces=1, min_detection_confidence=0.5, min_tracking_confidence=0.5):
+    # Mảng chỉ số tính sẵn cho chế độ trích xuất bằng NumPy
+    LEFT_EYE_IDX = np.array(LEFT_EYE_INDICES, dtype=np.intp)
+    RIGHT_EYE_IDX = np.array(RIGHT_EYE_INDICES, dtype=np.intp)
+    MOUTH_IDX = np.array(MOUTH_INDICES, dtype=np.intp)
+    
+    # Tập landmark chính (mắt trái + mắt phải + miệng) và vị trí từng vùng trong tập đó
+    KEY_INDICES = np.concatenate([LEFT_EYE_IDX, RIGHT_EYE_IDX, MOUTH_IDX])
+    KEY_LEFT_EYE = slice(0, 6)
+    KEY_RIGHT_EYE = slice(6, 12)
+    KEY_MOUTH = slice(12, 20)
+    
+    # Landmarks biên khuôn mặt dùng để ước lượng vùng ROI:
+    # trán (10), cằm (152), má trái (234), má phải (454)
+    FACE_BOUND_INDICES = [10, 152, 234, 454]
+    
+    def __init__(self, max_num_faces=1, min_detection_confidence=0.5, min_tracking_confidence=0.5,
+                 use_roi=False, roi_padding=0.35, roi_size=None, inference_size=None,
+                 static_image_mode=False):
         """
         Khởi tạo Face Detector
         
@@ -30,15 +54,76 @@ class FaceDetector:
             max_num_faces: Số lượng khuôn mặt tối đa cần phát hiện
             min_detection_confidence: Ngưỡng tin cậy tối thiểu để phát hiện
             min_tracking_confidence: Ngưỡng tin cậy tối thiểu để tracking
+            use_roi: True để chạy Face Mesh trên vùng cắt quanh khuôn mặt ở frame trước
+                     (tự quay về toàn frame khi mất khuôn mặt)
+            roi_padding: Phần mở rộng mỗi cạnh của ROI, tính theo kích thước khuôn mặt
+            roi_size: Cạnh dài tối đa (pixel) của ROI khi đưa vào Face Mesh (None = không thu nhỏ)
+            inference_size: Cạnh dài tối đa (pixel) của frame khi đưa vào Face Mesh
+                            (None = dùng nguyên độ phân giải camera). Landmarks vẫn
+                            được trả về theo tọa độ frame gốc.
+            static_image_mode: True để Face Mesh xử lý mỗi ảnh độc lập (không tracking
+                               giữa các frame) - dùng khi một mô hình phục vụ nhiều camera
         """
+        self.max_num_faces = max_num_faces
+        self.min_detection_confidence = min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+        self.inference_size = inference_size
+        self.static_image_mode = static_image_mode
+        self.use_roi = use_roi
+        self.roi_padding = roi_padding
+        self.roi_size = roi_size
+        self.roi = None  # (x0, y0, x1, y1) theo tọa độ frame, None = dùng toàn frame
+        
+        self.mp_face_mesh = None
+        self.face_mesh = None
+        
+        # Đo thời gian chuyển màu / Face Mesh / trích xuất landmark (mặc định tắt)
+        self.stage_timer = NULL_STAGE_TIMER
+    
+    def load_model(self):
+        """Import Mediapipe và tạo mô hình Face Mesh (nếu chưa tạo)"""
+        if self.face_mesh is not None:
+            return
+        import mediapipe as mp
+        
         self.mp_face_mesh = mp.solutions.face_mesh
         self.face_mesh = self.mp_face_mesh.FaceMesh(
-            max_num_faces=max_num_faces,
+            static_image_mode=self.static_image_mode,
+            max_num_faces=self.max_num_faces,
             refine_landmarks=True,
-            min_detection_confidence=min_detection_confidence,
-            min_tracking_confidence=min_tracking_confidence
+            min_detection_confidence=self.min_detection_confidence,
+            min_tracking_confidence=self.min_tracking_confidence
         )
     
+    def warm_up(self, frame_size=(640, 480), iterations=2):
+        """
+        Tạo mô hình Face Mesh và chạy thử trên ảnh trống
+        
+        Lần process() đầu tiên phải khởi tạo graph Mediapipe (cấp phát, nạp
+        model TFLite) nên chậm hơn nhiều so với các frame sau. Gọi hàm này trên
+        luồng nền lúc khởi động để frame camera đầu tiên không phải chịu chi phí đó.
+        Không được gọi đồng thời với các hàm phát hiện khác.
+        
+        Args:
+            frame_size: (width, height) của frame camera dự kiến
+            iterations: Số lần chạy thử
+        
+        Returns:
+            float: Thời gian tải và chạy thử (giây)
+        """
+        start = time.perf_counter()
+        self.load_model()
+        
+        # Ảnh trống cùng kích thước ảnh thực sự đưa vào Face Mesh
+        w, h = frame_size
+        if self.inference_size is not None:
+            scale = min(1.0, self.inference_size / max(w, h))
+            w, h = max(1, int(w * scale)), max(1, int(h * scale))
+        image = np.zeros((h, w, 3), dtype=np.uint8)
+        for _ in range(iterations):
+            self.face_mesh.process(image)
+        return time.perf_counter() - start
+    
     def detect_face(self, frame):
         """
         Phát hiện khuôn mặt trong frame
@@ -49,34 +134,266 @@ class FaceDetector:
                     face_detected: True nếu phát hiện khuôn mặt
                     landmarks_dict: Dictionary chứa tọa độ các điểm landmark
         """
+        face_landmarks, region = self._process(frame)
+        if face_landmarks is None:
+            return False, None
+        
+        x0, y0, w, h = region
+        return True, self._landmarks_to_dict(face_landmarks, w, h, (x0, y0))
+    
+    def detect_face_array(self, frame, indices=None):
+        """
+        Phát hiện khuôn mặt và trả về landmarks dưới dạng mảng NumPy
+        
+        Chỉ trích xuất các điểm được yêu cầu, tránh tạo list tuple cho toàn bộ
+        478 điểm ở mỗi frame. Tọa độ giữ dạng số thực (sub-pixel), không làm tròn,
+        nên EAR/MAR vẫn chính xác khi chạy Face Mesh ở độ phân giải thấp.
+        
+        Args:
+            frame: Frame ảnh BGR từ camera
+            indices: Mảng chỉ số landmark cần lấy (None = tất cả các điểm).
+                     Dùng KEY_INDICES kết hợp KEY_LEFT_EYE/KEY_RIGHT_EYE/KEY_MOUTH
+                     để lấy riêng mắt và miệng.
+        
+        Returns:
+            tuple: (face_detected, points)
+                    face_detected: True nếu phát hiện khuôn mặt
+                    points: Mảng float32 shape (len(indices), 2) tọa độ pixel (x, y)
+        """
+        face_landmarks, region = self._process(frame)
+        if face_landmarks is None:
+            return False, None
+        
+        x0, y0, w, h = region
+        points = self._landmarks_to_array(face_landmarks, w, h, indices, (x0, y0))
+        self.stage_timer.mark('landmark_extract')
+        return True, points
+    
+    def detect_faces_array(self, frame, indices=None):
+        """
+        Phát hiện tất cả khuôn mặt (tối đa max_num_faces) trên toàn frame
+        
+        Args:
+            frame: Frame ảnh BGR từ camera
+            indices: Mảng chỉ số landmark cần lấy (None = tất cả các điểm)
+        
+        Returns:
+            tuple: (boxes, points)
+                    boxes: Mảng float32 shape (F, 4) khung khuôn mặt (x0, y0, x1, y1)
+                    points: Mảng float32 shape (F, len(indices), 2) tọa độ pixel
+        """
+        frame_h, frame_w = frame.shape[:2]
+        faces = self._run_face_mesh_all(frame, self.inference_size)
+        count = len(indices) if indices is not None else 478
+        if not faces:
+            return np.zeros((0, 4), np.float32), np.zeros((0, count, 2), np.float32)
+        
+        # Lấy landmark cần thiết và landmark biên trong một lần trích xuất
+        bound_count = len(self.FACE_BOUND_INDICES)
+        if indices is not None:
+            extract = np.concatenate([indices, self.FACE_BOUND_INDICES])
+        else:
+            extract = None
+        extracted = np.stack([self._landmarks_to_array(face, frame_w, frame_h, extract)
+                              for face in faces])
+        if indices is not None:
+            points, bounds = extracted[:, :-bound_count], extracted[:, -bound_count:]
+        else:
+            points, bounds = extracted, extracted[:, self.FACE_BOUND_INDICES]
+        boxes = np.concatenate([bounds.min(axis=1), bounds.max(axis=1)], axis=1)
+        self.stage_timer.mark('landmark_extract')
+        return boxes, points
+    
+    def _process(self, frame):
+        """
+        Chạy Face Mesh trên frame (hoặc trên ROI quanh khuôn mặt nếu bật use_roi)
+        
+        Args:
+            frame: Frame ảnh BGR
+        
+        Returns:
+            tuple: (face_landmarks, region)
+                face_landmarks: Landmarks của khuôn mặt đầu tiên hoặc None nếu không phát hiện
+                region: (x0, y0, w, h) vùng frame đã đưa vào Face Mesh, dùng để đổi
+                        tọa độ chuẩn hóa sang tọa độ frame
+        """
+        frame_h, frame_w = frame.shape[:2]
+        
+        if self.use_roi and self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            face_landmarks = self._run_face_mesh(frame[y0:y1, x0:x1], self.roi_size)
+            if face_landmarks is not None:
+                region = (x0, y0, x1 - x0, y1 - y0)
+                self._update_roi(face_landmarks, region, frame_w, frame_h)
+                return face_landmarks, region
+            # Mất khuôn mặt trong ROI: thử lại trên toàn frame
+            self.roi = None
+        
+        face_landmarks = self._run_face_mesh(frame, self.inference_size)
+        if face_landmarks is None:
+            return None, None
+        
+        region = (0, 0, frame_w, frame_h)
+        if self.use_roi:
+            self._update_roi(face_landmarks, region, frame_w, frame_h)
+        return face_landmarks, region
+    
+    def _run_face_mesh(self, image, max_size=None):
+        """
+        Chạy Face Mesh trên một ảnh BGR
+        
+        Args:
+            image: Ảnh BGR (frame hoặc vùng cắt)
+            max_size: Cạnh dài tối đa trước khi đưa vào Face Mesh (None = giữ nguyên)
+        
+        Returns:
+            Landmarks (tọa độ chuẩn hóa theo ảnh) của khuôn mặt đầu tiên hoặc None
+        """
+        faces = self._run_face_mesh_all(image, max_size)
+        # Lấy landmarks của khuôn mặt đầu tiên
+        return faces[0] if faces else None
+    
+    def _run_face_mesh_all(self, image, max_size=None):
+        """
+        Chạy Face Mesh trên một ảnh BGR và trả về mọi khuôn mặt
+        
+        Returns:
+            list: Landmarks (tọa độ chuẩn hóa theo ảnh) của từng khuôn mặt (rỗng nếu không có)
+        """
+        # Thu nhỏ trước khi chuyển màu để giảm chi phí (tọa độ chuẩn hóa không đổi)
+        if max_size is not None:
+            h, w = image.shape[:2]
+            scale = max_size / max(h, w)
+            if scale < 1.0:
+                image = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))),
+                                   interpolation=cv2.INTER_AREA)
+        
         # Chuyển BGR sang RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        rgb_frame = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        self.stage_timer.mark('color_convert')
         
         # Phát hiện khuôn mặt
+        if self.face_mesh is None:
+            self.load_model()
         results = self.face_mesh.process(rgb_frame)
+        self.stage_timer.mark('inference')
         
-        if not results.multi_face_landmarks:
-            return False, None
+        return results.multi_face_landmarks or []
+    
+    def _update_roi(self, face_landmarks, region, frame_w, frame_h):
+        """
+        Cập nhật ROI cho frame tiếp theo từ biên khuôn mặt vừa phát hiện
         
-        # Lấy landmarks của khuôn mặt đầu tiên
-        face_landmarks = results.multi_face_landmarks[0]
+        ROI chỉ dịch chuyển khi khuôn mặt tiến sát mép ROI hiện tại, giữ vùng cắt
+        ổn định để Face Mesh tracking giữa các frame tốt hơn.
+        
+        Args:
+            face_landmarks: Landmarks vừa phát hiện
+            region: (x0, y0, w, h) vùng đã đưa vào Face Mesh
+            frame_w, frame_h: Kích thước frame
+        """
+        x0, y0, w, h = region
+        bounds = self._landmarks_to_array(face_landmarks, w, h,
+                                          self.FACE_BOUND_INDICES, (x0, y0))
+        fx0, fy0 = bounds.min(axis=0)
+        fx1, fy1 = bounds.max(axis=0)
+        face_size = max(fx1 - fx0, fy1 - fy0)
+        
+        # Giữ ROI hiện tại nếu khuôn mặt vẫn cách mép ít nhất nửa phần đệm
+        if self.roi is not None:
+            margin = face_size * self.roi_padding * 0.5
+            rx0, ry0, rx1, ry1 = self.roi
+            if (fx0 - margin >= rx0 and fy0 - margin >= ry0 and
+                    fx1 + margin <= rx1 and fy1 + margin <= ry1):
+                return
+        
+        # ROI vuông quanh tâm khuôn mặt, có phần đệm, giới hạn trong frame
+        half = face_size * (0.5 + self.roi_padding)
+        cx, cy = (fx0 + fx1) / 2.0, (fy0 + fy1) / 2.0
+        rx0 = max(0, int(cx - half))
+        ry0 = max(0, int(cy - half))
+        rx1 = min(frame_w, int(cx + half) + 1)
+        ry1 = min(frame_h, int(cy + half) + 1)
+        if rx1 - rx0 < 32 or ry1 - ry0 < 32:
+            self.roi = None
+            return
+        self.roi = (rx0, ry0, rx1, ry1)
+    
+    @classmethod
+    def _landmarks_to_dict(cls, face_landmarks, w, h, offset=(0, 0)):
+        """
+        Chuyển landmarks Mediapipe sang dictionary các tuple tọa độ pixel nguyên
+        
+        Args:
+            face_landmarks: Landmarks của một khuôn mặt (NormalizedLandmarkList)
+            w, h: Kích thước vùng ảnh đã đưa vào Face Mesh
+            offset: (x0, y0) vị trí vùng ảnh đó trong frame
         
+        Returns:
+            dict: {'left_eye', 'right_eye', 'mouth', 'all'}
+        """
         # Chuyển đổi landmarks sang tọa độ pixel
-        h, w, _ = frame.shape
+        x0, y0 = offset
         landmarks = []
         for lm in face_landmarks.landmark:
-            x, y = int(lm.x * w), int(lm.y * h)
+            x, y = int(x0 + lm.x * w), int(y0 + lm.y * h)
             landmarks.append((x, y))
         
         # Trích xuất landmarks cho các vùng quan trọng
         landmarks_dict = {
-            'left_eye': [landmarks[i] for i in self.LEFT_EYE_INDICES],
-            'right_eye': [landmarks[i] for i in self.RIGHT_EYE_INDICES],
-            'mouth': [landmarks[i] for i in self.MOUTH_INDICES],
+            'left_eye': [landmarks[i] for i in cls.LEFT_EYE_INDICES],
+            'right_eye': [landmarks[i] for i in cls.RIGHT_EYE_INDICES],
+            'mouth': [landmarks[i] for i in cls.MOUTH_INDICES],
             'all': landmarks
         }
         
-        return True, landmarks_dict
+        return landmarks_dict
+    
+    @staticmethod
+    def _landmarks_to_array(face_landmarks, w, h, indices=None, offset=(0, 0)):
+        """
+        Chuyển landmarks Mediapipe sang mảng NumPy tọa độ pixel
+        
+        Args:
+            face_landmarks: Landmarks của một khuôn mặt (NormalizedLandmarkList)
+            w, h: Kích thước vùng ảnh đã đưa vào Face Mesh
+            indices: Mảng chỉ số cần lấy (None = tất cả)
+            offset: (x0, y0) vị trí vùng ảnh đó trong frame
+        
+        Returns:
+            np.ndarray: Mảng float32 shape (N, 2)
+        """
+        lms = face_landmarks.landmark
+        if indices is None:
+            count = len(lms)
+            coords = np.fromiter((v for lm in lms for v in (lm.x, lm.y)),
+                                 dtype=np.float32, count=2 * count)
+        else:
+            count = len(indices)
+            coords = np.fromiter((v for i in indices for v in (lms[i].x, lms[i].y)),
+                                 dtype=np.float32, count=2 * count)
+        points = coords.reshape(count, 2)
+        points *= (w, h)
+        if offset[0] or offset[1]:
+            points += offset
+        return points
+    
+    @classmethod
+    def split_key_landmarks(cls, key_points):
+        """
+        Tách mảng landmark chính (lấy theo KEY_INDICES) thành từng vùng
+        
+        Args:
+            key_points: Mảng shape (20, 2) từ detect_face_array(frame, KEY_INDICES)
+        
+        Returns:
+            dict: {'left_eye', 'right_eye', 'mouth'} - các view của mảng, không sao chép
+        """
+        return {
+            'left_eye': key_points[cls.KEY_LEFT_EYE],
+            'right_eye': key_points[cls.KEY_RIGHT_EYE],
+            'mouth': key_points[cls.KEY_MOUTH],
+        }
     
     def draw_landmarks(self, frame, landmarks_dict, draw_eyes=True, draw_mouth=True):
         """
@@ -94,23 +411,33 @@ class FaceDetector:
         if landmarks_dict is None:
             return frame
         
-        import numpy as np
-        
+        # cv2.polylines yêu cầu tọa độ int32 (landmarks có thể là tuple int hoặc mảng float)
         if draw_eyes:
             # Vẽ viền mắt trái
-            cv2.polylines(frame, [np.array(landmarks_dict['left_eye'])], 
+            cv2.polylines(frame, [np.asarray(landmarks_dict['left_eye'], dtype=np.int32)], 
                             True, (0, 255, 0), 1)
             # Vẽ viền mắt phải
-            cv2.polylines(frame, [np.array(landmarks_dict['right_eye'])], 
+            cv2.polylines(frame, [np.asarray(landmarks_dict['right_eye'], dtype=np.int32)], 
                             True, (0, 255, 0), 1)
         
         if draw_mouth:
             # Vẽ viền miệng
-            cv2.polylines(frame, [np.array(landmarks_dict['mouth'])], 
+            cv2.polylines(frame, [np.asarray(landmarks_dict['mouth'], dtype=np.int32)], 
                             True, (255, 0, 0), 1)
         
         return frame
     
+    def reset_tracking(self):
+        """
+        Xóa trạng thái theo dõi giữa các frame (ROI và tracking nội bộ của Face Mesh)
+        
+        Dùng khi chuyển sang nguồn video khác; mô hình được tạo lại ở frame kế tiếp.
+        """
+        self.roi = None
+        self.release()
+    
     def release(self):
         """Giải phóng tài nguyên"""
-        self.face_mesh.close()
+        if self.face_mesh is not None:
+            self.face_mesh.close()
+            self.face_mesh = None
@@ -0,0 +1,269 @@
+"""
+Module theo dõi nhiều khuôn mặt giữa các frame
+Gán định danh ổn định cho từng khuôn mặt (khớp IoU, dự phòng bằng khoảng cách tâm),
+mỗi khuôn mặt giữ DrowsinessDetector riêng, và chọn "tài xế chính" để phát cảnh báo.
+"""
+
+import numpy as np
+
+
+class FaceTrack:
+    """
+    Một khuôn mặt được theo dõi qua nhiều frame
+    """
+
+    def __init__(self, track_id, box, key_points, detector):
+        """
+        Khởi tạo Face Track
+
+        Args:
+            track_id: Định danh của khuôn mặt
+            box: (x0, y0, x1, y1) khung khuôn mặt
+            key_points: Mảng landmark mắt/miệng shape (20, 2)
+            detector: DrowsinessDetector riêng của khuôn mặt này
+        """
+        self.track_id = track_id
+        self.box = box
+        self.key_points = key_points
+        self.detector = detector
+        self.status = None
+        self.hits = 1      # Số frame đã khớp
+        self.missed = 0    # Số frame liên tiếp không khớp
+        self.detection = -1  # Chỉ số khuôn mặt khớp trong frame hiện tại (-1 = không thấy)
+
+    @property
+    def visible(self):
+        """True nếu khuôn mặt xuất hiện trong frame hiện tại"""
+        return self.detection >= 0
+
+    @property
+    def area(self):
+        """Diện tích khung khuôn mặt (pixel^2)"""
+        x0, y0, x1, y1 = self.box
+        return float((x1 - x0) * (y1 - y0))
+
+    @property
+    def center_x(self):
+        """Hoành độ tâm khung khuôn mặt"""
+        return float(self.box[0] + self.box[2]) / 2.0
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    Tính IoU giữa mọi cặp khung (vector hóa)
+
+    Args:
+        boxes_a: Mảng shape (A, 4) dạng (x0, y0, x1, y1)
+        boxes_b: Mảng shape (B, 4)
+
+    Returns:
+        np.ndarray: Ma trận shape (A, B)
+    """
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = area_a + area_b - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+class FaceTracker:
+    """
+    Class gán định danh khuôn mặt giữa các frame và chọn tài xế chính
+
+    Chính sách chọn tài xế chính (primary_policy):
+        'largest': khuôn mặt lớn nhất (gần camera nhất)
+        'left' / 'right': khuôn mặt ở phía trái / phải theo ảnh gốc của camera
+                          (chưa lật gương) - ứng với vị trí ghế lái
+        'sticky': giữ khuôn mặt đang chọn đến khi mất dấu, sau đó chọn khuôn mặt lớn nhất
+
+    Với mọi chính sách, tài xế chính bị che tạm thời (tay, quay đầu) vẫn được giữ đến
+    khi mất dấu quá max_missed frame (trong thời gian đó coi như không thấy khuôn mặt).
+    Với 'largest'/'left'/'right', tài xế chính đang thấy chỉ bị thay khi khuôn mặt khác
+    vượt hẳn (theo switch_margin) trong switch_frames frame liên tiếp, tránh nhảy qua
+    lại giữa hai khuôn mặt gần bằng nhau.
+    """
+
+    POLICIES = ('largest', 'left', 'right', 'sticky')
+
+    def __init__(self, detector_factory, primary_policy='largest', iou_threshold=0.3,
+                 center_gate=0.5, max_missed=15, min_hits=3, switch_margin=0.2,
+                 switch_frames=5):
+        """
+        Khởi tạo Face Tracker
+
+        Args:
+            detector_factory: Hàm tạo DrowsinessDetector cho khuôn mặt mới
+            primary_policy: Chính sách chọn tài xế chính (xem POLICIES)
+            iou_threshold: IoU tối thiểu để coi là cùng khuôn mặt
+            center_gate: Khi IoU thấp (di chuyển nhanh), vẫn khớp nếu tâm lệch ít hơn
+                         center_gate * kích thước khung
+            max_missed: Số frame liên tiếp không thấy trước khi xóa khuôn mặt
+            min_hits: Số frame khớp tối thiểu trước khi khuôn mặt mới được chọn làm
+                      tài xế chính (tránh nhảy khi có phát hiện nhầm thoáng qua)
+            switch_margin: Mức vượt tối thiểu để thay tài xế chính: diện tích lớn hơn
+                           (1 + switch_margin) lần ('largest'), hoặc lệch về phía ghế lái
+                           hơn switch_margin * chiều rộng khung ('left'/'right')
+            switch_frames: Số frame liên tiếp khuôn mặt khác phải vượt trước khi thay
+        """
+        if primary_policy not in self.POLICIES:
+            raise ValueError(f"Chính sách không hợp lệ: {primary_policy}")
+        self.detector_factory = detector_factory
+        self.primary_policy = primary_policy
+        self.iou_threshold = iou_threshold
+        self.center_gate = center_gate
+        self.max_missed = max_missed
+        self.min_hits = min_hits
+        self.switch_margin = switch_margin
+        self.switch_frames = switch_frames
+
+        self.tracks = []
+        self.primary = None
+        self._next_id = 1
+        self._challenger = None     # Khuôn mặt đang vượt tài xế chính
+        self._challenge_frames = 0  # Số frame liên tiếp đã vượt
+
+    def reset(self):
+        """Xóa mọi khuôn mặt đang theo dõi"""
+        self.tracks = []
+        self.primary = None
+        self._next_id = 1
+        self._challenger = None
+        self._challenge_frames = 0
+
+    def _match_scores(self, boxes):
+        """
+        Điểm khớp giữa các khuôn mặt đang theo dõi và khuôn mặt mới phát hiện
+
+        Cặp có IoU đủ lớn dùng IoU; các cặp còn lại được khớp theo khoảng cách tâm
+        với điểm luôn thấp hơn iou_threshold nên khớp theo IoU được ưu tiên.
+
+        Returns:
+            np.ndarray: Ma trận shape (tracks, detections), 0 = không thể khớp
+        """
+        track_boxes = np.array([track.box for track in self.tracks], dtype=np.float32)
+        iou = iou_matrix(track_boxes, boxes)
+
+        track_centers = (track_boxes[:, :2] + track_boxes[:, 2:]) * 0.5
+        centers = (boxes[:, :2] + boxes[:, 2:]) * 0.5
+        distance = np.linalg.norm(track_centers[:, None, :] - centers[None, :, :], axis=2)
+        size = np.maximum(track_boxes[:, 2] - track_boxes[:, 0],
+                          track_boxes[:, 3] - track_boxes[:, 1])[:, None]
+        gate = np.maximum(self.center_gate * size, 1.0)
+        center_score = np.clip(1.0 - distance / gate, 0.0, None) * self.iou_threshold * 0.99
+
+        return np.where(iou >= self.iou_threshold, iou, center_score)
+
+    def update(self, boxes, key_points, frame_width, mirrored=False):
+        """
+        Cập nhật theo dõi với các khuôn mặt phát hiện ở frame hiện tại
+
+        Args:
+            boxes: Mảng shape (F, 4) khung khuôn mặt (x0, y0, x1, y1)
+            key_points: Mảng shape (F, 20, 2) landmark mắt/miệng
+            frame_width: Chiều rộng frame (để xác định phía trái/phải)
+            mirrored: True nếu frame đã lật gương (đảo trái/phải so với camera)
+
+        Returns:
+            list: Các FaceTrack xuất hiện trong frame này (track.detection = chỉ số trong boxes)
+        """
+        count = len(boxes)
+        for track in self.tracks:
+            track.detection = -1
+
+        # Ghép tham lam theo điểm khớp giảm dần
+        unmatched = set(range(count))
+        if self.tracks and count:
+            scores = self._match_scores(boxes)
+            used_tracks = set()
+            order = np.argsort(scores, axis=None)[::-1]
+            for flat in order:
+                track_index, detection = divmod(int(flat), count)
+                if scores[track_index, detection] <= 0:
+                    break
+                if track_index in used_tracks or detection not in unmatched:
+                    continue
+                used_tracks.add(track_index)
+                unmatched.discard(detection)
+                track = self.tracks[track_index]
+                track.detection = detection
+                track.box = boxes[detection]
+                track.key_points = key_points[detection]
+                track.hits += 1
+                track.missed = 0
+
+        # Khuôn mặt không khớp: tăng số frame mất dấu, xóa khi quá lâu
+        for track in self.tracks:
+            if track.detection < 0:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        # Khuôn mặt mới
+        for detection in sorted(unmatched):
+            track = FaceTrack(self._next_id, boxes[detection], key_points[detection],
+                              self.detector_factory())
+            track.detection = detection
+            self._next_id += 1
+            self.tracks.append(track)
+
+        self.primary = self._select_primary(frame_width, mirrored)
+        return [track for track in self.tracks if track.visible]
+
+    def _select_primary(self, frame_width, mirrored):
+        """Chọn tài xế chính theo primary_policy"""
+        if self.primary is not None and self.primary not in self.tracks:
+            self.primary = None
+        if self.primary is not None and (self.primary_policy == 'sticky'
+                                         or not self.primary.visible):
+            # Giữ tài xế chính khi chưa mất dấu, không chuyển quyền cảnh báo sang phụ xe
+            self._challenger = None
+            self._challenge_frames = 0
+            return self.primary
+
+        candidates = [track for track in self.tracks
+                      if track.visible and track.hits >= self.min_hits]
+        if not candidates:
+            # Chưa có khuôn mặt ổn định: giữ lựa chọn cũ, nếu chưa có thì lấy khuôn mặt đầu tiên
+            if self.primary is not None:
+                return self.primary
+            visible = [track for track in self.tracks if track.visible]
+            return visible[0] if len(visible) == 1 else None
+
+        if self.primary_policy in ('left', 'right'):
+            # Đưa về tọa độ camera gốc; điểm càng lớn càng gần phía ghế lái
+            sign = -1.0 if (self.primary_policy == 'left') != mirrored else 1.0
+
+            def score(track):
+                return sign * track.center_x
+
+            def beats(challenger, primary):
+                width = float(primary.box[2] - primary.box[0])
+                return score(challenger) - score(primary) > self.switch_margin * width
+        else:
+            def score(track):
+                return track.area
+
+            def beats(challenger, primary):
+                return challenger.area > (1.0 + self.switch_margin) * primary.area
+
+        best = max(candidates, key=score)
+        primary = self.primary
+        if primary is None or best is primary or not beats(best, primary):
+            self._challenger = None
+            self._challenge_frames = 0
+            return best if primary is None else primary
+
+        # Khuôn mặt khác vượt hẳn: chỉ thay sau switch_frames frame liên tiếp
+        if best is self._challenger:
+            self._challenge_frames += 1
+        else:
+            self._challenger = best
+            self._challenge_frames = 1
+        if self._challenge_frames >= self.switch_frames:
+            self._challenger = None
+            self._challenge_frames = 0
+            return best
+        return primary
@@ -9,14 +9,23 @@ from kivy.uix.label import Label
 from kivy.uix.image import Image
 from kivy.uix.popup import Popup
 from kivy.uix.slider import Slider
+from kivy.uix.textinput import TextInput
 from kivy.clock import Clock
 from kivy.graphics.texture import Texture
-from kivy.graphics import Color, Line, Rectangle
-from kivy.core.audio import SoundLoader
-import cv2
+from kivy.graphics import Color, Line, Rectangle, InstructionGroup
+from kivy.core.text import Label as CoreLabel
+import time
+
+import numpy as np
 
 from camera_processor import CameraProcessor
-from drowsiness_detector import DrowsinessDetector
+from status_readout import StatusReadout
+from alarm import AlarmController, create_backend
+from session_logger import SessionLogger
+from calibration import CalibrationEngine
+from startup_report import StartupReport
+from stage_timer import StageTimer
+from profile_store import ProfileStore
 
 
 class GroupBox(BoxLayout):
@@ -69,6 +78,153 @@ class GroupBox(BoxLayout):
         super().add_widget(widget, *args, **kwargs)
 
 
+class HudOverlay:
+    """
+    Vẽ overlay (chữ, thanh điểm, viền landmark) bằng canvas Kivy phía trên Image widget
+    
+    Các lệnh vẽ được tạo một lần và dùng lại; texture chữ chỉ được render lại
+    khi nội dung thay đổi, thay vì vẽ từng pixel vào frame bằng cv2.
+    """
+    
+    # Cỡ chữ (pixel frame) tương ứng fontScale = 1 của cv2.FONT_HERSHEY_SIMPLEX
+    FONT_PIXELS_PER_SCALE = 30
+    
+    def __init__(self, image_widget):
+        self.image_widget = image_widget
+        self.group = InstructionGroup()
+        image_widget.canvas.after.add(self.group)
+        self._texts = []
+        self._bars = []
+        self._lines = []
+        self._overlay = None
+        image_widget.bind(pos=self._redraw, size=self._redraw)
+    
+    @staticmethod
+    def _rgba(bgr):
+        """Đổi màu BGR (0-255) sang RGBA (0-1) của Kivy"""
+        return (bgr[2] / 255.0, bgr[1] / 255.0, bgr[0] / 255.0, 1)
+    
+    def _transform(self, frame_size):
+        """
+        Tính phép đổi tọa độ frame (gốc trên trái) sang tọa độ widget (gốc dưới trái)
+        
+        Returns:
+            tuple: (ox, oy, scale, frame_h) cho ảnh hiển thị giữ tỉ lệ trong widget
+        """
+        fw, fh = frame_size
+        nw, nh = self.image_widget.norm_image_size
+        scale = min(nw / fw, nh / fh) if fw and fh else 1.0
+        ox = self.image_widget.center_x - fw * scale / 2.0
+        oy = self.image_widget.center_y - fh * scale / 2.0
+        return ox, oy, scale, fh
+    
+    def _slot(self, slots, index, factory):
+        """Lấy (hoặc tạo mới) nhóm lệnh vẽ thứ index"""
+        while len(slots) <= index:
+            slot = factory()
+            slots.append(slot)
+        return slots[index]
+    
+    def _new_text_slot(self):
+        color = Color(1, 1, 1, 0)
+        rect = Rectangle(size=(0, 0))
+        self.group.add(color)
+        self.group.add(rect)
+        return {'color': color, 'rect': rect, 'key': None, 'rgba': None}
+    
+    def _new_bar_slot(self):
+        fill_color = Color(1, 1, 1, 0)
+        fill = Rectangle(size=(0, 0))
+        border_color = Color(1, 1, 1, 0)
+        border = Line(rectangle=(0, 0, 0, 0), width=1.5)
+        for instruction in (fill_color, fill, border_color, border):
+            self.group.add(instruction)
+        return {'fill_color': fill_color, 'fill': fill,
+                'border_color': border_color, 'border': border}
+    
+    def _new_line_slot(self):
+        color = Color(1, 1, 1, 0)
+        line = Line(points=[], close=True, width=1)
+        self.group.add(color)
+        self.group.add(line)
+        return {'color': color, 'line': line}
+    
+    @staticmethod
+    def _set_rgba(color_instruction, rgba):
+        """Chỉ gán màu khi thay đổi (tránh đánh dấu canvas cần vẽ lại)"""
+        if tuple(color_instruction.rgba) != tuple(rgba):
+            color_instruction.rgba = rgba
+    
+    def update(self, overlay):
+        """
+        Cập nhật overlay
+        
+        Args:
+            overlay: Mô tả overlay từ CameraProcessor.get_current_overlay() (None = ẩn)
+        """
+        self._overlay = overlay
+        self._redraw()
+    
+    def clear(self):
+        """Ẩn toàn bộ overlay"""
+        self.update(None)
+    
+    def _redraw(self, *args):
+        """Áp dụng mô tả overlay hiện tại vào các lệnh vẽ"""
+        overlay = self._overlay
+        texts = overlay['texts'] if overlay else []
+        bars = overlay['bars'] if overlay else []
+        lines = overlay['polylines'] if overlay else []
+        if overlay:
+            ox, oy, scale, fh = self._transform(overlay['frame_size'])
+            fw = overlay['frame_size'][0]
+        
+        for i, item in enumerate(texts):
+            slot = self._slot(self._texts, i, self._new_text_slot)
+            font_size = max(1, int(item['scale'] * self.FONT_PIXELS_PER_SCALE * scale))
+            key = (item['text'], font_size, item['thickness'] > 1)
+            if key != slot['key']:
+                label = CoreLabel(text=item['text'], font_size=font_size, bold=key[2])
+                label.refresh()
+                slot['rect'].texture = label.texture
+                slot['rect'].size = label.texture.size
+                slot['key'] = key
+            self._set_rgba(slot['color'], self._rgba(item['color']))
+            x, y = item['pos']
+            slot['rect'].pos = (ox + x * scale, oy + (fh - y) * scale)
+        
+        for i, bar in enumerate(bars):
+            slot = self._slot(self._bars, i, self._new_bar_slot)
+            x0, y0, x1, y1 = bar['rect']
+            left, bottom = ox + x0 * scale, oy + (fh - y1) * scale
+            width, height = (x1 - x0) * scale, (y1 - y0) * scale
+            self._set_rgba(slot['fill_color'], self._rgba(bar['color']))
+            self._set_rgba(slot['border_color'], self._rgba(bar['border_color']))
+            slot['fill'].pos = (left, bottom)
+            slot['fill'].size = (width * bar['value'], height)
+            slot['border'].rectangle = (left, bottom, width, height)
+        
+        for i, item in enumerate(lines):
+            slot = self._slot(self._lines, i, self._new_line_slot)
+            points = []
+            for x, y in item['points']:
+                if overlay['mirror']:
+                    x = fw - 1 - x
+                points.append(ox + float(x) * scale)
+                points.append(oy + (fh - float(y)) * scale)
+            self._set_rgba(slot['color'], self._rgba(item['color']))
+            slot['line'].points = points
+        
+        # Ẩn các nhóm lệnh vẽ không dùng đến
+        for slot in self._texts[len(texts):]:
+            self._set_rgba(slot['color'], (1, 1, 1, 0))
+        for slot in self._bars[len(bars):]:
+            self._set_rgba(slot['fill_color'], (1, 1, 1, 0))
+            self._set_rgba(slot['border_color'], (1, 1, 1, 0))
+        for slot in self._lines[len(lines):]:
+            self._set_rgba(slot['color'], (1, 1, 1, 0))
+
+
 class DrowsyGuardLayout(BoxLayout):
     """
     Layout chính của ứng dụng DrowsyGuard
@@ -80,23 +236,64 @@ class DrowsyGuardLayout(BoxLayout):
         self.padding = 10
         self.spacing = 10
 
-        # Khởi tạo Camera Processor
-        self.camera_processor = CameraProcessor(camera_index=0)
+        # Khởi tạo Camera Processor (đọc camera và phân tích trên luồng riêng,
+        # giao diện chỉ lấy kết quả mới nhất để hiển thị; ngưỡng theo giây
+        # vì tốc độ phân tích không còn cố định 30 FPS)
+        self.camera_processor = CameraProcessor(camera_index=0, use_pipeline=True,
+                                                use_wall_clock=True)
+        # Overlay và lật gương do giao diện vẽ bằng canvas/texture, không vẽ vào frame
+        self.camera_processor.draw_overlays = False
+        self.camera_processor.mirror_frame = False
+        
+        # Hiển thị độ trễ từng giai đoạn (p50/p99) trong bảng thông tin
+        self.show_stage_timings = False
+        self.camera_processor.enable_instrumentation(self.show_stage_timings)
+        # Thời gian CPU của luồng giao diện mỗi frame: luôn đo (chi phí thấp), ghi vào
+        # nhật ký khi dừng giám sát để so sánh trước/sau khi tối ưu
+        self.ui_timer = StageTimer()
+        
+        # Chạy thử Face Mesh và mở camera song song ngay khi mở ứng dụng,
+        # để lúc bấm "Bắt đầu" frame đầu tiên không phải chờ khởi tạo
+        self.startup_report = StartupReport()
+        self.camera_processor.prepare_async(self.startup_report)
+        self._report_startup = False
+        
+        # Nhật ký phiên (chỉ số từng frame + sự kiện) ghi nền vào thư mục logs/
+        self.session_logger = SessionLogger('logs')
+        self.camera_processor.session_logger = self.session_logger
+        
+        # Bảng trạng thái chỉ cập nhật khi nội dung đổi; chỉ số làm mới tối đa N lần/giây
+        self.readout_refresh_hz = 5.0
+        self.status_readout = StatusReadout(self.readout_refresh_hz)
         self.is_monitoring = False
         self.is_paused = False
         self.alert_popup = None
         
-        # THÊM: Biến lưu trữ calibration
+        # Texture hiển thị camera, tạo một lần cho mỗi độ phân giải và dùng lại
+        self._frame_texture = None
+        self._frame_texture_key = None
+        
+        # THÊM: Biến lưu trữ calibration (thống kê dạng dòng, không lưu từng mẫu)
         self.calibration_mode = False
-        self.calibration_samples = {'ear': [], 'mar': []}
-        self.calibration_frames = 0
-        self.CALIBRATION_DURATION = 150  # 5 giây ở 30 FPS
+        self.calibration_engine = CalibrationEngine(min_samples=50)
+        self.CALIBRATION_SAMPLES = 150  # Số mẫu hợp lệ (đã loại chớp mắt) cần thu
+        self.CALIBRATION_TIMEOUT = 20.0  # Giây; hết giờ thì tính với số mẫu đang có
+        self._calibration_started = None
+        
+        # Ngưỡng tự điều chỉnh theo tài xế trong lúc giám sát (tắt khi người dùng tự đặt ngưỡng)
+        self.camera_processor.enable_background_calibration()
+        
+        # Hồ sơ hiệu chỉnh theo mã tài xế (lưu cục bộ, tải lại ở ca sau)
+        self.profile_store = ProfileStore('profiles.db')
+        self.driver_id = None
+        self._skipped_calibration_for = None  # Bấm Hiệu chỉnh lần nữa để hiệu chỉnh lại
 
         # Tải âm thanh cảnh báo
         self.setup_alarm()
 
         # Xây dựng giao diện
         self._build_ui()
+        self.hud = HudOverlay(self.img_widget)
 
     def _build_ui(self):
         """Xây dựng giao diện người dùng - Phong cách cổ điển"""
@@ -159,6 +356,25 @@ class DrowsyGuardLayout(BoxLayout):
         # GROUPBOX: ĐIỀU KHIỂN
         control_group = GroupBox(title='Bảng điều khiển', size_hint=(1, 0.6))
         
+        # Hàng 0: Mã tài xế (Enter để tải hồ sơ đã lưu)
+        row0 = BoxLayout(size_hint=(1, 0.22), spacing=8)
+        row0.add_widget(Label(
+            text='Tài xế:',
+            font_size='14sp',
+            size_hint=(0.3, 1),
+            color=(0.85, 0.85, 0.9, 1),
+            bold=True
+        ))
+        self.driver_input = TextInput(
+            hint_text='Mã tài xế',
+            multiline=False,
+            font_size='14sp',
+            size_hint=(0.7, 1)
+        )
+        self.driver_input.bind(on_text_validate=self.load_driver_profile)
+        row0.add_widget(self.driver_input)
+        control_group.add_widget(row0)
+        
         # Hàng 1: Bắt đầu | Dừng
         row1 = BoxLayout(size_hint=(1, 0.3), spacing=8)
         
@@ -253,14 +469,8 @@ class DrowsyGuardLayout(BoxLayout):
         self.bg.size = self.size
 
     def setup_alarm(self):
-        """Tải âm thanh cảnh báo"""
-        try:
-            self.alarm_sound = SoundLoader.load('alarm.wav')
-            if self.alarm_sound is None:
-                self.alarm_sound = SoundLoader.load('alarm.mp3')
-        except Exception:
-            self.alarm_sound = None
-            print("Không tìm thấy file âm thanh cảnh báo")
+        """Tải âm thanh cảnh báo (giải mã một lần) và khởi động luồng chuông"""
+        self.alarm = AlarmController(create_backend('auto'))
 
     def start_monitoring(self, instance):
         """Bắt đầu giám sát"""
@@ -271,9 +481,12 @@ class DrowsyGuardLayout(BoxLayout):
             # Disable 3 nút cài đặt trong lúc giám sát
             self.default_btn.disabled = True
             self.sensitivity_btn.disabled = True
-            self.calibrate_btn.disabled = True
+            self.driver_input.disabled = True
             self.status_label.text = 'Trạng thái: Đang phân tích...'
             self.status_label.color = (1, 1, 0, 1)
+            self.status_readout.reset()
+            self._report_startup = True
+            self.session_logger.log_event('monitoring_start', mode='gui')
             Clock.schedule_interval(self.update, 1.0 / 30.0)
         else:
             self.status_label.text = 'Lỗi: Không thể mở camera'
@@ -283,16 +496,23 @@ class DrowsyGuardLayout(BoxLayout):
         """Dừng giám sát"""
         self.is_monitoring = False
         self.is_paused = False
+        self.calibration_mode = False
         Clock.unschedule(self.update)
         self.camera_processor.stop()
+        self.hud.clear()
+        self._save_background_thresholds()
+        ui_update = self.ui_timer.summary().get('ui_update')
+        if ui_update is not None:
+            print(f"CPU luồng giao diện/frame: TB {ui_update['mean_ms']:.2f} ms, "
+                  f"p50 {ui_update['p50_ms']:.2f} ms, p99 {ui_update['p99_ms']:.2f} ms")
+        self.session_logger.log_event('monitoring_stop', ui_update=ui_update)
+        self.session_logger.flush()
 
         if self.alert_popup:
             self.alert_popup.dismiss()
             self.alert_popup = None
 
-        if self.alarm_sound and self.alarm_sound.state == 'play':
-            self.alarm_sound.stop()
-            self.alarm_sound.loop = False
+        self.alarm.acknowledge()
 
         self.start_btn.disabled = False
         self.stop_btn.disabled = True
@@ -300,12 +520,13 @@ class DrowsyGuardLayout(BoxLayout):
         self.default_btn.disabled = False
         self.sensitivity_btn.disabled = False
         self.calibrate_btn.disabled = False
+        self.driver_input.disabled = False
         self.status_label.text = 'Trạng thái: Đã dừng'
         self.status_label.color = (1, 1, 1, 1)
         self.detail_label.text = ''
 
     def update(self, dt):
-        """Cập nhật frame từ camera"""
+        """Hiển thị kết quả phân tích mới nhất từ pipeline camera"""
         if not self.is_monitoring or self.is_paused:
             return
 
@@ -313,55 +534,89 @@ class DrowsyGuardLayout(BoxLayout):
         if not success or frame is None:
             return
 
-        if status:
-            self._update_status_display(status)
-            if status['drowsy'] and status['alert_active'] and not self.is_paused:
-                self._show_drowsiness_alert(status)
-                return
-
-            if status['alert_active'] and self.alarm_sound:
-                if self.alarm_sound.state != 'play':
-                    self.alarm_sound.play()
+        if self._report_startup:
+            # Kết quả đầu tiên của phiên: ghi thời gian đến frame/phân tích đầu tiên
+            self._report_startup = False
+            print(self.camera_processor.format_startup())
+            self.session_logger.log_event('startup', **self.camera_processor.get_startup_stats())
 
-        self._display_frame(frame)
+        # Thời gian CPU của luồng giao diện cho mỗi frame (kể cả frame mở popup cảnh báo)
+        ui_start = time.thread_time_ns()
+        try:
+            if status:
+                if self.calibration_mode:
+                    # Hiệu chỉnh trên chính các frame đang giám sát (không dừng camera)
+                    self._feed_calibration(status)
+                else:
+                    self._update_status_display(status)
+                # Luồng chuông tự bật khi trạng thái chuyển sang cảnh báo
+                self.alarm.notify(status)
+                if status['drowsy'] and status['alert_active'] and not self.is_paused:
+                    self._show_drowsiness_alert(status)
+                    return
+
+            self._display_frame(frame)
+        finally:
+            self.ui_timer.record('ui_update', time.thread_time_ns() - ui_start)
 
     def _update_status_display(self, status):
-        """Cập nhật hiển thị trạng thái"""
-        status_text = DrowsinessDetector().get_status_text(status)
-        self.status_label.text = f'Trạng thái: {status_text}'
-        self.status_label.color = DrowsinessDetector().get_status_color(status)
-
-        if status['alert_level'] != 'NO_FACE':
-            text = (
-                f"EAR: {status['ear']:.3f}  |  "
-                f"MAR: {status['mar']:.3f}  |  "
-                f"Ngáp: {status['total_yawns']} lần  |  "
-                f"Điểm: {round(status['drowsiness_score'], 2)}\n"
-            )
-        else:
-            text = 'Không phát hiện khuôn mặt - Vui lòng điều chỉnh vị trí\n'
-
-        # Hiển thị ngưỡng hiện tại
-        ear_thr = getattr(self.camera_processor.drowsiness_detector, 'EAR_THRESHOLD', 0.25)
-        mar_thr = getattr(self.camera_processor.drowsiness_detector, 'MAR_THRESHOLD', 0.6)
-        text += f"Ngưỡng cài đặt: EAR={ear_thr:.2f} | MAR={mar_thr:.2f}"
-
-        self.detail_label.text = text
+        """
+        Cập nhật hiển thị trạng thái
+        
+        Label chỉ được gán text khi nội dung đổi (mỗi lần gán Kivy phải dựng lại
+        texture chữ và bố cục).
+        """
+        header = self.status_readout.status_text(status)
+        if header is not None:
+            self.status_label.text, self.status_label.color = header
+
+        # Ngưỡng hiện tại
+        detector = self.camera_processor.drowsiness_detector
+        thresholds = (getattr(detector, 'EAR_THRESHOLD', 0.25),
+                      getattr(detector, 'MAR_THRESHOLD', 0.6))
+        extra = None
+        if self.show_stage_timings:
+            extra = lambda: " | ".join(
+                text for text in (self.camera_processor.stage_timer.format_summary(compact=True),
+                                  self.ui_timer.format_summary(compact=True)) if text)
+        detail = self.status_readout.detail_text(status, thresholds, time.monotonic(), extra)
+        if detail is not None:
+            self.detail_label.text = detail
 
     def _display_frame(self, frame):
-        """Hiển thị frame lên Image widget"""
-        buf = cv2.flip(frame, 0).tobytes()
-        texture = Texture.create(size=(frame.shape[1], frame.shape[0]), colorfmt='bgr')
-        texture.blit_buffer(buf, colorfmt='bgr', bufferfmt='ubyte')
-        self.img_widget.texture = texture
+        """
+        Hiển thị frame lên Image widget
+        
+        Texture chỉ được tạo lại khi đổi độ phân giải; lật dọc (và lật gương nếu
+        CameraProcessor không tự lật frame) thực hiện bằng tọa độ UV của texture
+        thay vì sao chép ảnh trên CPU.
+        """
+        h, w = frame.shape[:2]
+        mirror = not self.camera_processor.mirror_frame
+        key = (w, h, mirror)
+        if self._frame_texture is None or self._frame_texture_key != key:
+            texture = Texture.create(size=(w, h), colorfmt='bgr')
+            # OpenCV lưu ảnh từ trên xuống, OpenGL từ dưới lên
+            texture.flip_vertical()
+            if mirror:
+                texture.flip_horizontal()
+            self._frame_texture = texture
+            self._frame_texture_key = key
+            self.img_widget.texture = texture
+        
+        # Đưa thẳng bộ nhớ của frame vào texture (không tạo bản sao bytes)
+        if not frame.flags['C_CONTIGUOUS']:
+            frame = np.ascontiguousarray(frame)
+        self._frame_texture.blit_buffer(frame.reshape(-1), colorfmt='bgr', bufferfmt='ubyte')
+        self.img_widget.canvas.ask_update()
+        
+        # Overlay của đúng frame này (vẽ bằng canvas Kivy)
+        self.hud.update(self.camera_processor.get_current_overlay())
 
     def _show_drowsiness_alert(self, status):
         """Hiển thị popup cảnh báo buồn ngủ """
         self.is_paused = True
 
-        if self.alarm_sound and self.alarm_sound.state == 'play':
-            self.alarm_sound.stop()
-
         content = BoxLayout(orientation='vertical', padding=20, spacing=15)
         
         # Nền đỏ cảnh báo
@@ -429,34 +684,32 @@ class DrowsyGuardLayout(BoxLayout):
         confirm_btn.bind(on_press=self._on_confirm_alert)
         self.alert_popup.open()
 
-        if self.alarm_sound:
-            self.alarm_sound.loop = True
-            self.alarm_sound.play()
-
     def _on_confirm_alert(self, instance):
         """Xử lý khi người dùng xác nhận đã tỉnh táo"""
         if self.alert_popup:
             self.alert_popup.dismiss()
             self.alert_popup = None
 
-        if self.alarm_sound and self.alarm_sound.state == 'play':
-            self.alarm_sound.stop()
-            self.alarm_sound.loop = False
+        self.alarm.acknowledge()
+        self.session_logger.log_event('alert_ack')
 
-        self.camera_processor.drowsiness_detector.reset()
+        self.camera_processor.request_detector_reset()
         self.is_paused = False
         self.status_label.text = 'Trạng thái: Đã xác nhận - Tiếp tục giám sát'
         self.status_label.color = (0, 1, 0, 1)
+        self.status_readout.reset()
 
     def reset_defaults(self, instance):
         """Đặt lại ngưỡng EAR/MAR về giá trị mặc định"""
         try:
-            self.camera_processor.drowsiness_detector.EAR_THRESHOLD = 0.25
-            self.camera_processor.drowsiness_detector.MAR_THRESHOLD = 0.6
+            self.camera_processor.set_thresholds(0.25, 0.6)
             self.status_label.text = "Đã khôi phục cài đặt mặc định"
             self.status_label.color = (0.3, 0.8, 0.95, 1)
             self.detail_label.text = "Ngưỡng: EAR=0.25 | MAR=0.6"
             print("Reset EAR=0.25, MAR=0.6 thành công.")
+            self.camera_processor.enable_background_calibration()
+            self._save_profile(0.25, 0.6, source='default')
+            self.session_logger.log_event('thresholds', source='default', ear=0.25, mar=0.6)
         except Exception as e:
             print("Lỗi khi đặt lại mặc định:", e)
             self.status_label.text = "Lỗi khi đặt lại mặc định"
@@ -550,12 +803,16 @@ class DrowsyGuardLayout(BoxLayout):
         def save_thresholds(instance_btn):
             new_ear = ear_slider.value
             new_mar = mar_slider.value
-            self.camera_processor.drowsiness_detector.EAR_THRESHOLD = new_ear
-            self.camera_processor.drowsiness_detector.MAR_THRESHOLD = new_mar
+            self.camera_processor.set_thresholds(new_ear, new_mar)
             self.status_label.text = f"Đã cập nhật độ nhạy"
             self.status_label.color = (0.3, 0.9, 0.6, 1)
             self.detail_label.text = f"Ngưỡng cài đặt: EAR={new_ear:.2f} | MAR={new_mar:.2f}"
             print(f"[INFO] Ngưỡng mới áp dụng: EAR={new_ear:.2f}, MAR={new_mar:.2f}")
+            # Giữ nguyên ngưỡng người dùng chọn
+            self.camera_processor.enable_background_calibration(False)
+            self._save_profile(new_ear, new_mar, source='manual')
+            self.session_logger.log_event('thresholds', source='manual',
+                                          ear=round(new_ear, 3), mar=round(new_mar, 3))
             popup.dismiss()
 
         save_btn.bind(on_press=save_thresholds)
@@ -581,12 +838,30 @@ class DrowsyGuardLayout(BoxLayout):
         #==================================================================================
 
     def start_calibration(self, instance):
-        """Bắt đầu calibration tự động"""
-        if self.is_monitoring:
-            self.status_label.text = "Vui lòng dừng giám sát trước khi hiệu chỉnh"
-            self.status_label.color = (1, 0.5, 0, 1)
+        """Bắt đầu calibration tự động (được cả khi đang giám sát)"""
+        if self.calibration_mode:
             return
         
+        # Hồ sơ của tài xế còn mới: dùng luôn, bấm lần nữa mới hiệu chỉnh lại
+        driver_id = self._current_driver_id()
+        if driver_id is not None and driver_id != self._skipped_calibration_for:
+            profile = self.profile_store.get_fresh(driver_id)
+            if profile is not None:
+                self._apply_profile(profile)
+                self._skipped_calibration_for = driver_id
+                days = profile.age() / 86400
+                self.status_label.text = f'Đã dùng hồ sơ của "{driver_id}" - bỏ qua hiệu chỉnh'
+                self.status_label.color = (0.3, 0.8, 0.95, 1)
+                self.detail_label.text = (
+                    f"Hiệu chỉnh lần cuối: {days:.0f} ngày trước\n"
+                    f"Ngưỡng: EAR={profile.ear_threshold:.3f} | MAR={profile.mar_threshold:.3f}\n"
+                    f"Nhấn \"Hiệu chỉnh\" lần nữa để hiệu chỉnh lại"
+                )
+                self.session_logger.log_event('profile_loaded', driver=driver_id,
+                                              reason='calibration_skipped')
+                return
+        self._skipped_calibration_for = None
+        
         # Hiển thị popup hướng dẫn
         content = BoxLayout(orientation='vertical', padding=25, spacing=18)
         
@@ -610,7 +885,7 @@ class DrowsyGuardLayout(BoxLayout):
                 '1. Ngồi thẳng, thư giãn\n'
                 '2. Nhìn thẳng vào camera\n'
                 '3. Mở mắt bình thường trong 5 giây\n'
-                '4. KHÔNG chớp mắt liên tục\n\n'
+                '4. Chớp mắt tự nhiên (hệ thống tự loại bỏ)\n\n'
                 'Hệ thống sẽ tự động tính ngưỡng tối ưu'
             ),
             font_size='15sp',
@@ -651,27 +926,31 @@ class DrowsyGuardLayout(BoxLayout):
 
     def _run_calibration(self):
         """Chạy quá trình calibration"""
+        self.calibration_engine.reset()
+        self._calibration_started = time.monotonic()
         self.calibration_mode = True
-        self.calibration_samples = {'ear': [], 'mar': []}
-        self.calibration_frames = 0
+        self.calibrate_btn.disabled = True
+        self.default_btn.disabled = True
+        self.sensitivity_btn.disabled = True
+        self.status_label.text = 'Đang hiệu chỉnh... Giữ mắt mở và nhìn thẳng!'
+        self.status_label.color = (1, 1, 0, 1)
+        
+        # Đang giám sát: update() đưa từng frame vào hiệu chỉnh, camera vẫn chạy
+        if self.is_monitoring:
+            return
         
         # Bật camera để thu thập dữ liệu
         if self.camera_processor.start():
-            self.status_label.text = 'Đang hiệu chỉnh... Giữ mắt mở và nhìn thẳng!'
-            self.status_label.color = (1, 1, 0, 1)
-            
             # Disable các nút trong lúc calibration
             self.start_btn.disabled = True
             self.stop_btn.disabled = True
-            self.calibrate_btn.disabled = True
-            self.default_btn.disabled = True
-            self.sensitivity_btn.disabled = True
             # hàm calibrate_update sẽ được gọi 30 lần mỗi giây
             Clock.schedule_interval(self._calibration_update, 1.0 / 30.0)
         else:
             self.status_label.text = 'Lỗi: Không thể mở camera'
             self.status_label.color = (1, 0, 0, 1)
             self.calibration_mode = False
+            self._enable_setting_buttons()
 
     def _calibration_update(self, dt):
         """Cập nhật frame trong quá trình calibration"""
@@ -686,57 +965,78 @@ class DrowsyGuardLayout(BoxLayout):
         # Hiển thị frame
         self._display_frame(frame)
         
-        # Thu thập mẫu EAR/MAR (chỉ khi phát hiện khuôn mặt)
+        # Hoàn thành calibration thì dừng schedule
+        return not self._feed_calibration(status)
+
+    def _feed_calibration(self, status):
+        """
+        Đưa trạng thái một frame vào hiệu chỉnh
+        
+        Returns:
+            bool: True nếu hiệu chỉnh vừa kết thúc
+        """
+        engine = self.calibration_engine
+        now = time.monotonic()
+        
+        # Thu thập mẫu EAR/MAR (chỉ khi phát hiện khuôn mặt); mẫu chớp mắt/ngáp bị loại
         if status['alert_level'] != 'NO_FACE':
-            self.calibration_samples['ear'].append(status['ear'])
-            self.calibration_samples['mar'].append(status['mar'])
-            self.calibration_frames += 1
+            engine.push(status['ear'], status['mar'], now)
             
-            # Hiển thị tiến trình
-            progress = int((self.calibration_frames / self.CALIBRATION_DURATION) * 100)
+            # Hiển thị tiến trình theo số mẫu hợp lệ
+            progress = min(100, int(engine.accepted / self.CALIBRATION_SAMPLES * 100))
             self.detail_label.text = (
-                f"Tiến trình: {progress}% ({self.calibration_frames}/{self.CALIBRATION_DURATION})\n"
+                f"Tiến trình: {progress}% ({engine.accepted}/{self.CALIBRATION_SAMPLES})  |  "
+                f"Bỏ qua: {engine.blinks_rejected} chớp mắt, {engine.yawns_rejected} ngáp\n"
                 f"EAR hiện tại: {status['ear']:.3f} | MAR: {status['mar']:.3f}"
             )
         else:
             self.detail_label.text = "Không phát hiện khuôn mặt - Vui lòng nhìn thẳng vào camera"
         
-        # Hoàn thành calibration
-        if self.calibration_frames >= self.CALIBRATION_DURATION:
+        # Hoàn thành khi đủ mẫu và thống kê ổn định, hoặc khi hết giờ
+        if ((engine.accepted >= self.CALIBRATION_SAMPLES and engine.converged()) or
+                now - self._calibration_started >= self.CALIBRATION_TIMEOUT):
             self._finish_calibration()
-            return False  # Dừng schedule
-        
-        return True  # Tiếp tục
+            return True
+        return False
+
+    def _enable_setting_buttons(self):
+        """Enable lại các nút cài đặt sau khi hiệu chỉnh"""
+        self.calibrate_btn.disabled = False
+        if not self.is_monitoring:
+            self.start_btn.disabled = False
+            self.stop_btn.disabled = True
+            self.default_btn.disabled = False
+            self.sensitivity_btn.disabled = False
 
     def _finish_calibration(self):
         """Hoàn thành calibration và tính ngưỡng"""
         self.calibration_mode = False
-        self.camera_processor.stop()
-        
-        
+        if self.is_monitoring:
+            self.status_readout.reset()
+        else:
+            self.camera_processor.stop()
+            self.hud.clear()
         
         # Kiểm tra đủ mẫu
-        if len(self.calibration_samples['ear']) < 50:
+        engine = self.calibration_engine
+        thresholds = engine.thresholds()
+        if thresholds is None:
             self.status_label.text = 'Calibration thất bại: Không đủ dữ liệu'
             self.status_label.color = (1, 0, 0, 1)
             self.detail_label.text = 'Vui lòng thử lại và đảm bảo khuôn mặt hiện rõ'
+            self._enable_setting_buttons()
             return
         
-        # Tính EAR/MAR trung bình
-        avg_ear = sum(self.calibration_samples['ear']) / len(self.calibration_samples['ear'])
-        avg_mar = sum(self.calibration_samples['mar']) / len(self.calibration_samples['mar'])
-        
-        # Tính ngưỡng tối ưu (giảm 20% cho EAR, tăng 20% cho MAR)
-        optimal_ear = avg_ear * 0.80  # Mắt nhắm khi EAR giảm 20%
-        optimal_mar = avg_mar * 1.20  # Ngáp khi MAR tăng 20%
-        
-        # Giới hạn trong khoảng hợp lý
-        optimal_ear = max(0.15, min(0.30, optimal_ear))
-        optimal_mar = max(0.50, min(0.75, optimal_mar))
+        # Ngưỡng từ phân vị của các mẫu hợp lệ (xem CalibrationEngine.thresholds)
+        optimal_ear, optimal_mar = thresholds
+        summary = engine.summary()
+        avg_ear = summary['ear']['p50']
+        avg_mar = summary['mar']['p50']
         
-        # Áp dụng ngưỡng mới
-        self.camera_processor.drowsiness_detector.EAR_THRESHOLD = optimal_ear
-        self.camera_processor.drowsiness_detector.MAR_THRESHOLD = optimal_mar
+        # Áp dụng ngưỡng mới; hiệu chỉnh nền tiếp tục tinh chỉnh từ đây
+        self.camera_processor.set_thresholds(optimal_ear, optimal_mar)
+        self.camera_processor.enable_background_calibration()
+        self._save_profile(optimal_ear, optimal_mar, source='guided', baseline=summary)
         
         # Hiển thị kết quả
         self.status_label.text = 'Hiệu chỉnh thành công!'
@@ -744,13 +1044,19 @@ class DrowsyGuardLayout(BoxLayout):
         
         self.detail_label.text = (
             f"Kết quả Calibration:\n"
-            f"EAR trung bình: {avg_ear:.3f} → Ngưỡng: {optimal_ear:.3f}\n"
-            f"MAR trung bình: {avg_mar:.3f} → Ngưỡng: {optimal_mar:.3f}\n"
+            f"EAR trung vị: {avg_ear:.3f} → Ngưỡng: {optimal_ear:.3f}\n"
+            f"MAR trung vị: {avg_mar:.3f} → Ngưỡng: {optimal_mar:.3f}\n"
             f"Ngưỡng đã được tối ưu hóa cho bạn!"
         )
         
         print(f"[CALIBRATION] EAR: {avg_ear:.3f} → {optimal_ear:.3f}")
         print(f"[CALIBRATION] MAR: {avg_mar:.3f} → {optimal_mar:.3f}")
+        self.session_logger.log_event('calibration', source='guided', samples=summary['samples'],
+                                      accepted=engine.accepted,
+                                      blinks_rejected=summary['blinks_rejected'],
+                                      yawns_rejected=summary['yawns_rejected'],
+                                      avg_ear=round(avg_ear, 4), avg_mar=round(avg_mar, 4),
+                                      ear=round(optimal_ear, 3), mar=round(optimal_mar, 3))
         
         # Hiển thị popup thành công
         self._show_calibration_success(avg_ear, avg_mar, optimal_ear, optimal_mar)
@@ -822,11 +1128,7 @@ class DrowsyGuardLayout(BoxLayout):
         )
         
         # Enable lại các nút
-        self.start_btn.disabled = False
-        self.stop_btn.disabled = True
-        self.calibrate_btn.disabled = False
-        self.default_btn.disabled = False
-        self.sensitivity_btn.disabled = False
+        self._enable_setting_buttons()
         
         ok_btn.bind(on_press=popup.dismiss)
         popup.open()
@@ -843,12 +1145,80 @@ class DrowsyGuardLayout(BoxLayout):
         #==================================================================================
         #==================================================================================
 
+    #==================================================================================
+    # Hồ sơ tài xế
+    #==================================================================================
+
+    def _current_driver_id(self):
+        """Mã tài xế đang nhập (đã chuẩn hóa), None nếu để trống"""
+        driver_id = ProfileStore.normalize_id(self.driver_input.text)
+        return driver_id or None
+
+    def load_driver_profile(self, instance=None):
+        """Tải hồ sơ của tài xế vừa nhập và áp dụng ngưỡng đã lưu"""
+        driver_id = self._current_driver_id()
+        self.driver_id = driver_id
+        self._skipped_calibration_for = None
+        if driver_id is None:
+            return
+        
+        profile = self.profile_store.get(driver_id)
+        if profile is None:
+            self.status_label.text = f'Tài xế mới "{driver_id}"'
+            self.status_label.color = (1, 1, 0, 1)
+            self.detail_label.text = 'Nhấn "Hiệu chỉnh" để tạo hồ sơ ngưỡng riêng'
+            return
+        
+        self._apply_profile(profile)
+        self.status_label.text = f'Đã tải hồ sơ của "{driver_id}"'
+        self.status_label.color = (0.3, 0.8, 0.95, 1)
+        hint = '' if profile.is_fresh(self.profile_store.max_age) else '\nHồ sơ đã cũ - nên hiệu chỉnh lại'
+        self.detail_label.text = (f"Ngưỡng: EAR={profile.ear_threshold:.3f} | "
+                                  f"MAR={profile.mar_threshold:.3f}{hint}")
+        self.session_logger.log_event('profile_loaded', driver=driver_id, source=profile.source)
+
+    def _apply_profile(self, profile):
+        """Áp dụng ngưỡng trong hồ sơ cho detector"""
+        self.driver_id = profile.driver_id
+        self.camera_processor.set_thresholds(profile.ear_threshold, profile.mar_threshold)
+        # Ngưỡng người dùng tự đặt được giữ nguyên, các nguồn khác tiếp tục tự điều chỉnh
+        self.camera_processor.enable_background_calibration(profile.source != 'manual')
+
+    def _save_profile(self, ear_threshold, mar_threshold, source, baseline=None):
+        """Lưu ngưỡng vào hồ sơ của tài xế hiện tại (không làm gì nếu chưa nhập mã)"""
+        driver_id = self._current_driver_id()
+        if driver_id is None:
+            return
+        self.driver_id = driver_id
+        try:
+            self.profile_store.save(driver_id, ear_threshold, mar_threshold,
+                                    baseline=baseline, source=source)
+        except Exception as e:
+            print(f"Lỗi khi lưu hồ sơ tài xế: {e}")
+
+    def _save_background_thresholds(self):
+        """Lưu ngưỡng đã được hiệu chỉnh nền điều chỉnh trong phiên giám sát"""
+        calibrator = self.camera_processor.background_calibrator
+        if calibrator is None or not calibrator.epochs:
+            return
+        detector = self.camera_processor.drowsiness_detector
+        self._save_profile(detector.EAR_THRESHOLD, detector.MAR_THRESHOLD, source='background')
+
     def on_stop(self):
         """Cleanup khi đóng ứng dụng"""
         if self.alert_popup:
             self.alert_popup.dismiss()
-        if self.alarm_sound and self.alarm_sound.state == 'play':
-            self.alarm_sound.stop()
+        if self.is_monitoring:
+            self._save_background_thresholds()
+        self.profile_store.close()
+        self.alarm.close()
+        alarm_stats = self.alarm.get_stats()
+        self.camera_processor.session_logger = None
+        self.session_logger.log_event('app_stop', alarm=alarm_stats)
+        self.session_logger.close()
+        if alarm_stats['alarms']:
+            print(f"Độ trễ cảnh báo -> âm thanh ({alarm_stats['backend']}): "
+                  f"TB {alarm_stats['mean_ms']:.1f} ms, tối đa {alarm_stats['max_ms']:.1f} ms")
         self.camera_processor.release()
 
 
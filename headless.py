@@ -0,0 +1,192 @@
+"""
+Chế độ chạy không giao diện (headless) - không import Kivy
+Điều khiển CameraProcessor trực tiếp, in các lần chuyển mức cảnh báo
+và báo cáo thời gian khởi động đến frame phân tích đầu tiên
+
+Cách chạy:
+    python headless.py --camera 0
+    python main.py --headless
+"""
+
+import argparse
+import time
+
+from startup_report import StartupReport
+from alarm import AlarmController, create_backend
+from session_logger import SessionLogger
+from profile_store import ProfileStore
+
+
+def run(camera_index=0, duration=None, report=None, stats_interval=None,
+        record_path=None, record_full_mesh=False, max_faces=1, primary_policy='largest',
+        alarm_backend='auto', log_dir='logs', log_format='jsonl', adaptive=False,
+        driver_id=None, profile_path='profiles.db'):
+    """
+    Chạy giám sát không giao diện
+
+    Args:
+        camera_index: Index của camera hoặc đường dẫn file video
+        duration: Thời gian chạy tối đa (giây), None = chạy đến khi Ctrl+C
+        report: StartupReport dùng chung (None = tạo mới)
+        stats_interval: Chu kỳ in độ trễ từng giai đoạn (giây), None = không đo
+        record_path: File .dglm để ghi landmark (None = không ghi)
+        record_full_mesh: True = ghi toàn bộ lưới thay vì chỉ mắt/miệng
+        max_faces: Số khuôn mặt tối đa được theo dõi
+        primary_policy: Cách chọn tài xế chính khi có nhiều khuôn mặt
+        alarm_backend: Backend âm thanh cảnh báo (xem alarm.BACKENDS, 'auto' = tự chọn)
+        log_dir: Thư mục nhật ký phiên (None = không ghi)
+        log_format: 'jsonl' hoặc 'binary'
+        adaptive: True để hiệu chỉnh ngưỡng EAR/MAR nền theo tài xế
+        driver_id: Mã tài xế để tải/lưu hồ sơ ngưỡng (None = dùng ngưỡng mặc định)
+        profile_path: File SQLite chứa hồ sơ tài xế
+
+    Returns:
+        int: Mã thoát (0 = thành công)
+    """
+    report = report or StartupReport()
+
+    # Import từng thư viện nặng riêng để thấy chi phí của mỗi module
+    for module_name in ('numpy', 'cv2', 'mediapipe'):
+        report.import_module(module_name)
+    camera_processor = report.import_module('camera_processor')
+
+    processor = camera_processor.CameraProcessor(camera_index=camera_index, use_wall_clock=True,
+                                                 max_faces=max_faces,
+                                                 primary_policy=primary_policy)
+    profile_store = None
+    session_logger = None
+    alarm = None
+    recording = False
+    # Mọi tài nguyên được giải phóng trong finally, kể cả khi không mở được camera
+    try:
+        if driver_id:
+            profile_store = ProfileStore(profile_path)
+            profile = profile_store.get(driver_id)
+            if profile is not None:
+                processor.set_thresholds(profile.ear_threshold, profile.mar_threshold)
+                print(f"Đã tải hồ sơ {profile.driver_id}: EAR={profile.ear_threshold:.3f}, "
+                      f"MAR={profile.mar_threshold:.3f}")
+        if adaptive:
+            processor.enable_background_calibration()
+        if stats_interval:
+            processor.enable_instrumentation(window_seconds=stats_interval)
+        # Chạy thử Face Mesh và mở camera song song trên các luồng nền
+        processor.prepare_async(report)
+        with report.measure('Chuẩn bị mô hình + camera (song song)'):
+            started = processor.start()
+        if not started:
+            print("Lỗi: Không thể mở camera")
+            print(report.format())
+            return 1
+        if record_path:
+            processor.start_recording(record_path, full_mesh=record_full_mesh)
+            recording = True
+        if log_dir:
+            session_logger = SessionLogger(log_dir, fmt=log_format)
+            processor.session_logger = session_logger
+            session_logger.log_event('monitoring_start', mode='headless', camera=camera_index)
+        # Không có người xác nhận: chuông tự tắt khi hết cảnh báo
+        alarm = AlarmController(create_backend(alarm_backend), auto_stop=True)
+
+        first_frame = True
+        last_level = None
+        end_time = None if duration is None else time.monotonic() + duration
+        next_stats = time.monotonic() + stats_interval if stats_interval else None
+        try:
+            while end_time is None or time.monotonic() < end_time:
+                success, _, status = processor.process_frame()
+                if not success:
+                    if processor.source_ended:
+                        print("Đã hết file video")
+                        break
+                    continue
+
+                if first_frame:
+                    # CameraProcessor tự ghi mốc frame đầu tiên / phân tích đầu tiên vào report
+                    print(report.format())
+                    print(processor.format_startup())
+                    first_frame = False
+
+                alarm.notify(status)
+                if status['alert_level'] != last_level:
+                    print(f"[{time.strftime('%H:%M:%S')}] {status['alert_level']}: "
+                          f"{status['reason']}")
+                    last_level = status['alert_level']
+
+                if next_stats is not None and time.monotonic() >= next_stats:
+                    print(processor.stage_timer.format_summary())
+                    next_stats += stats_interval
+        except KeyboardInterrupt:
+            print("\nĐã dừng bởi người dùng")
+    finally:
+        alarm_stats = None
+        if alarm is not None:
+            alarm.close()
+            alarm_stats = alarm.get_stats()
+            if alarm_stats['alarms']:
+                print(f"Cảnh báo âm thanh ({alarm_stats['backend']}): {alarm_stats['alarms']} lần, "
+                      f"độ trễ TB {alarm_stats['mean_ms']:.1f} ms, "
+                      f"tối đa {alarm_stats['max_ms']:.1f} ms")
+        if session_logger is not None:
+            processor.session_logger = None
+            session_logger.log_event('monitoring_stop', alarm=alarm_stats)
+            session_logger.close()
+            log_stats = session_logger.get_stats()
+            print(f"Nhật ký: {log_stats['frames']} frame, {log_stats['events']} sự kiện, "
+                  f"bỏ {log_stats['dropped']} bản ghi ({log_dir})")
+        if recording:
+            print(f"Đã ghi {processor.stop_recording()} frame: {record_path}")
+        if profile_store is not None:
+            calibrator = processor.background_calibrator
+            if calibrator is not None and calibrator.epochs:
+                detector = processor.drowsiness_detector
+                profile_store.save(driver_id, detector.EAR_THRESHOLD, detector.MAR_THRESHOLD,
+                                   source='background')
+            profile_store.close()
+        processor.release()
+    return 0
+
+
+def main(argv=None):
+    """Hàm chính của chế độ headless"""
+    report = StartupReport()
+    parser = argparse.ArgumentParser(description='DrowsyGuard - chế độ không giao diện')
+    parser.add_argument('--camera', type=int, default=0, help='Index của camera')
+    parser.add_argument('--video', default=None,
+                        help='Đọc file video thay cho camera (phát theo FPS gốc)')
+    parser.add_argument('--duration', type=float, default=None,
+                        help='Thời gian chạy tối đa (giây)')
+    parser.add_argument('--stats-interval', type=float, default=None,
+                        help='In độ trễ từng giai đoạn mỗi N giây')
+    parser.add_argument('--record', default=None,
+                        help='Ghi landmark ra file .dglm (phát lại bằng landmark_recording.py)')
+    parser.add_argument('--full-mesh', action='store_true',
+                        help='Ghi toàn bộ 478 điểm thay vì chỉ mắt/miệng')
+    parser.add_argument('--max-faces', type=int, default=1,
+                        help='Số khuôn mặt tối đa (lớn hơn 1 khi có phụ xe)')
+    parser.add_argument('--primary', default='largest',
+                        choices=['largest', 'left', 'right', 'sticky'],
+                        help='Cách chọn tài xế chính khi có nhiều khuôn mặt')
+    parser.add_argument('--alarm', default='auto',
+                        choices=['auto', 'simpleaudio', 'sounddevice', 'silent'],
+                        help='Backend âm thanh cảnh báo')
+    parser.add_argument('--log-dir', default='logs', help='Thư mục nhật ký phiên')
+    parser.add_argument('--log-format', default='jsonl', choices=['jsonl', 'binary'],
+                        help='Định dạng nhật ký')
+    parser.add_argument('--no-log', action='store_true', help='Không ghi nhật ký phiên')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='Hiệu chỉnh ngưỡng EAR/MAR nền trong lúc giám sát')
+    parser.add_argument('--driver', default=None,
+                        help='Mã tài xế: tải ngưỡng đã lưu (và lưu ngưỡng hiệu chỉnh nền)')
+    parser.add_argument('--profiles', default='profiles.db', help='File hồ sơ tài xế')
+    args = parser.parse_args(argv)
+    if args.adaptive and args.max_faces > 1:
+        parser.error('--adaptive chỉ hỗ trợ một khuôn mặt (--max-faces 1)')
+    return run(args.camera if args.video is None else args.video, args.duration, report, args.stats_interval,
+               args.record, args.full_mesh, args.max_faces, args.primary, args.alarm,
+               None if args.no_log else args.log_dir, args.log_format, args.adaptive,
+               args.driver, args.profiles)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,228 @@
+"""
+Module ghi và phát lại landmark (không cần camera và Mediapipe)
+
+Định dạng file .dglm (nhị phân, little-endian, đọc được bằng np.memmap):
+    Header 32 byte: magic 'DGLM', version (uint16), flags (uint16),
+                    số điểm mỗi frame (uint32), width, height (uint16)
+    Sau đó là các bản ghi kích thước cố định, mỗi frame một bản ghi:
+        timestamp (float64, giây), face (uint8, 1 = có khuôn mặt),
+        points (float32, số điểm x 2, tọa độ pixel)
+    Số điểm = 20 (mắt + miệng theo FaceDetector.KEY_INDICES) hoặc 478 (toàn bộ lưới).
+
+Phát lại:
+    python landmark_recording.py session.dglm
+"""
+
+import argparse
+import os
+import struct
+import time
+
+import numpy as np
+
+from face_detector import FaceDetector
+from ear_calculator import EARCalculator
+from mar_calculator import MARCalculator
+from drowsiness_detector import TimedDrowsinessDetector
+
+
+MAGIC = b'DGLM'
+VERSION = 1
+FLAG_FULL_MESH = 0x1
+HEADER = struct.Struct('<4sHHIHH16x')
+
+NUM_KEY_POINTS = len(FaceDetector.KEY_INDICES)
+NUM_MESH_POINTS = 478
+
+
+def record_dtype(num_points):
+    """
+    Kiểu dữ liệu NumPy của một bản ghi (packed, không căn lề)
+
+    Args:
+        num_points: Số điểm landmark mỗi frame
+
+    Returns:
+        np.dtype: Kiểu bản ghi
+    """
+    return np.dtype([('timestamp', '<f8'), ('face', 'u1'), ('points', '<f4', (num_points, 2))])
+
+
+class LandmarkRecorder:
+    """
+    Ghi landmark từng frame ra file .dglm
+    """
+
+    def __init__(self, path, full_mesh=False, frame_size=(0, 0)):
+        """
+        Khởi tạo Landmark Recorder
+
+        Args:
+            path: Đường dẫn file ghi
+            full_mesh: True = ghi toàn bộ 478 điểm, False = chỉ 20 điểm mắt/miệng
+            frame_size: (width, height) của frame
+        """
+        self.path = path
+        self.full_mesh = full_mesh
+        self.num_points = NUM_MESH_POINTS if full_mesh else NUM_KEY_POINTS
+        self.frames = 0
+
+        # Bản ghi dùng lại cho mọi frame
+        self._record = np.zeros(1, dtype=record_dtype(self.num_points))
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION, FLAG_FULL_MESH if full_mesh else 0,
+                                     self.num_points, frame_size[0], frame_size[1]))
+
+    def write(self, timestamp, points):
+        """
+        Ghi một frame
+
+        Args:
+            timestamp: Thời điểm frame (giây)
+            points: Mảng shape (num_points, 2) hoặc None nếu không có khuôn mặt
+        """
+        record = self._record
+        record['timestamp'] = timestamp
+        if points is None:
+            record['face'] = 0
+            record['points'] = 0
+        else:
+            record['face'] = 1
+            record['points'][0] = points
+        self._file.write(record.tobytes())
+        self.frames += 1
+
+    def close(self):
+        """Đóng file ghi"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class LandmarkReplay:
+    """
+    Đọc file .dglm bằng memory map (không nạp toàn bộ file vào bộ nhớ)
+    """
+
+    def __init__(self, path):
+        """
+        Mở file ghi landmark
+
+        Args:
+            path: Đường dẫn file .dglm
+        """
+        with open(path, 'rb') as f:
+            magic, version, flags, num_points, width, height = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"File không đúng định dạng DGLM: {path}")
+        if version != VERSION:
+            raise ValueError(f"Phiên bản DGLM không hỗ trợ: {version}")
+
+        self.path = path
+        self.full_mesh = bool(flags & FLAG_FULL_MESH)
+        self.num_points = num_points
+        self.frame_size = (width, height)
+        dtype = record_dtype(num_points)
+        if os.path.getsize(path) - HEADER.size < dtype.itemsize:
+            # np.memmap không ánh xạ được vùng rỗng
+            self.records = np.zeros(0, dtype=dtype)
+        else:
+            self.records = np.memmap(path, dtype=dtype, mode='r', offset=HEADER.size)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def timestamps(self):
+        """Mảng thời điểm của các frame (giây)"""
+        return self.records['timestamp']
+
+    @property
+    def face_present(self):
+        """Mảng bool: frame có khuôn mặt"""
+        return self.records['face'].astype(bool)
+
+    @property
+    def key_points(self):
+        """Mảng shape (frames, 20, 2) landmark mắt/miệng theo FaceDetector.KEY_INDICES"""
+        points = self.records['points']
+        if self.full_mesh:
+            return points[:, FaceDetector.KEY_INDICES]
+        return points
+
+    def __iter__(self):
+        """Duyệt từng frame: (timestamp, face_present, key_points)"""
+        key_points = self.key_points
+        for record, points in zip(self.records, key_points):
+            yield float(record['timestamp']), bool(record['face']), points
+
+
+def replay_session(path, detector=None):
+    """
+    Chạy lại một phiên đã ghi qua EAR/MAR và DrowsinessDetector
+
+    EAR/MAR được tính vector hóa cho toàn bộ phiên, sau đó đưa lần lượt
+    vào detector theo thời điểm gốc của từng frame.
+
+    Args:
+        path: Đường dẫn file .dglm
+        detector: Detector cần đánh giá (None = TimedDrowsinessDetector mới)
+
+    Returns:
+        dict: {'frames', 'face_frames', 'duration', 'events', 'level_frames', 'elapsed'}
+    """
+    detector = detector or TimedDrowsinessDetector()
+    replay = LandmarkReplay(path)
+    start = time.perf_counter()
+
+    timestamps = np.asarray(replay.timestamps, dtype=np.float64)
+    faces = replay.face_present
+    key_points = np.asarray(replay.key_points, dtype=np.float32)
+    ears = EARCalculator.calculate_avg_ear_batch(key_points[:, FaceDetector.KEY_LEFT_EYE],
+                                                 key_points[:, FaceDetector.KEY_RIGHT_EYE])
+    mars = MARCalculator.calculate_mar_batch(key_points[:, FaceDetector.KEY_MOUTH])
+
+    events = []
+    level_frames = {}
+    last_level = None
+    update = detector.update
+    for i in np.flatnonzero(faces):
+        status = update(float(ears[i]), float(mars[i]), float(timestamps[i]))
+        level = status['alert_level']
+        level_frames[level] = level_frames.get(level, 0) + 1
+        if level != last_level:
+            events.append({'timestamp': float(timestamps[i]), 'from': last_level,
+                           'to': level, 'reason': status['reason']})
+            last_level = level
+
+    return {
+        'frames': len(replay),
+        'face_frames': int(np.count_nonzero(faces)),
+        'duration': float(timestamps[-1] - timestamps[0]) if len(replay) else 0.0,
+        'events': events,
+        'level_frames': level_frames,
+        'elapsed': time.perf_counter() - start,
+    }
+
+
+def main():
+    """Phát lại các file ghi và in tóm tắt"""
+    parser = argparse.ArgumentParser(description='DrowsyGuard - phát lại landmark đã ghi')
+    parser.add_argument('recordings', nargs='+', help='File .dglm')
+    parser.add_argument('--events', action='store_true', help='In tất cả sự kiện chuyển mức')
+    args = parser.parse_args()
+
+    for path in args.recordings:
+        result = replay_session(path)
+        speed = result['duration'] / result['elapsed'] if result['elapsed'] > 0 else 0.0
+        danger = sum(1 for event in result['events'] if event['to'] == 'DANGER')
+        print(f"{path}: {result['frames']} frame ({result['duration']:.0f}s), "
+              f"{danger} cảnh báo DANGER, xử lý {result['elapsed']:.2f}s (x{speed:.0f} thời gian thực)")
+        if args.events:
+            for event in result['events']:
+                print(f"  {event['timestamp']:10.2f}s  {event['from']} -> {event['to']}: "
+                      f"{event['reason']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+Module theo dõi landmark giữa các lần chạy Face Mesh
+Chỉ chạy Face Mesh mỗi N frame (N thay đổi theo chuyển động và mức cảnh báo),
+các frame ở giữa dùng optical flow Lucas-Kanade để dịch chuyển landmark mắt/miệng
+"""
+
+import cv2
+import numpy as np
+
+from face_detector import FaceDetector
+
+
+class LandmarkTracker:
+    """
+    Theo dõi các điểm landmark bằng pyramidal Lucas-Kanade optical flow
+    """
+
+    def __init__(self, win_size=(15, 15), max_level=2, max_fb_error=1.0):
+        """
+        Khởi tạo Landmark Tracker
+
+        Args:
+            win_size: Kích thước cửa sổ tìm kiếm của Lucas-Kanade
+            max_level: Số tầng pyramid
+            max_fb_error: Sai số forward-backward tối đa (pixel) để coi một điểm là tin cậy
+        """
+        self.lk_params = dict(
+            winSize=win_size,
+            maxLevel=max_level,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03)
+        )
+        self.max_fb_error = max_fb_error
+        self.prev_gray = None
+        self.points = None
+
+    @property
+    def has_points(self):
+        """True nếu đang có điểm để theo dõi"""
+        return self.points is not None
+
+    def reset(self, gray, points):
+        """
+        Đặt lại điểm theo dõi từ kết quả Face Mesh
+
+        Args:
+            gray: Frame ảnh xám hiện tại
+            points: Mảng shape (N, 2) tọa độ landmark
+        """
+        self.prev_gray = gray
+        self.points = np.asarray(points, dtype=np.float32).reshape(-1, 1, 2)
+
+    def clear(self):
+        """Xóa điểm theo dõi (khi mất khuôn mặt)"""
+        self.prev_gray = None
+        self.points = None
+
+    def track(self, gray):
+        """
+        Dịch chuyển các điểm từ frame trước sang frame hiện tại
+
+        Args:
+            gray: Frame ảnh xám hiện tại
+
+        Returns:
+            tuple: (points, confidence, motion)
+                points: Mảng shape (N, 2) tọa độ mới (None nếu không theo dõi được)
+                confidence: Tỉ lệ điểm theo dõi tin cậy (0-1)
+                motion: Độ dịch chuyển trung vị của các điểm (pixel)
+        """
+        if self.points is None:
+            return None, 0.0, 0.0
+
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(
+            self.prev_gray, gray, self.points, None, **self.lk_params)
+        if new_points is None:
+            self.clear()
+            return None, 0.0, 0.0
+
+        # Kiểm tra forward-backward: theo dõi ngược lại và so sánh với điểm ban đầu
+        back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(
+            gray, self.prev_gray, new_points, None, **self.lk_params)
+        fb_error = np.linalg.norm((back_points - self.points).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < self.max_fb_error)
+
+        confidence = float(np.count_nonzero(good)) / len(good)
+        motion = float(np.median(np.linalg.norm((new_points - self.points).reshape(-1, 2), axis=1)))
+
+        self.prev_gray = gray
+        self.points = new_points
+        return new_points.reshape(-1, 2), confidence, motion
+
+
+class AdaptiveInferenceScheduler:
+    """
+    Quyết định khi nào cần chạy Face Mesh đầy đủ
+
+    Khoảng cách giữa hai lần chạy (N, tính cả frame chạy Face Mesh: N = 1 nghĩa là
+    chạy mọi frame) giảm khi chuyển động lớn hoặc đang cảnh báo,
+    tăng dần khi khuôn mặt đứng yên. Độ tin cậy theo dõi thấp buộc chạy lại ngay.
+
+    Khoảng cách thích nghi không nhỏ hơn TRACK_MIN_INTERVAL để luôn còn frame theo
+    dõi (N chỉ tăng sau các frame theo dõi); N = MIN_INTERVAL chỉ áp dụng tạm thời
+    khi DANGER.
+    """
+
+    # Giới hạn khoảng cách giữa hai lần chạy Face Mesh (frame)
+    MIN_INTERVAL = 1
+    TRACK_MIN_INTERVAL = 2
+    MAX_INTERVAL = 5
+
+    # Tỉ lệ điểm theo dõi tin cậy tối thiểu
+    CONFIDENCE_THRESHOLD = 0.9
+
+    # Ngưỡng chuyển động (pixel/frame)
+    HIGH_MOTION = 3.0
+    LOW_MOTION = 0.8
+
+    # Khoảng cách tối đa theo mức cảnh báo (cần EAR chính xác khi nghi ngờ buồn ngủ)
+    ALERT_MAX_INTERVAL = {'WARNING': 2, 'DANGER': MIN_INTERVAL}
+
+    def __init__(self):
+        """Khởi tạo scheduler"""
+        self.interval = self.TRACK_MIN_INTERVAL
+        self.frames_since_inference = 0
+        self.force_inference = True
+
+    def reset(self):
+        """Chạy Face Mesh ở frame tiếp theo và đặt lại khoảng cách"""
+        self.interval = self.TRACK_MIN_INTERVAL
+        self.frames_since_inference = 0
+        self.force_inference = True
+
+    def should_run_inference(self, alert_level='SAFE'):
+        """
+        Kiểm tra frame hiện tại có cần chạy Face Mesh không
+
+        Args:
+            alert_level: Mức cảnh báo hiện tại (WARNING/DANGER giới hạn khoảng cách ngay
+                         ở frame này, không chờ lần theo dõi sau)
+
+        Returns:
+            bool: True nếu cần chạy Face Mesh đầy đủ
+        """
+        if self.force_inference:
+            return True
+        interval = self.interval
+        alert_cap = self.ALERT_MAX_INTERVAL.get(alert_level)
+        if alert_cap is not None:
+            interval = min(interval, alert_cap)
+        # frames_since_inference chỉ đếm các frame đã theo dõi; frame hiện tại là frame thứ +1
+        return self.frames_since_inference + 1 >= interval
+
+    def on_inference(self, face_detected):
+        """
+        Ghi nhận một lần chạy Face Mesh
+
+        Args:
+            face_detected: True nếu Face Mesh tìm thấy khuôn mặt
+        """
+        self.frames_since_inference = 0
+        # Không có khuôn mặt thì không có gì để theo dõi
+        self.force_inference = not face_detected
+        if not face_detected:
+            self.interval = self.TRACK_MIN_INTERVAL
+
+    def on_tracked(self, confidence, motion, alert_level='SAFE'):
+        """
+        Ghi nhận kết quả theo dõi và điều chỉnh khoảng cách N
+
+        Args:
+            confidence: Độ tin cậy theo dõi (0-1)
+            motion: Độ dịch chuyển trung vị (pixel)
+            alert_level: Mức cảnh báo hiện tại
+        """
+        self.frames_since_inference += 1
+
+        if confidence < self.CONFIDENCE_THRESHOLD:
+            self.force_inference = True
+            self.interval = self.TRACK_MIN_INTERVAL
+            return
+
+        if motion > self.HIGH_MOTION:
+            self.interval = max(self.TRACK_MIN_INTERVAL, self.interval // 2)
+        elif motion < self.LOW_MOTION:
+            self.interval = min(self.MAX_INTERVAL, self.interval + 1)
+
+        # Giới hạn theo cảnh báo (DANGER được giới hạn tiếp trong should_run_inference)
+        alert_cap = self.ALERT_MAX_INTERVAL.get(alert_level)
+        if alert_cap is not None:
+            self.interval = max(self.TRACK_MIN_INTERVAL, min(self.interval, alert_cap))
+
+
+class AdaptiveLandmarkDetector:
+    """
+    Lấy landmark mắt/miệng: Face Mesh khi scheduler yêu cầu, optical flow ở giữa
+    """
+
+    def __init__(self, face_detector, scheduler=None, tracker=None):
+        """
+        Khởi tạo Adaptive Landmark Detector
+
+        Args:
+            face_detector: FaceDetector dùng cho các lần chạy đầy đủ
+            scheduler: AdaptiveInferenceScheduler (None = tạo mới)
+            tracker: LandmarkTracker (None = tạo mới)
+        """
+        self.face_detector = face_detector
+        self.scheduler = scheduler or AdaptiveInferenceScheduler()
+        self.tracker = tracker or LandmarkTracker()
+        self.inference_frames = 0
+        self.tracked_frames = 0
+
+    def reset(self):
+        """Đặt lại trạng thái theo dõi"""
+        self.scheduler.reset()
+        self.tracker.clear()
+
+    def detect_key_points(self, frame, alert_level='SAFE'):
+        """
+        Lấy landmark chính (theo FaceDetector.KEY_INDICES) cho frame
+
+        Args:
+            frame: Frame ảnh BGR
+            alert_level: Mức cảnh báo hiện tại (ảnh hưởng tần suất chạy Face Mesh)
+
+        Returns:
+            tuple: (face_detected, key_points) giống
+                   FaceDetector.detect_face_array(frame, FaceDetector.KEY_INDICES)
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        if not self.scheduler.should_run_inference(alert_level) and self.tracker.has_points:
+            points, confidence, motion = self.tracker.track(gray)
+            self.scheduler.on_tracked(confidence, motion, alert_level)
+            if points is not None and confidence >= self.scheduler.CONFIDENCE_THRESHOLD:
+                self.tracked_frames += 1
+                return True, points
+
+        # Chạy Face Mesh đầy đủ (theo lịch hoặc do theo dõi không tin cậy)
+        face_detected, key_points = self.face_detector.detect_face_array(
+            frame, FaceDetector.KEY_INDICES)
+        self.inference_frames += 1
+        self.scheduler.on_inference(face_detected)
+        if face_detected:
+            self.tracker.reset(gray, key_points)
+        else:
+            self.tracker.clear()
+        return face_detected, key_points
+
+    def get_stats(self):
+        """
+        Lấy thống kê số frame chạy Face Mesh và số frame dùng optical flow
+
+        Returns:
+            dict: {'inference_frames', 'tracked_frames', 'interval'}
+        """
+        return {
+            'inference_frames': self.inference_frames,
+            'tracked_frames': self.tracked_frames,
+            'interval': self.scheduler.interval,
+        }
@@ -1,7 +1,7 @@
 """
 DrowsyGuard - Ứng dụng phát hiện buồn ngủ khi lái xe
 Phiên bản: 2.0 (Modular)
-Yêu cầu: Python 3.8+, Kivy, OpenCV, Mediapipe, SciPy
+Yêu cầu: Python 3.8+, Kivy, OpenCV, Mediapipe, NumPy
 
 Mô tả: 
     Ứng dụng sử dụng camera để phát hiện dấu hiệu buồn ngủ thông qua:
@@ -14,18 +14,44 @@ Cấu trúc module:
     - ear_calculator.py: Tính chỉ số EAR
     - mar_calculator.py: Tính chỉ số MAR
     - drowsiness_detector.py: Thuật toán phát hiện buồn ngủ
+    - landmark_tracker.py: Lập lịch Face Mesh + theo dõi landmark bằng optical flow
+    - landmark_recording.py: Ghi/phát lại landmark (.dglm) không cần camera
+    - multi_stream.py: Phân tích nhiều camera với nhóm worker Face Mesh dùng chung
+    - face_tracker.py: Theo dõi nhiều khuôn mặt và chọn tài xế chính
+    - alarm.py: Chuông cảnh báo trên luồng riêng, âm thanh giải mã sẵn
+    - session_logger.py: Nhật ký phiên ghi nền theo lô, xoay vòng file
+    - calibration.py: Hiệu chỉnh ngưỡng EAR/MAR theo tài xế (thống kê dạng dòng)
+    - profile_store.py: Lưu hồ sơ ngưỡng theo mã tài xế (SQLite)
+    - camera_capture.py: Đọc camera độ trễ thấp (luồng riêng, chỉ giữ frame mới nhất)
+    - perclos.py: PERCLOS (tỉ lệ mắt nhắm) trên cửa sổ thời gian trượt
     - camera_processor.py: Xử lý video từ camera
     - gui.py: Giao diện người dùng
     - main.py: File khởi chạy ứng dụng
+    - batch_analyze.py: Phân tích offline video đã ghi (đa tiến trình)
+    - headless.py: Chạy không giao diện (không cần Kivy)
+    - startup_report.py: Đo thời gian khởi động
+
+Chạy không giao diện:
+    python main.py --headless [--camera 0] [--duration 60]
 """
 
-from gui import DrowsyGuardApp
+import sys
 
 
 def main():
     """Hàm chính để chạy ứng dụng"""
     
+    # Chế độ không giao diện: không import Kivy
+    if '--headless' in sys.argv[1:]:
+        import headless
+        
+        argv = [arg for arg in sys.argv[1:] if arg != '--headless']
+        return headless.main(argv)
+    
     try:
+        # Import giao diện khi cần (Kivy khởi tạo cửa sổ ngay khi import)
+        from gui import DrowsyGuardApp
+        
         app = DrowsyGuardApp()
         app.run()
     except KeyboardInterrupt:
@@ -40,4 +66,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -2,7 +2,7 @@
 Module tính toán Mouth Aspect Ratio (MAR) để phát hiện ngáp
 """
 
-from scipy.spatial import distance
+import numpy as np
 
 
 class MARCalculator:
@@ -42,33 +42,37 @@ class MARCalculator:
         if len(mouth_landmarks) < 8:
             return 0.0
         
-        # Lấy các điểm landmarks (thứ tự: [78, 308, 13, 14, 81, 178, 311, 402])
-        left_corner = mouth_landmarks[0]      # 78 (Góc trong trái miệng)
-        right_corner = mouth_landmarks[1]     # 308 (Góc trong phải miệng)
-        
-        top_mid = mouth_landmarks[2]          # 13 (Đỉnh môi trên giữa)
-        bottom_mid = mouth_landmarks[3]       # 14 (Đáy môi dưới giữa)
+        mouth = np.asarray(mouth_landmarks, dtype=np.float64)
+        return float(MARCalculator.calculate_mar_batch(mouth[np.newaxis, :8])[0])
+    
+    @staticmethod
+    def calculate_mar_batch(mouth_landmarks):
+        """
+        Tính MAR cho nhiều frame cùng lúc (vector hóa bằng NumPy)
         
-        top_left = mouth_landmarks[4]         # 81 (Điểm phụ trên trái)
-        bottom_left = mouth_landmarks[5]      # 178 (Điểm phụ dưới trái - đối xứng với 81)
+        Args:
+            mouth_landmarks: Mảng shape (frames, 8, 2) tọa độ 8 điểm miệng mỗi frame
+                            (cùng thứ tự điểm như calculate_mar)
         
-        top_right = mouth_landmarks[6]        # 311 (Điểm phụ trên phải)
-        bottom_right = mouth_landmarks[7]     # 402 (Điểm phụ dưới phải - đối xứng với 311)
+        Returns:
+            np.ndarray: Mảng shape (frames,) giá trị MAR (0.0 khi độ rộng miệng ~ 0)
+        """
+        mouth = np.asarray(mouth_landmarks, dtype=np.float64)
         
-        # Tính khoảng cách dọc (vertical) - độ mở miệng
-        A = distance.euclidean(top_mid, bottom_mid)          # Giữa miệng
-        B = distance.euclidean(top_left, bottom_left)        # Bên trái
-        C = distance.euclidean(top_right, bottom_right)      # Bên phải
+        # Các cặp điểm (thứ tự: [78, 308, 13, 14, 81, 178, 311, 402]):
+        # giữa (13-14), trái (81-178), phải (311-402), ngang (78-308)
+        diffs = mouth[:, [2, 4, 6, 0]] - mouth[:, [3, 5, 7, 1]]
+        dists = np.sqrt(np.einsum('fpk,fpk->fp', diffs, diffs))
         
-        # Tính khoảng cách ngang (horizontal) - độ rộng miệng
-        D = distance.euclidean(left_corner, right_corner)    # Góc trái đến góc phải
+        vertical = dists[:, 0] + dists[:, 1] + dists[:, 2]  # Độ mở miệng
+        width = dists[:, 3]                                 # Độ rộng miệng
         
         # Tránh chia cho 0
-        if D < 0.01:
-            return 0.0
+        valid = width >= 0.01
+        mar = np.zeros(len(mouth), dtype=np.float64)
         
         # Công thức MAR chuẩn
-        mar = (A + B + C) / (3.0 * D)
+        mar[valid] = vertical[valid] / (3.0 * width[valid])
         return mar
     
     @staticmethod
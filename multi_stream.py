@@ -0,0 +1,489 @@
+"""
+Module phân tích nhiều camera trong một tiến trình
+Mỗi luồng (camera hoặc file video) có luồng đọc và DrowsinessDetector riêng,
+còn Face Mesh chạy trên một nhóm worker cố định dùng chung cho mọi luồng.
+
+Lập lịch: mỗi luồng có hạn xử lý frame kế tiếp theo FPS mục tiêu; worker rảnh
+luôn chọn luồng có hạn sớm nhất (earliest deadline first) nên không luồng nào
+bị bỏ đói khi tổng tải vượt khả năng của các worker.
+
+Cách chạy:
+    python multi_stream.py 0 1 --workers 2 --fps 15
+    python multi_stream.py cab1.mp4 cab2.mp4 cab3.mp4 --workers 2 --duration 60
+    python multi_stream.py cab1.mp4 cab2.mp4 --fast     (file chạy nhanh nhất có thể)
+"""
+
+import argparse
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from camera_capture import configure_capture
+from face_detector import FaceDetector
+from ear_calculator import EARCalculator
+from mar_calculator import MARCalculator
+from drowsiness_detector import TimedDrowsinessDetector, NO_FACE_STATUS
+
+
+class StreamSource:
+    """
+    Một luồng video: đọc frame trên luồng riêng, giữ frame mới nhất
+    và trạng thái buồn ngủ của riêng luồng đó
+    """
+
+    # Số mẫu độ trễ giữ lại để tính thống kê
+    LAG_SAMPLES = 300
+
+    def __init__(self, stream_id, source, target_fps=15.0, realtime=True):
+        """
+        Khởi tạo Stream Source
+
+        Args:
+            stream_id: Tên luồng
+            source: Index camera (int) hoặc đường dẫn file video
+            target_fps: Số frame tối đa được phân tích mỗi giây (None = không giới hạn)
+            realtime: Với file video - True để đọc theo FPS gốc như camera (bỏ frame
+                      khi phân tích không kịp), False để phân tích mọi frame nhanh nhất có thể
+        """
+        self.stream_id = stream_id
+        self.source = source
+        self.is_file = isinstance(source, str)
+        self.realtime = realtime or not self.is_file
+        self.target_fps = target_fps
+        self.interval = 1.0 / target_fps if target_fps else 0.0
+        self.detector = TimedDrowsinessDetector()
+
+        self.capture = None
+        self.thread = None
+        self.finished = False
+
+        # Frame mới nhất chờ phân tích: (frame, timestamp, thời điểm đọc)
+        self.pending = None
+        self.busy = False
+        self.next_due = 0.0
+
+        self.status = None
+        self.frames_read = 0
+        self.frames_analyzed = 0
+        self.frames_skipped = 0  # Frame bị ghi đè trước khi được phân tích
+        self.lags = deque(maxlen=self.LAG_SAMPLES)
+
+    def open(self):
+        """
+        Mở camera/file
+
+        Returns:
+            bool: True nếu mở thành công
+        """
+        self.capture = cv2.VideoCapture(self.source)
+        if not self.capture.isOpened():
+            return False
+        if not self.is_file:
+            # Luồng đọc tự giữ frame mới nhất: driver chỉ cần giữ 1 frame
+            configure_capture(self.capture, fourcc='MJPG', buffer_size=1)
+        return True
+
+    def close(self):
+        """Giải phóng camera/file"""
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+    def get_stats(self, elapsed):
+        """
+        Thống kê của luồng
+
+        Args:
+            elapsed: Thời gian chạy của engine (giây)
+
+        Returns:
+            dict: Số frame, FPS phân tích và độ trễ (ms) từ lúc đọc đến lúc có kết quả
+        """
+        lags = sorted(self.lags)
+        return {
+            'source': self.source,
+            'frames_read': self.frames_read,
+            'frames_analyzed': self.frames_analyzed,
+            'frames_skipped': self.frames_skipped,
+            'analyzed_fps': self.frames_analyzed / elapsed if elapsed > 0 else 0.0,
+            'lag_mean_ms': sum(lags) / len(lags) * 1000 if lags else 0.0,
+            'lag_p95_ms': lags[int(0.95 * (len(lags) - 1))] * 1000 if lags else 0.0,
+            'alert_level': self.status['alert_level'] if self.status else None,
+            'finished': self.finished,
+        }
+
+
+class MultiStreamEngine:
+    """
+    Class phân tích nhiều luồng video với nhóm worker Face Mesh dùng chung
+    """
+
+    def __init__(self, num_workers=2, inference_size=None):
+        """
+        Khởi tạo Multi Stream Engine
+
+        Args:
+            num_workers: Số worker Face Mesh (mỗi worker một mô hình)
+            inference_size: Cạnh dài tối đa của ảnh đưa vào Face Mesh (None = nguyên frame)
+        """
+        self.num_workers = num_workers
+        self.inference_size = inference_size
+        self.streams = []
+        self.on_status = None  # Callback(stream, status) gọi trên luồng worker
+
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._workers = []
+        self._start_time = None
+        self._stop_time = None
+
+    def add_stream(self, source, stream_id=None, target_fps=15.0, realtime=True):
+        """
+        Thêm một luồng video (trước khi start)
+
+        Args:
+            source: Index camera (int) hoặc đường dẫn file video
+            stream_id: Tên luồng (None = tự đặt theo thứ tự)
+            target_fps: FPS phân tích mục tiêu (None = không giới hạn)
+            realtime: Xem StreamSource
+
+        Returns:
+            StreamSource: Luồng vừa thêm
+        """
+        stream = StreamSource(stream_id or f"stream{len(self.streams)}", source,
+                              target_fps, realtime)
+        self.streams.append(stream)
+        return stream
+
+    def start(self):
+        """
+        Mở các nguồn và khởi động luồng đọc + worker
+
+        Returns:
+            bool: True nếu mở được ít nhất một nguồn
+        """
+        opened = [stream for stream in self.streams if stream.open()]
+        for stream in self.streams:
+            if stream not in opened:
+                print(f"Không mở được nguồn {stream.source} ({stream.stream_id})")
+                stream.finished = True
+        if not opened:
+            return False
+
+        self._stop_event.clear()
+        self._start_time = time.monotonic()
+        self._stop_time = None
+        for stream in opened:
+            stream.next_due = self._start_time
+            stream.thread = threading.Thread(target=self._capture_loop, args=(stream,),
+                                             name=f"DrowsyGuard-{stream.stream_id}", daemon=True)
+            stream.thread.start()
+
+        # Face Mesh ở chế độ ảnh tĩnh: một worker xen kẽ frame của nhiều camera
+        # nên không thể dùng trạng thái tracking giữa các frame
+        self._workers = []
+        for index in range(self.num_workers):
+            detector = FaceDetector(static_image_mode=True, inference_size=self.inference_size)
+            worker = threading.Thread(target=self._worker_loop, args=(detector,),
+                                      name=f"DrowsyGuard-worker{index}", daemon=True)
+            self._workers.append(worker)
+            worker.start()
+        return True
+
+    def stop(self):
+        """Dừng tất cả luồng và giải phóng nguồn"""
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        for stream in self.streams:
+            if stream.thread is not None:
+                stream.thread.join(timeout=2.0)
+                stream.thread = None
+        for worker in self._workers:
+            worker.join(timeout=2.0)
+        self._workers = []
+        for stream in self.streams:
+            stream.close()
+        if self._start_time is not None and self._stop_time is None:
+            self._stop_time = time.monotonic()
+
+    def wait(self, timeout=None):
+        """
+        Chờ đến khi mọi luồng kết thúc (chỉ xảy ra khi tất cả là file video)
+
+        Args:
+            timeout: Thời gian chờ tối đa (giây), None = chờ mãi
+
+        Returns:
+            bool: True nếu tất cả luồng đã kết thúc
+        """
+        end_time = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while not all(stream.finished for stream in self.streams):
+                remaining = None if end_time is None else end_time - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining if remaining is not None else 0.5)
+        return True
+
+    # ------------------------------------------------------------------
+    # Đọc frame
+    # ------------------------------------------------------------------
+
+    def _capture_loop(self, stream):
+        """Luồng đọc của một nguồn: luôn giữ frame mới nhất trong stream.pending"""
+        capture = stream.capture
+        video_fps = (capture.get(cv2.CAP_PROP_FPS) or 30.0) if stream.is_file else 0.0
+        start = time.monotonic()
+        while not self._stop_event.is_set():
+            # File chạy nhanh: chờ frame trước được lấy để không bỏ frame nào
+            if not stream.realtime:
+                with self._condition:
+                    while stream.pending is not None and not self._stop_event.is_set():
+                        self._condition.wait(0.1)
+
+            ret, frame = capture.read()
+            now = time.monotonic()
+            if not ret:
+                if stream.is_file:
+                    break
+                self._stop_event.wait(0.01)
+                continue
+
+            if stream.is_file:
+                # Thời gian theo video để ngưỡng giây của detector đúng với nội dung
+                timestamp = stream.frames_read / video_fps
+                if stream.realtime:
+                    delay = start + timestamp - now
+                    if delay > 0 and self._stop_event.wait(delay):
+                        break
+                    now = time.monotonic()
+            else:
+                timestamp = now
+
+            with self._condition:
+                if stream.pending is not None:
+                    stream.frames_skipped += 1
+                stream.pending = (frame, timestamp, now)
+                stream.frames_read += 1
+                self._condition.notify_all()
+
+        with self._condition:
+            # Frame cuối còn chờ vẫn được phân tích, sau đó luồng mới kết thúc
+            while (stream.pending is not None or stream.busy) and not self._stop_event.is_set():
+                self._condition.wait(0.1)
+            stream.finished = True
+            self._condition.notify_all()
+
+    # ------------------------------------------------------------------
+    # Lập lịch và phân tích
+    # ------------------------------------------------------------------
+
+    def _pick_stream(self, now):
+        """
+        Chọn luồng có hạn sớm nhất trong các luồng có frame chờ và không bận
+
+        Returns:
+            tuple: (stream, wait) - stream được chọn (hoặc None) và thời gian nên chờ
+        """
+        chosen = None
+        wait = 0.5
+        for stream in self.streams:
+            if stream.pending is None or stream.busy:
+                continue
+            if stream.next_due > now:
+                wait = min(wait, stream.next_due - now)
+                continue
+            if chosen is None or stream.next_due < chosen.next_due:
+                chosen = stream
+        return chosen, wait
+
+    def _warm_up_size(self):
+        """Kích thước frame dùng để chạy thử Face Mesh (frame của nguồn đầu tiên đã mở)"""
+        for stream in self.streams:
+            capture = stream.capture
+            if capture is not None:
+                width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+                height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                if width and height:
+                    return width, height
+        return 640, 480
+
+    def _worker_loop(self, face_detector):
+        """Worker: lấy frame của luồng đến hạn sớm nhất, chạy Face Mesh và cập nhật detector"""
+        # Khởi tạo graph Face Mesh trong lúc các luồng đọc đang mở nguồn
+        face_detector.warm_up(frame_size=self._warm_up_size())
+        condition = self._condition
+        while not self._stop_event.is_set():
+            with condition:
+                stream, wait = self._pick_stream(time.monotonic())
+                if stream is None:
+                    condition.wait(wait)
+                    continue
+                frame, timestamp, read_time = stream.pending
+                stream.pending = None
+                stream.busy = True
+                # Hạn kế tiếp theo FPS mục tiêu; không dồn bù khi đã trễ hơn một chu kỳ
+                stream.next_due = max(stream.next_due + stream.interval,
+                                      time.monotonic() - stream.interval)
+                condition.notify_all()
+
+            try:
+                status = self._analyze(face_detector, stream, frame, timestamp)
+            except Exception as e:
+                print(f"Lỗi khi phân tích {stream.stream_id}: {e}")
+                status = None
+            if status is not None:
+                # Detector ghi đè đối tượng trạng thái ở frame sau: giao bản sao ra ngoài
+                status = status.copy()
+
+            with condition:
+                stream.busy = False
+                if status is not None:
+                    stream.status = status
+                    stream.frames_analyzed += 1
+                    stream.lags.append(time.monotonic() - read_time)
+                condition.notify_all()
+
+            if status is not None and self.on_status is not None:
+                self.on_status(stream, status)
+
+    @staticmethod
+    def _analyze(face_detector, stream, frame, timestamp):
+        """
+        Phân tích một frame của luồng
+
+        Chỉ một worker xử lý một luồng tại một thời điểm (cờ busy) nên
+        detector của luồng được cập nhật tuần tự theo thứ tự frame.
+        """
+        face_detected, key_points = face_detector.detect_face_array(
+            frame, FaceDetector.KEY_INDICES)
+        if not face_detected:
+            return NO_FACE_STATUS
+
+        landmarks = FaceDetector.split_key_landmarks(key_points)
+        ear_value = EARCalculator.calculate_avg_ear(landmarks['left_eye'], landmarks['right_eye'])
+        mar_value = MARCalculator.calculate_mar(landmarks['mouth'])
+        return stream.detector.update(ear_value, mar_value, timestamp)
+
+    # ------------------------------------------------------------------
+    # Thống kê
+    # ------------------------------------------------------------------
+
+    def get_status(self, stream_id):
+        """
+        Lấy trạng thái mới nhất của một luồng
+
+        Returns:
+            DrowsinessStatus: Bản sao trạng thái mới nhất hoặc None
+        """
+        for stream in self.streams:
+            if stream.stream_id == stream_id:
+                with self._condition:
+                    return stream.status
+        return None
+
+    def get_stats(self):
+        """
+        Thống kê toàn bộ engine
+
+        Returns:
+            dict: {'elapsed', 'workers', 'frames_analyzed', 'throughput_fps', 'streams'}
+        """
+        if self._start_time is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self._stop_time or time.monotonic()) - self._start_time
+        with self._condition:
+            streams = {stream.stream_id: stream.get_stats(elapsed) for stream in self.streams}
+        analyzed = sum(stats['frames_analyzed'] for stats in streams.values())
+        return {
+            'elapsed': elapsed,
+            'workers': self.num_workers,
+            'frames_analyzed': analyzed,
+            'throughput_fps': analyzed / elapsed if elapsed > 0 else 0.0,
+            'streams': streams,
+        }
+
+    def format_stats(self):
+        """
+        Tạo bảng thống kê dạng văn bản
+
+        Returns:
+            str: Thông lượng tổng và FPS/độ trễ từng luồng
+        """
+        stats = self.get_stats()
+        lines = [f"Tổng: {stats['frames_analyzed']} frame trong {stats['elapsed']:.1f}s = "
+                 f"{stats['throughput_fps']:.1f} FPS ({stats['workers']} worker)",
+                 f"{'Luồng':<12}{'FPS':>7}{'Đã đọc':>9}{'Bỏ qua':>9}"
+                 f"{'Trễ TB (ms)':>13}{'Trễ p95 (ms)':>14}  Mức"]
+        for stream_id, s in stats['streams'].items():
+            lines.append(f"{stream_id:<12}{s['analyzed_fps']:>7.1f}{s['frames_read']:>9}"
+                         f"{s['frames_skipped']:>9}{s['lag_mean_ms']:>13.1f}"
+                         f"{s['lag_p95_ms']:>14.1f}  {s['alert_level']}")
+        return "\n".join(lines)
+
+
+def _parse_source(value):
+    """Chuỗi số -> index camera, còn lại là đường dẫn file"""
+    return int(value) if value.isdigit() else value
+
+
+def main():
+    """Hàm chính: chạy nhiều luồng và in thống kê định kỳ"""
+    parser = argparse.ArgumentParser(description='DrowsyGuard - phân tích nhiều camera')
+    parser.add_argument('sources', nargs='+', help='Index camera hoặc file video')
+    parser.add_argument('--workers', type=int, default=2, help='Số worker Face Mesh')
+    parser.add_argument('--fps', type=float, default=15.0,
+                        help='FPS phân tích mục tiêu mỗi luồng (0 = không giới hạn)')
+    parser.add_argument('--inference-size', type=int, default=None,
+                        help='Cạnh dài tối đa của ảnh đưa vào Face Mesh')
+    parser.add_argument('--fast', action='store_true',
+                        help='File video: phân tích mọi frame nhanh nhất có thể')
+    parser.add_argument('--duration', type=float, default=None, help='Thời gian chạy tối đa (giây)')
+    parser.add_argument('--stats-interval', type=float, default=5.0,
+                        help='In thống kê mỗi N giây')
+    args = parser.parse_args()
+
+    engine = MultiStreamEngine(args.workers, args.inference_size)
+    for source in args.sources:
+        source = _parse_source(source)
+        # --fast: file video không bị giới hạn bởi --fps (camera vẫn giữ FPS mục tiêu)
+        fast = args.fast and isinstance(source, str)
+        engine.add_stream(source, target_fps=None if fast else args.fps or None,
+                          realtime=not args.fast)
+
+    levels = {}
+
+    def on_status(stream, status):
+        if levels.get(stream.stream_id) != status['alert_level']:
+            levels[stream.stream_id] = status['alert_level']
+            print(f"[{time.strftime('%H:%M:%S')}] {stream.stream_id} "
+                  f"{status['alert_level']}: {status['reason']}")
+
+    engine.on_status = on_status
+    if not engine.start():
+        print("Lỗi: Không mở được nguồn nào")
+        return 1
+
+    end_time = None if args.duration is None else time.monotonic() + args.duration
+    try:
+        while end_time is None or time.monotonic() < end_time:
+            timeout = args.stats_interval
+            if end_time is not None:
+                timeout = min(timeout, max(0.0, end_time - time.monotonic()))
+            if engine.wait(timeout):
+                break
+            print(engine.format_stats())
+    except KeyboardInterrupt:
+        print("\nĐã dừng bởi người dùng")
+    finally:
+        engine.stop()
+    print(engine.format_stats())
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,127 @@
+"""
+Module mô tả overlay hiển thị (HUD)
+Tạo mô tả có cấu trúc của chữ, thanh điểm và viền landmark cho mỗi frame.
+Giao diện vẽ mô tả này bằng canvas Kivy; rasterize_overlay() vẽ bằng cv2
+khi cần xuất video có overlay.
+
+Quy ước: tọa độ theo pixel của frame, gốc ở góc trên trái, màu dạng BGR (như OpenCV).
+"""
+
+import cv2
+import numpy as np
+
+from drowsiness_detector import DrowsinessDetector
+
+
+# Màu (BGR)
+COLOR_DANGER = (0, 0, 255)
+COLOR_WARNING = (0, 165, 255)
+COLOR_SAFE = (0, 255, 0)
+COLOR_WHITE = (255, 255, 255)
+COLOR_YAWN = (255, 255, 0)
+COLOR_NO_FACE = (0, 255, 255)
+COLOR_EYE = (0, 255, 0)
+COLOR_MOUTH = (255, 0, 0)
+
+
+def _text(text, pos, color, scale, thickness):
+    """Tạo mô tả một dòng chữ (pos là điểm baseline bên trái, như cv2.putText)"""
+    return {'text': text, 'pos': pos, 'color': color, 'scale': scale, 'thickness': thickness}
+
+
+def build_overlay(status, landmarks, frame_size, mirror=False,
+                  score_threshold=DrowsinessDetector.DROWSINESS_SCORE_THRESHOLD):
+    """
+    Tạo mô tả overlay cho một frame
+
+    Args:
+        status: Dictionary trạng thái (từ DrowsinessDetector hoặc trạng thái NO_FACE)
+        landmarks: Dictionary {'left_eye', 'right_eye', 'mouth'} hoặc None
+        frame_size: (width, height) của frame
+        mirror: True nếu frame chưa được lật gương - phần hiển thị cần lật
+                tọa độ x của viền landmark khi hiển thị dạng gương
+        score_threshold: Ngưỡng điểm buồn ngủ ứng với thanh đầy 100%
+
+    Returns:
+        dict: {'frame_size', 'mirror', 'texts', 'bars', 'polylines'}
+    """
+    w, h = frame_size
+    overlay = {'frame_size': (w, h), 'mirror': mirror,
+               'texts': [], 'bars': [], 'polylines': []}
+    texts = overlay['texts']
+
+    if status is None or status['alert_level'] == 'NO_FACE':
+        texts.append(_text("Khong phat hien khuon mat", (10, 30), COLOR_NO_FACE, 0.7, 2))
+        return overlay
+
+    # Viền mắt và miệng
+    if landmarks is not None:
+        for key, color in (('left_eye', COLOR_EYE), ('right_eye', COLOR_EYE),
+                           ('mouth', COLOR_MOUTH)):
+            overlay['polylines'].append({'points': landmarks[key], 'color': color, 'closed': True})
+
+    # Màu sắc theo mức độ cảnh báo
+    if status['alert_level'] == 'DANGER':
+        color = COLOR_DANGER
+        text = f"CANH BAO: {status['reason']}"
+    elif status['alert_level'] == 'WARNING':
+        color = COLOR_WARNING
+        text = f"CHU Y: {status['reason']}"
+    else:
+        color = COLOR_SAFE
+        text = status['reason']
+    texts.append(_text(text, (10, 30), color, 0.7, 2))
+
+    # Thông tin EAR, MAR, số lần ngáp
+    texts.append(_text(f"EAR: {status['ear']:.2f}", (w - 150, 30), COLOR_WHITE, 0.6, 2))
+    texts.append(_text(f"MAR: {status['mar']:.2f}", (w - 150, 60), COLOR_WHITE, 0.6, 2))
+    if status['total_yawns'] > 0:
+        texts.append(_text(f"Ngap: {status['total_yawns']}", (w - 150, 90), COLOR_YAWN, 0.6, 2))
+
+    # Thanh điểm buồn ngủ
+    score_percentage = min(100, (status['drowsiness_score'] / score_threshold) * 100)
+    if score_percentage >= 100:
+        bar_color = COLOR_DANGER
+    elif score_percentage >= 50:
+        bar_color = COLOR_WARNING
+    else:
+        bar_color = COLOR_SAFE
+    overlay['bars'].append({'rect': (20, h - 40, w - 20, h - 20),
+                            'value': score_percentage / 100.0,
+                            'color': bar_color, 'border_color': COLOR_WHITE})
+    texts.append(_text(f"Buon ngu: {int(score_percentage)}%", (25, h - 45), COLOR_WHITE, 0.5, 1))
+
+    # Cảnh báo lớn nếu ở mức DANGER
+    if status['alert_level'] == 'DANGER':
+        texts.append(_text(">>> BUON NGU! <<<", (10, 70), COLOR_DANGER, 1, 3))
+
+    return overlay
+
+
+def rasterize_overlay(frame, overlay):
+    """
+    Vẽ overlay trực tiếp lên frame bằng cv2 (dùng khi xuất video)
+
+    Args:
+        frame: Frame ảnh BGR (bị vẽ đè)
+        overlay: Mô tả overlay từ build_overlay()
+
+    Returns:
+        frame: Frame đã vẽ overlay
+    """
+    # Vẽ theo đúng tọa độ của frame (cờ 'mirror' chỉ dành cho phần hiển thị)
+    for line in overlay['polylines']:
+        points = np.asarray(line['points'], dtype=np.int32)
+        cv2.polylines(frame, [points], line['closed'], line['color'], 1)
+
+    for bar in overlay['bars']:
+        x0, y0, x1, y1 = bar['rect']
+        fill_x = x0 + int((x1 - x0) * bar['value'])
+        cv2.rectangle(frame, (x0, y0), (fill_x, y1), bar['color'], -1)
+        cv2.rectangle(frame, (x0, y0), (x1, y1), bar['border_color'], 2)
+
+    for item in overlay['texts']:
+        cv2.putText(frame, item['text'], item['pos'], cv2.FONT_HERSHEY_SIMPLEX,
+                    item['scale'], item['color'], item['thickness'])
+
+    return frame
@@ -0,0 +1,153 @@
+"""
+Module tính PERCLOS (tỉ lệ thời gian mắt nhắm trong một cửa sổ thời gian)
+Mỗi cửa sổ là một ring buffer NumPy cố định theo ô thời gian (mặc định 1 giây/ô)
+kèm tổng chạy của thời gian mắt nhắm và thời gian quan sát: mỗi frame chỉ cộng
+vào ô hiện tại, ô cũ rời khỏi cửa sổ được trừ khỏi tổng. Chi phí mỗi lần cập nhật
+không phụ thuộc độ dài cửa sổ (60 giây hay 5 phút như nhau).
+
+Thời gian lưu dạng số nguyên micro giây nên tổng chạy không bị trôi sai số
+dấu phẩy động sau nhiều giờ chạy.
+"""
+
+import numpy as np
+
+
+class PerclosWindow:
+    """
+    Một cửa sổ PERCLOS: ring buffer theo ô thời gian + tổng chạy
+    """
+
+    def __init__(self, window_seconds, bin_seconds=1.0):
+        """
+        Khởi tạo cửa sổ PERCLOS
+
+        Args:
+            window_seconds: Độ dài cửa sổ (giây)
+            bin_seconds: Độ dài mỗi ô thời gian (giây), cũng là độ mịn của mép cửa sổ
+        """
+        self.window_seconds = window_seconds
+        self.bin_seconds = bin_seconds
+        self.num_bins = max(1, int(round(window_seconds / bin_seconds)))
+        self.closed = np.zeros(self.num_bins, dtype=np.int64)    # micro giây mắt nhắm mỗi ô
+        self.observed = np.zeros(self.num_bins, dtype=np.int64)  # micro giây quan sát mỗi ô
+        self.reset()
+
+    def reset(self):
+        """Xóa toàn bộ dữ liệu trong cửa sổ"""
+        self.closed.fill(0)
+        self.observed.fill(0)
+        self.closed_sum = 0
+        self.observed_sum = 0
+        self._head = None  # Số thứ tự (tuyệt đối) của ô hiện tại
+
+    def add(self, bin_index, closed_us, observed_us):
+        """
+        Cộng thời gian vào ô bin_index, đẩy các ô cũ ra khỏi cửa sổ
+
+        Args:
+            bin_index: Số thứ tự tuyệt đối của ô (floor(thời điểm / bin_seconds))
+            closed_us: Thời gian mắt nhắm (micro giây)
+            observed_us: Thời gian quan sát (micro giây)
+        """
+        head = self._head
+        if head is None:
+            self._head = bin_index
+        elif bin_index > head:
+            steps = bin_index - head
+            if steps >= self.num_bins:
+                # Khoảng trống dài hơn cả cửa sổ: mọi ô đều đã cũ
+                self.closed.fill(0)
+                self.observed.fill(0)
+                self.closed_sum = 0
+                self.observed_sum = 0
+            else:
+                for index in range(head + 1, bin_index + 1):
+                    slot = index % self.num_bins
+                    self.closed_sum -= int(self.closed[slot])
+                    self.observed_sum -= int(self.observed[slot])
+                    self.closed[slot] = 0
+                    self.observed[slot] = 0
+            self._head = bin_index
+        # Thời gian lùi (không xảy ra với time.monotonic()): cộng vào ô hiện tại
+
+        slot = self._head % self.num_bins
+        self.closed[slot] += closed_us
+        self.observed[slot] += observed_us
+        self.closed_sum += closed_us
+        self.observed_sum += observed_us
+
+    @property
+    def value(self):
+        """PERCLOS (0..1) trên thời gian đã quan sát trong cửa sổ"""
+        return self.closed_sum / self.observed_sum if self.observed_sum else 0.0
+
+    @property
+    def coverage(self):
+        """Tỉ lệ thời gian của cửa sổ đã có dữ liệu (0..1)"""
+        return min(1.0, self.observed_sum / (self.window_seconds * 1e6))
+
+
+class PerclosMonitor:
+    """
+    Class tính PERCLOS trên nhiều cửa sổ thời gian cùng lúc
+    """
+
+    DEFAULT_WINDOWS = (60.0, 300.0)
+
+    def __init__(self, windows=DEFAULT_WINDOWS, bin_seconds=1.0, min_coverage=0.5):
+        """
+        Khởi tạo PERCLOS Monitor
+
+        Args:
+            windows: Độ dài các cửa sổ (giây), từ ngắn đến dài
+            bin_seconds: Độ dài mỗi ô thời gian (giây)
+            min_coverage: Tỉ lệ cửa sổ tối thiểu phải có dữ liệu trước khi
+                          giá trị được dùng để cảnh báo
+        """
+        self.bin_seconds = bin_seconds
+        self.min_coverage = min_coverage
+        self.windows = [PerclosWindow(seconds, bin_seconds) for seconds in windows]
+
+    def reset(self):
+        """Xóa dữ liệu của mọi cửa sổ"""
+        for window in self.windows:
+            window.reset()
+
+    def update(self, eyes_closed, dt, timestamp):
+        """
+        Ghi nhận một frame
+
+        Args:
+            eyes_closed: True nếu mắt nhắm ở frame này
+            dt: Thời gian frame đại diện (giây, khoảng cách tới frame trước)
+            timestamp: Thời điểm frame (giây, đơn điệu tăng)
+        """
+        if dt <= 0:
+            return
+        observed_us = int(dt * 1e6)
+        closed_us = observed_us if eyes_closed else 0
+        bin_index = int(timestamp // self.bin_seconds)
+        for window in self.windows:
+            window.add(bin_index, closed_us, observed_us)
+
+    def values(self):
+        """
+        PERCLOS của từng cửa sổ
+
+        Returns:
+            list: Giá trị (0..1) theo thứ tự cửa sổ
+        """
+        return [window.value for window in self.windows]
+
+    def max_ready_value(self):
+        """
+        PERCLOS lớn nhất trong các cửa sổ đã đủ dữ liệu
+
+        Returns:
+            float: Giá trị (0..1), 0 nếu chưa cửa sổ nào đủ dữ liệu
+        """
+        best = 0.0
+        for window in self.windows:
+            if window.coverage >= self.min_coverage:
+                best = max(best, window.value)
+        return best
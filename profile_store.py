@@ -0,0 +1,235 @@
+"""
+Module lưu hồ sơ hiệu chỉnh theo tài xế
+Mỗi tài xế (mã tài xế) có một hồ sơ gồm ngưỡng EAR/MAR, thống kê nền lúc hiệu
+chỉnh (CalibrationEngine.summary) và thời điểm hiệu chỉnh, lưu trong file SQLite
+cục bộ. Tra cứu theo khóa chính (chỉ mục B-tree) và được giữ lại trong bộ nhớ
+nên lần tải sau không chạm đĩa.
+
+Xem nhanh các hồ sơ:
+    python profile_store.py [profiles.db]
+"""
+
+import json
+import sqlite3
+import sys
+import threading
+import time
+
+
+class DriverProfile:
+    """
+    Hồ sơ hiệu chỉnh của một tài xế
+    """
+
+    __slots__ = ('driver_id', 'ear_threshold', 'mar_threshold', 'baseline', 'source',
+                 'calibrated_at', 'updated_at')
+
+    def __init__(self, driver_id, ear_threshold, mar_threshold, baseline=None, source='guided',
+                 calibrated_at=None, updated_at=None):
+        """
+        Args:
+            driver_id: Mã tài xế
+            ear_threshold: Ngưỡng EAR mắt nhắm
+            mar_threshold: Ngưỡng MAR ngáp
+            baseline: Thống kê nền lúc hiệu chỉnh (dictionary, None = không có)
+            source: Nguồn ngưỡng ('guided', 'background', 'manual', 'default')
+            calibrated_at: Thời điểm hiệu chỉnh có hướng dẫn gần nhất (Unix time)
+            updated_at: Thời điểm cập nhật ngưỡng gần nhất (Unix time)
+        """
+        self.driver_id = driver_id
+        self.ear_threshold = ear_threshold
+        self.mar_threshold = mar_threshold
+        self.baseline = baseline
+        self.source = source
+        self.calibrated_at = calibrated_at
+        self.updated_at = updated_at
+
+    def age(self, now=None):
+        """Số giây kể từ lần hiệu chỉnh gần nhất (None nếu chưa từng hiệu chỉnh)"""
+        if self.calibrated_at is None:
+            return None
+        return (time.time() if now is None else now) - self.calibrated_at
+
+    def is_fresh(self, max_age, now=None):
+        """
+        Kiểm tra hồ sơ còn dùng được mà không cần hiệu chỉnh lại
+
+        Args:
+            max_age: Tuổi tối đa của lần hiệu chỉnh (giây)
+            now: Thời điểm hiện tại (Unix time), None = bây giờ
+
+        Returns:
+            bool: True nếu đã hiệu chỉnh trong vòng max_age giây
+        """
+        age = self.age(now)
+        return age is not None and age <= max_age
+
+    def __repr__(self):
+        return (f"DriverProfile({self.driver_id!r}, ear={self.ear_threshold:.3f}, "
+                f"mar={self.mar_threshold:.3f}, source={self.source!r})")
+
+
+class ProfileStore:
+    """
+    Class lưu/tải hồ sơ hiệu chỉnh theo tài xế (SQLite + bộ nhớ đệm)
+    """
+
+    # Hồ sơ hiệu chỉnh quá 30 ngày thì nên hiệu chỉnh lại
+    DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS profiles ("
+        " driver_id TEXT PRIMARY KEY,"
+        " ear_threshold REAL NOT NULL,"
+        " mar_threshold REAL NOT NULL,"
+        " baseline TEXT,"
+        " source TEXT NOT NULL,"
+        " calibrated_at REAL,"
+        " updated_at REAL NOT NULL"
+        ") WITHOUT ROWID"
+    )
+    COLUMNS = DriverProfile.__slots__
+
+    def __init__(self, path='profiles.db', max_age=DEFAULT_MAX_AGE):
+        """
+        Mở (hoặc tạo) kho hồ sơ
+
+        Args:
+            path: Đường dẫn file SQLite (':memory:' = không lưu ra đĩa)
+            max_age: Tuổi tối đa (giây) để hồ sơ được coi là còn mới
+        """
+        self.path = path
+        self.max_age = max_age
+        # Kết nối dùng chung cho các luồng, được bảo vệ bởi khóa
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(self.SCHEMA)
+        self._cache = {}
+
+    @staticmethod
+    def normalize_id(driver_id):
+        """Chuẩn hóa mã tài xế (bỏ khoảng trắng, không phân biệt hoa thường)"""
+        return driver_id.strip().lower()
+
+    def get(self, driver_id):
+        """
+        Tải hồ sơ của tài xế
+
+        Args:
+            driver_id: Mã tài xế
+
+        Returns:
+            DriverProfile: Hồ sơ hoặc None nếu chưa có
+        """
+        driver_id = self.normalize_id(driver_id)
+        profile = self._cache.get(driver_id)
+        if profile is not None:
+            return profile
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM profiles WHERE driver_id = ?",
+                (driver_id,)).fetchone()
+        if row is None:
+            return None
+        profile = self._from_row(row)
+        self._cache[driver_id] = profile
+        return profile
+
+    def get_fresh(self, driver_id):
+        """
+        Tải hồ sơ nếu còn mới (không cần hiệu chỉnh lại)
+
+        Returns:
+            DriverProfile: Hồ sơ hoặc None nếu chưa có/đã cũ
+        """
+        profile = self.get(driver_id)
+        if profile is None or not profile.is_fresh(self.max_age):
+            return None
+        return profile
+
+    def save(self, driver_id, ear_threshold, mar_threshold, baseline=None, source='guided'):
+        """
+        Lưu ngưỡng của tài xế
+
+        Hiệu chỉnh có hướng dẫn ('guided') ghi lại thống kê nền và thời điểm
+        hiệu chỉnh; các nguồn khác chỉ cập nhật ngưỡng, giữ nguyên thống kê nền
+        và thời điểm hiệu chỉnh trước đó.
+
+        Args:
+            driver_id: Mã tài xế
+            ear_threshold: Ngưỡng EAR
+            mar_threshold: Ngưỡng MAR
+            baseline: Thống kê nền (chỉ dùng khi source='guided')
+            source: Nguồn ngưỡng
+
+        Returns:
+            DriverProfile: Hồ sơ đã lưu
+        """
+        driver_id = self.normalize_id(driver_id)
+        now = time.time()
+        previous = self.get(driver_id)
+        if source == 'guided' or previous is None:
+            calibrated_at = now if source == 'guided' else None
+        else:
+            baseline = previous.baseline
+            calibrated_at = previous.calibrated_at
+        profile = DriverProfile(driver_id, float(ear_threshold), float(mar_threshold),
+                                baseline, source, calibrated_at, now)
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO profiles ({', '.join(self.COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                self._to_row(profile))
+        self._cache[driver_id] = profile
+        return profile
+
+    def delete(self, driver_id):
+        """Xóa hồ sơ của tài xế"""
+        driver_id = self.normalize_id(driver_id)
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM profiles WHERE driver_id = ?", (driver_id,))
+        self._cache.pop(driver_id, None)
+
+    def list_profiles(self):
+        """
+        Liệt kê toàn bộ hồ sơ (đồng thời nạp vào bộ nhớ đệm)
+
+        Returns:
+            list: [DriverProfile] theo thứ tự mã tài xế
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM profiles ORDER BY driver_id").fetchall()
+        profiles = [self._from_row(row) for row in rows]
+        for profile in profiles:
+            self._cache[profile.driver_id] = profile
+        return profiles
+
+    def close(self):
+        """Đóng kết nối cơ sở dữ liệu"""
+        with self._lock:
+            self._connection.close()
+
+    @staticmethod
+    def _to_row(profile):
+        baseline = json.dumps(profile.baseline) if profile.baseline is not None else None
+        return (profile.driver_id, profile.ear_threshold, profile.mar_threshold, baseline,
+                profile.source, profile.calibrated_at, profile.updated_at)
+
+    @staticmethod
+    def _from_row(row):
+        driver_id, ear, mar, baseline, source, calibrated_at, updated_at = row
+        return DriverProfile(driver_id, ear, mar, json.loads(baseline) if baseline else None,
+                             source, calibrated_at, updated_at)
+
+
+if __name__ == '__main__':
+    store = ProfileStore(sys.argv[1] if len(sys.argv) > 1 else 'profiles.db')
+    for item in store.list_profiles():
+        calibrated = (time.strftime('%Y-%m-%d %H:%M', time.localtime(item.calibrated_at))
+                      if item.calibrated_at else '-')
+        print(f"{item.driver_id:<20} EAR={item.ear_threshold:.3f} MAR={item.mar_threshold:.3f} "
+              f"nguồn={item.source:<10} hiệu chỉnh={calibrated}")
+    store.close()
@@ -0,0 +1,338 @@
+"""
+Module ghi nhật ký phiên giám sát
+Nhận chỉ số từng frame và các sự kiện (chuyển mức cảnh báo, xác nhận, hiệu chỉnh...)
+qua hàng đợi không khóa có giới hạn; luồng nền gom thành lô và ghi nối tiếp vào
+các file xoay vòng. Vòng lặp xử lý frame không bao giờ chờ ghi đĩa: khi hàng đợi
+đầy (đĩa/thẻ nhớ quá chậm) bản ghi cũ nhất bị bỏ và được đếm.
+
+Định dạng:
+    jsonl  - mỗi dòng một bản ghi JSON
+    binary - header 'DGSL' + version, sau đó các bản ghi:
+             frame: struct '<BdffffBB' (loại=1, thời gian, ear, mar, điểm, PERCLOS, mức, cờ)
+                    (version 1 không có PERCLOS: '<BdfffBB')
+             sự kiện: struct '<BdH' (loại=2, thời gian, độ dài) + JSON UTF-8
+    (thời gian là Unix time, giây)
+
+Đọc file binary:
+    python session_logger.py logs/session-20240101-080000-000.dglog
+"""
+
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from collections import deque
+
+
+# Mã mức cảnh báo trong bản ghi binary
+LEVEL_CODES = {'SAFE': 0, 'WARNING': 1, 'DANGER': 2, 'NO_FACE': 3}
+LEVEL_NAMES = {code: name for name, code in LEVEL_CODES.items()}
+
+BINARY_MAGIC = b'DGSL'
+BINARY_VERSION = 2
+BINARY_HEADER = struct.Struct('<4sH')
+FRAME_RECORD = struct.Struct('<BdffffBB')
+FRAME_RECORD_V1 = struct.Struct('<BdfffBB')
+EVENT_RECORD = struct.Struct('<BdH')
+RECORD_FRAME = 1
+RECORD_EVENT = 2
+
+FLAG_DROWSY = 0x1
+FLAG_ALERT_ACTIVE = 0x2
+
+
+class SessionLogger:
+    """
+    Class ghi nhật ký phiên bất đồng bộ theo lô, xoay vòng file
+    """
+
+    EXTENSIONS = {'jsonl': '.jsonl', 'binary': '.dglog'}
+
+    def __init__(self, directory='logs', fmt='jsonl', max_file_bytes=10 * 1024 * 1024,
+                 max_files=20, queue_size=8192, flush_interval=0.5, frame_every=1):
+        """
+        Khởi tạo Session Logger
+
+        Args:
+            directory: Thư mục chứa file nhật ký
+            fmt: 'jsonl' hoặc 'binary'
+            max_file_bytes: Kích thước tối đa mỗi file trước khi chuyển file mới
+            max_files: Số file tối đa giữ lại (xóa file cũ nhất)
+            queue_size: Số bản ghi tối đa chờ ghi (giới hạn bộ nhớ)
+            flush_interval: Chu kỳ ghi lô (giây)
+            frame_every: Chỉ ghi chỉ số của 1 trong N frame (sự kiện luôn được ghi)
+        """
+        if fmt not in self.EXTENSIONS:
+            raise ValueError(f"Định dạng nhật ký không hợp lệ: {fmt}")
+        self.directory = directory
+        self.fmt = fmt
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.flush_interval = flush_interval
+        self.frame_every = max(1, int(frame_every))
+
+        # deque.append/popleft là thao tác nguyên tử: luồng xử lý frame chỉ thêm,
+        # luồng ghi chỉ lấy ra, không cần khóa
+        self.queue_size = queue_size
+        self._queue = deque(maxlen=queue_size)
+
+        # Đổi thời điểm time.monotonic() của frame sang Unix time
+        self._wall_offset = time.time() - time.monotonic()
+
+        self._frame_counter = 0
+        self._last_level = None
+        self.stats = {
+            'frames': 0,
+            'events': 0,
+            'dropped': 0,
+            'batches': 0,
+            'bytes_written': 0,
+            'files': 0,
+            'max_batch_ms': 0.0,
+        }
+
+        self._file = None
+        self._file_bytes = 0
+        self._file_index = 0
+        self._session_name = time.strftime('session-%Y%m%d-%H%M%S')
+
+        self._wake = threading.Event()
+        self._stopped = False
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._writer_loop, name='DrowsyGuard-logger',
+                                         daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Ghi từ vòng lặp xử lý frame (không chặn)
+    # ------------------------------------------------------------------
+
+    def _put(self, record):
+        """Thêm bản ghi vào hàng đợi (bỏ bản ghi cũ nhất khi đầy)"""
+        queue = self._queue
+        if len(queue) >= self.queue_size:
+            self.stats['dropped'] += 1
+        queue.append(record)
+
+    def _wall_time(self, timestamp):
+        """Thời điểm frame (time.monotonic()) -> Unix time; None = bây giờ"""
+        return time.time() if timestamp is None else timestamp + self._wall_offset
+
+    def log_frame(self, status, timestamp=None):
+        """
+        Ghi chỉ số một frame
+
+        Chỉ sao chép các giá trị cần thiết (trạng thái của detector được dùng lại
+        ở frame sau nên không giữ tham chiếu).
+
+        Args:
+            status: Trạng thái từ DrowsinessDetector
+            timestamp: Thời điểm frame (time.monotonic()), None = bây giờ
+        """
+        self._frame_counter += 1
+        if self._frame_counter % self.frame_every:
+            return
+        flags = (FLAG_DROWSY if status['drowsy'] else 0) | \
+                (FLAG_ALERT_ACTIVE if status['alert_active'] else 0)
+        self._put((RECORD_FRAME, self._wall_time(timestamp), float(status['ear']),
+                   float(status['mar']), float(status['drowsiness_score']),
+                   float(status['perclos']), LEVEL_CODES.get(status['alert_level'], 0), flags))
+
+    def log_event(self, kind, timestamp=None, **fields):
+        """
+        Ghi một sự kiện
+
+        Args:
+            kind: Loại sự kiện (ví dụ 'alert', 'alert_ack', 'calibration')
+            timestamp: Thời điểm (time.monotonic()), None = bây giờ
+            **fields: Thông tin kèm theo (giá trị ghi được ra JSON)
+        """
+        fields['event'] = kind
+        self._put((RECORD_EVENT, self._wall_time(timestamp), fields))
+
+    def log_status(self, status, timestamp=None):
+        """
+        Ghi chỉ số frame và sự kiện khi mức cảnh báo thay đổi
+
+        Args:
+            status: Trạng thái từ DrowsinessDetector
+            timestamp: Thời điểm frame (time.monotonic())
+        """
+        self.log_frame(status, timestamp)
+        level = status['alert_level']
+        if level != self._last_level:
+            self.log_event('alert', timestamp, level=level, previous=self._last_level,
+                           reason=status['reason'], score=round(float(status['drowsiness_score']), 2))
+            self._last_level = level
+
+    # ------------------------------------------------------------------
+    # Luồng ghi
+    # ------------------------------------------------------------------
+
+    def _writer_loop(self):
+        """Luồng nền: định kỳ lấy hết hàng đợi, ghi một lần cho cả lô"""
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            stopping = self._stopped
+            try:
+                self._write_batch()
+            except OSError as e:
+                print(f"Lỗi khi ghi nhật ký: {e}")
+            if stopping:
+                break
+        self._close_file()
+
+    def _write_batch(self):
+        """Ghi các bản ghi đang chờ"""
+        queue = self._queue
+        if not queue:
+            return
+        start = time.perf_counter()
+        encode = self._encode_jsonl if self.fmt == 'jsonl' else self._encode_binary
+        chunks = []
+        frames = events = 0
+        while queue:
+            try:
+                record = queue.popleft()
+            except IndexError:
+                break
+            chunks.append(encode(record))
+            if record[0] == RECORD_FRAME:
+                frames += 1
+            else:
+                events += 1
+
+        data = b''.join(chunks)
+        if self._file is None or self._file_bytes + len(data) > self.max_file_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self._file_bytes += len(data)
+
+        stats = self.stats
+        stats['frames'] += frames
+        stats['events'] += events
+        stats['batches'] += 1
+        stats['bytes_written'] += len(data)
+        stats['max_batch_ms'] = max(stats['max_batch_ms'], (time.perf_counter() - start) * 1000)
+
+    @staticmethod
+    def _encode_jsonl(record):
+        """Mã hóa một bản ghi thành một dòng JSON"""
+        if record[0] == RECORD_FRAME:
+            _, wall, ear, mar, score, perclos, level, flags = record
+            data = {'t': round(wall, 3), 'ear': round(ear, 4), 'mar': round(mar, 4),
+                    'score': round(score, 2), 'perclos': round(perclos, 4),
+                    'level': LEVEL_NAMES[level],
+                    'drowsy': bool(flags & FLAG_DROWSY),
+                    'alert_active': bool(flags & FLAG_ALERT_ACTIVE)}
+        else:
+            _, wall, fields = record
+            data = dict(fields, t=round(wall, 3))
+        return (json.dumps(data, ensure_ascii=False) + '\n').encode('utf-8')
+
+    @staticmethod
+    def _encode_binary(record):
+        """Mã hóa một bản ghi dạng binary"""
+        if record[0] == RECORD_FRAME:
+            return FRAME_RECORD.pack(*record)
+        _, wall, fields = record
+        payload = json.dumps(fields, ensure_ascii=False).encode('utf-8')[:0xFFFF]
+        return EVENT_RECORD.pack(RECORD_EVENT, wall, len(payload)) + payload
+
+    def _rotate(self):
+        """Đóng file hiện tại, mở file mới và xóa file cũ vượt quá max_files"""
+        self._close_file()
+        name = f"{self._session_name}-{self._file_index:03d}{self.EXTENSIONS[self.fmt]}"
+        self._file_index += 1
+        self._file = open(os.path.join(self.directory, name), 'ab')
+        self._file_bytes = 0
+        if self.fmt == 'binary':
+            header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION)
+            self._file.write(header)
+            self._file_bytes = len(header)
+        self.stats['files'] += 1
+
+        # Tên file bắt đầu bằng thời điểm nên sắp xếp theo tên = theo thời gian
+        extension = self.EXTENSIONS[self.fmt]
+        logs = sorted(f for f in os.listdir(self.directory)
+                      if f.startswith('session-') and f.endswith(extension))
+        for old in logs[:max(0, len(logs) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except OSError:
+                pass
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def flush(self):
+        """Yêu cầu luồng ghi ghi ngay (không chờ)"""
+        self._wake.set()
+
+    def close(self):
+        """Ghi nốt các bản ghi còn lại và dừng luồng ghi"""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout=5.0)
+
+    def get_stats(self):
+        """
+        Thống kê nhật ký
+
+        Returns:
+            dict: Số bản ghi đã ghi, bị bỏ, số byte, số file, thời gian ghi lô lâu nhất
+                  và số bản ghi đang chờ
+        """
+        stats = dict(self.stats)
+        stats['pending'] = len(self._queue)
+        return stats
+
+
+def read_binary_log(path):
+    """
+    Đọc file nhật ký binary
+
+    Args:
+        path: Đường dẫn file .dglog
+
+    Yields:
+        dict: Bản ghi giống định dạng jsonl
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version = BINARY_HEADER.unpack_from(data, 0)
+    if magic != BINARY_MAGIC or version not in (1, BINARY_VERSION):
+        raise ValueError(f"File không đúng định dạng nhật ký DGSL: {path}")
+    frame_record = FRAME_RECORD if version == BINARY_VERSION else FRAME_RECORD_V1
+    offset = BINARY_HEADER.size
+    while offset < len(data):
+        kind = data[offset]
+        if kind == RECORD_FRAME:
+            record = frame_record.unpack_from(data, offset)
+            offset += frame_record.size
+            if version == 1:
+                # Bản ghi cũ không có PERCLOS
+                record = record[:5] + (0.0,) + record[5:]
+            yield json.loads(SessionLogger._encode_jsonl(record))
+        elif kind == RECORD_EVENT:
+            _, wall, length = EVENT_RECORD.unpack_from(data, offset)
+            offset += EVENT_RECORD.size
+            fields = json.loads(data[offset:offset + length].decode('utf-8'))
+            offset += length
+            yield dict(fields, t=round(wall, 3))
+        else:
+            raise ValueError(f"Bản ghi không hợp lệ tại byte {offset}")
+
+
+if __name__ == '__main__':
+    for log_path in sys.argv[1:]:
+        for entry in read_binary_log(log_path):
+            print(json.dumps(entry, ensure_ascii=False))
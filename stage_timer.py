@@ -0,0 +1,184 @@
+"""
+Module đo độ trễ từng giai đoạn xử lý frame
+Ghi thời gian đọc camera, chuyển màu, Face Mesh, trích xuất landmark, EAR/MAR,
+cập nhật trạng thái và vẽ overlay vào histogram cuộn (chi phí thấp)
+"""
+
+import bisect
+import time
+
+
+class StageTimer:
+    """
+    Class đo thời gian theo giai đoạn với histogram cuộn
+
+    Mỗi giai đoạn có histogram với các bucket chia theo thang log (0.01 ms - 2 s).
+    Histogram cuộn theo hai cửa sổ thời gian (hiện tại + trước đó) nên thống kê
+    phản ánh khoảng window_seconds đến 2 * window_seconds gần nhất.
+    Cách dùng trong luồng phân tích:
+        timer.start_frame()
+        ... timer.mark('inference') ...
+        timer.end_frame()
+    Các luồng khác chỉ dùng record() (ví dụ luồng đọc camera).
+    """
+
+    enabled = True
+
+    # Biên các bucket (nano giây): 0.01 ms * 1.25^k
+    BUCKET_EDGES_NS = [int(10_000 * 1.25 ** k) for k in range(55)]
+
+    # Thứ tự hiển thị các giai đoạn
+    STAGE_ORDER = ['capture', 'preprocess', 'color_convert', 'inference', 'landmark_extract',
+                   'tracking', 'face_tracking', 'ear_mar', 'detector_update', 'overlay', 'total',
+                   'ui_update']
+
+    def __init__(self, window_seconds=10.0):
+        """
+        Khởi tạo Stage Timer
+
+        Args:
+            window_seconds: Độ dài mỗi cửa sổ histogram (giây)
+        """
+        self.window_ns = int(window_seconds * 1e9)
+        self._frame_start = 0
+        self._last_mark = 0
+        self._current = {}
+        self._previous = {}
+        self._window_start = time.perf_counter_ns()
+
+    def _new_histogram(self):
+        """Tạo histogram rỗng: [số mẫu theo bucket, tổng thời gian, số mẫu]"""
+        return [[0] * (len(self.BUCKET_EDGES_NS) + 1), 0, 0]
+
+    def record(self, stage, duration_ns):
+        """
+        Ghi một mẫu thời gian cho giai đoạn
+
+        Args:
+            stage: Tên giai đoạn
+            duration_ns: Thời gian (nano giây)
+        """
+        histogram = self._current.get(stage)
+        if histogram is None:
+            histogram = self._current[stage] = self._new_histogram()
+        histogram[0][bisect.bisect_left(self.BUCKET_EDGES_NS, duration_ns)] += 1
+        histogram[1] += duration_ns
+        histogram[2] += 1
+
+    def start_frame(self):
+        """Bắt đầu đo một frame"""
+        now = time.perf_counter_ns()
+        if now - self._window_start >= self.window_ns:
+            # Cuộn cửa sổ: bỏ dữ liệu cũ nhất
+            self._previous = self._current
+            self._current = {}
+            self._window_start = now
+        self._frame_start = now
+        self._last_mark = now
+
+    def mark(self, stage):
+        """
+        Kết thúc giai đoạn stage (thời gian tính từ mốc trước đó trong frame)
+
+        Args:
+            stage: Tên giai đoạn vừa hoàn thành
+        """
+        now = time.perf_counter_ns()
+        self.record(stage, now - self._last_mark)
+        self._last_mark = now
+
+    def end_frame(self):
+        """Kết thúc frame, ghi tổng thời gian xử lý"""
+        self.record('total', time.perf_counter_ns() - self._frame_start)
+
+    def _percentile_ms(self, counts, total, fraction):
+        """Ước lượng phân vị từ histogram (biên trên của bucket chứa phân vị)"""
+        target = fraction * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            cumulative += count
+            if cumulative >= target and count:
+                edges = self.BUCKET_EDGES_NS
+                return edges[min(index, len(edges) - 1)] / 1e6
+        return 0.0
+
+    def summary(self):
+        """
+        Tổng hợp thống kê của các giai đoạn
+
+        Returns:
+            dict: {giai đoạn: {'count', 'mean_ms', 'p50_ms', 'p99_ms'}}
+        """
+        result = {}
+        for stage in set(self._current) | set(self._previous):
+            merged = self._new_histogram()
+            for window in (self._previous, self._current):
+                histogram = window.get(stage)
+                if histogram is None:
+                    continue
+                merged[0] = [a + b for a, b in zip(merged[0], histogram[0])]
+                merged[1] += histogram[1]
+                merged[2] += histogram[2]
+            counts, total_ns, count = merged
+            if count == 0:
+                continue
+            result[stage] = {
+                'count': count,
+                'mean_ms': total_ns / count / 1e6,
+                'p50_ms': self._percentile_ms(counts, count, 0.50),
+                'p99_ms': self._percentile_ms(counts, count, 0.99),
+            }
+        return result
+
+    def format_summary(self, compact=False):
+        """
+        Tạo bảng thống kê dạng văn bản
+
+        Args:
+            compact: True = mỗi giai đoạn một cụm ngắn (cho bảng thông tin GUI)
+
+        Returns:
+            str: Thống kê theo thứ tự STAGE_ORDER
+        """
+        summary = self.summary()
+        stages = [s for s in self.STAGE_ORDER if s in summary]
+        stages += sorted(s for s in summary if s not in self.STAGE_ORDER)
+        if compact:
+            return " | ".join(f"{s}: {summary[s]['p50_ms']:.1f}/{summary[s]['p99_ms']:.1f}ms"
+                              for s in stages)
+        lines = [f"{'Giai đoạn':<18}{'Số mẫu':>8}{'TB (ms)':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}"]
+        for s in stages:
+            stats = summary[s]
+            lines.append(f"{s:<18}{stats['count']:>8}{stats['mean_ms']:>10.2f}"
+                         f"{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+        return "\n".join(lines)
+
+
+class NullStageTimer:
+    """
+    Stage Timer rỗng dùng khi tắt đo thời gian (mọi hàm không làm gì)
+    """
+
+    enabled = False
+
+    def record(self, stage, duration_ns):
+        pass
+
+    def start_frame(self):
+        pass
+
+    def mark(self, stage):
+        pass
+
+    def end_frame(self):
+        pass
+
+    def summary(self):
+        return {}
+
+    def format_summary(self, compact=False):
+        return ""
+
+
+# Dùng chung một đối tượng rỗng
+NULL_STAGE_TIMER = NullStageTimer()
@@ -0,0 +1,96 @@
+"""
+Module đo thời gian khởi động
+Ghi lại chi phí import từng module, tải mô hình, mở camera và các mốc thời gian
+(ví dụ: thời điểm phân tích xong frame đầu tiên) tính từ lúc bắt đầu chạy
+"""
+
+import importlib
+import time
+from contextlib import contextmanager
+
+
+class StartupReport:
+    """
+    Class ghi nhận thời gian các bước khởi động
+    """
+
+    def __init__(self, start_time=None):
+        """
+        Khởi tạo Startup Report
+
+        Args:
+            start_time: Mốc bắt đầu (time.perf_counter()); None = thời điểm tạo report
+        """
+        self.start_time = time.perf_counter() if start_time is None else start_time
+        self.steps = []       # [(tên bước, thời gian chạy (giây))]
+        self.milestones = []  # [(tên mốc, thời gian từ lúc bắt đầu (giây))]
+
+    @contextmanager
+    def measure(self, name):
+        """
+        Đo thời gian một bước
+
+        Cách dùng:
+            with report.measure('Tải mô hình Face Mesh'):
+                face_detector.load_model()
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - start))
+
+    def import_module(self, module_name):
+        """
+        Import một module và ghi lại chi phí import
+
+        Args:
+            module_name: Tên module
+
+        Returns:
+            module: Module đã import
+        """
+        with self.measure(f"import {module_name}"):
+            return importlib.import_module(module_name)
+
+    def mark(self, name):
+        """
+        Ghi một mốc thời gian tính từ lúc bắt đầu
+
+        Args:
+            name: Tên mốc (ví dụ 'Frame đầu tiên được phân tích')
+
+        Returns:
+            float: Thời gian từ lúc bắt đầu (giây)
+        """
+        elapsed = time.perf_counter() - self.start_time
+        self.milestones.append((name, elapsed))
+        return elapsed
+
+    def as_dict(self):
+        """
+        Xuất kết quả dạng dictionary (mili giây)
+
+        Returns:
+            dict: {'steps': {tên: ms}, 'milestones': {tên: ms}}
+        """
+        return {
+            'steps': {name: seconds * 1000 for name, seconds in self.steps},
+            'milestones': {name: seconds * 1000 for name, seconds in self.milestones},
+        }
+
+    def format(self):
+        """
+        Tạo báo cáo dạng văn bản
+
+        Returns:
+            str: Báo cáo thời gian khởi động
+        """
+        lines = ["=== Thời gian khởi động ==="]
+        for name, seconds in self.steps:
+            lines.append(f"  {name:<40} {seconds * 1000:9.1f} ms")
+        if self.milestones:
+            lines.append("  --- Mốc thời gian (tính từ lúc bắt đầu) ---")
+            for name, seconds in self.milestones:
+                lines.append(f"  {name:<40} {seconds * 1000:9.1f} ms")
+        return "\n".join(lines)
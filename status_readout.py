@@ -0,0 +1,103 @@
+"""
+Module tạo text cho bảng trạng thái theo thay đổi
+Chỉ trả về text mới khi nội dung hiển thị thực sự thay đổi (mức cảnh báo, lý do,
+số lần ngáp, giá trị đã làm tròn), các chỉ số EAR/MAR/điểm được làm mới tối đa
+refresh_hz lần mỗi giây. Giao diện chỉ gán Label.text khi nhận được text mới,
+tránh Kivy dựng lại texture chữ ở mỗi frame.
+
+Không phụ thuộc Kivy nên dùng được trong benchmark.
+"""
+
+from drowsiness_detector import DrowsinessDetector
+
+
+class StatusReadout:
+    """
+    Class tạo text trạng thái/chi tiết, trả về None khi không có gì thay đổi
+    """
+
+    def __init__(self, refresh_hz=5.0):
+        """
+        Khởi tạo Status Readout
+
+        Args:
+            refresh_hz: Số lần làm mới tối đa mỗi giây của các chỉ số
+                        (None hoặc 0 = làm mới mỗi khi giá trị làm tròn thay đổi)
+        """
+        self.refresh_interval = 1.0 / refresh_hz if refresh_hz else 0.0
+        self.reset()
+
+    def reset(self):
+        """Quên nội dung đã hiển thị (gọi khi label bị gán text khác từ bên ngoài)"""
+        self._status_key = None
+        self._detail_key = None
+        self._level_key = None
+        self._next_refresh = 0.0
+
+    def status_text(self, status):
+        """
+        Text và màu của dòng trạng thái
+
+        Args:
+            status: Trạng thái từ DrowsinessDetector
+
+        Returns:
+            tuple: (text, color) hoặc None nếu không thay đổi
+        """
+        key = (status['alert_level'], status['reason'])
+        if key == self._status_key:
+            return None
+        self._status_key = key
+        return (f"Trạng thái: {DrowsinessDetector.get_status_text(status)}",
+                DrowsinessDetector.get_status_color(status))
+
+    def detail_text(self, status, thresholds, now, extra=None):
+        """
+        Text chi tiết (chỉ số, ngưỡng, thông tin thêm)
+
+        Mức cảnh báo hoặc số lần ngáp thay đổi được hiển thị ngay; các chỉ số
+        còn lại chỉ làm mới khi đến chu kỳ refresh.
+
+        Args:
+            status: Trạng thái từ DrowsinessDetector
+            thresholds: (ngưỡng EAR, ngưỡng MAR) đang dùng
+            now: Thời điểm hiện tại (giây, time.monotonic())
+            extra: Hàm trả về dòng thông tin thêm (ví dụ độ trễ), chỉ gọi khi làm mới
+
+        Returns:
+            str: Text mới hoặc None nếu không cần cập nhật
+        """
+        level = status['alert_level']
+        level_key = (level, status['total_yawns'], thresholds)
+        if level_key == self._level_key and now < self._next_refresh:
+            return None
+        self._level_key = level_key
+        self._next_refresh = now + self.refresh_interval
+
+        extra_text = extra() if extra is not None else None
+        if level == 'NO_FACE':
+            key = (level, thresholds, extra_text)
+        else:
+            key = (level, round(status['ear'], 3), round(status['mar'], 3), status['total_yawns'],
+                   round(status['drowsiness_score'], 2), thresholds, extra_text,
+                   round(status['perclos'] * 100, 1), round(status['perclos_long'] * 100, 1))
+        if key == self._detail_key:
+            return None
+        self._detail_key = key
+
+        if level != 'NO_FACE':
+            text = (
+                f"EAR: {key[1]:.3f}  |  "
+                f"MAR: {key[2]:.3f}  |  "
+                f"Ngáp: {key[3]} lần  |  "
+                f"Điểm: {key[4]}\n"
+                f"PERCLOS: {key[7]:.1f}% (ngắn)  |  {key[8]:.1f}% (dài)\n"
+            )
+        else:
+            text = 'Không phát hiện khuôn mặt - Vui lòng điều chỉnh vị trí\n'
+
+        # Hiển thị ngưỡng hiện tại
+        text += f"Ngưỡng cài đặt: EAR={thresholds[0]:.2f} | MAR={thresholds[1]:.2f}"
+        if extra_text:
+            text += "\n" + extra_text
+        return text